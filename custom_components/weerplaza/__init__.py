@@ -15,6 +15,7 @@ from .services import WeerplazaServicesSetup
 PLATFORMS: list[Platform] = [
     Platform.CAMERA,
     Platform.NUMBER,
+    Platform.SELECT,
     Platform.SENSOR,
     Platform.SWITCH,
 ]
@@ -29,7 +30,9 @@ async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
 
     _LOGGER.debug("entry.data: %s", entry.data)
 
-    api = WeerplazaApi(hass)
+    api = WeerplazaApi(hass, dict(entry.options))
+    await api.async_load_assets()
+    await api.async_load_markers()
 
     hass.data[DOMAIN][entry.entry_id] = coordinator = WeerplazaDataUpdateCoordinator(
         hass=hass,
@@ -40,7 +43,11 @@ async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
     await hass.config_entries.async_forward_entry_setups(entry, PLATFORMS)
     entry.async_on_unload(entry.add_update_listener(async_reload_entry))
 
-    await coordinator.async_config_entry_first_refresh()
+    # The cameras already serve the stored animations (warm start), so the
+    # first refresh does not have to hold up the setup
+    entry.async_create_background_task(
+        hass, coordinator.async_refresh(), name=f"{DOMAIN} first refresh"
+    )
 
     WeerplazaServicesSetup(hass, entry)
 
@@ -49,6 +56,7 @@ async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
 
 async def async_unload_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
     """Unload a config entry."""
+    await hass.data[DOMAIN][entry.entry_id].api.async_unload()
     if unloaded := await hass.config_entries.async_unload_platforms(entry, PLATFORMS):
         hass.data[DOMAIN].pop(entry.entry_id)
     return unloaded
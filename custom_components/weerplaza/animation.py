@@ -0,0 +1,335 @@
+"""Builder for the Weerplaza animations."""
+
+from collections import OrderedDict
+from collections.abc import Callable, Hashable
+from dataclasses import dataclass
+from hashlib import blake2b
+from io import BytesIO
+import threading
+
+import numpy as np
+from PIL import Image, ImageSequence
+
+from .const import AnimationFormat, StillFormat
+from .encoder import ApngPart, apng_part, encode, mux_apng
+
+FRAME_DURATION = 200  # ms
+LAST_FRAME_DURATION = 2000  # ms
+
+# Requested sizes are rounded up to one of these widths, so resized images
+# can be cached. Up to PREVIEW_WIDTH only the latest frame is served.
+RESIZE_WIDTHS = (160, 320, 480, 640)
+PREVIEW_WIDTH = 160
+RESIZE_CACHE_SIZE = 8
+STILL_QUALITY = 80
+
+STILL_CONTENT_TYPES = {
+    StillFormat.WEBP: "image/webp",
+    StillFormat.PNG: "image/png",
+}
+
+
+def resize_width(
+    width: int | None, height: int | None, frame_size: tuple[int, int]
+) -> int | None:
+    """Return the width to scale to for a requested size, None for full size."""
+    if not width and not height:
+        return None
+    needed = max(
+        width or 0,
+        round((height or 0) * frame_size[0] / frame_size[1]),
+    )
+    for bucket in RESIZE_WIDTHS:
+        if needed <= bucket < frame_size[0]:
+            return bucket
+    return None
+
+
+@dataclass(frozen=True)
+class _Sources:
+    """Where the frames of an animation come from."""
+
+    filenames: list[str]
+    load: Callable[[str], np.ndarray | None]
+    stamp: Callable[[np.ndarray], np.ndarray] | None
+    stamp_key: Hashable
+    appended: dict[str, np.ndarray]
+
+    def names(self) -> list[str]:
+        """Return the names of all frames: the files, then the appended frames."""
+        return [*self.filenames, *self.appended]
+
+    def frame(self, name: str) -> np.ndarray | None:
+        """Return a stamped frame, None if it cannot be loaded."""
+        frame = self.appended.get(name)
+        if frame is None and (frame := self.load(name)) is None:
+            return None
+        return self.stamp(frame) if self.stamp else frame
+
+    def frames(self) -> tuple[list[np.ndarray], str | None]:
+        """Return the stamped frames and the newest file that was loaded."""
+        frames: list[np.ndarray] = []
+        newest = None
+        for name in self.names():
+            if (frame := self.frame(name)) is None:
+                continue
+            frames.append(frame)
+            if name not in self.appended:
+                newest = name
+        return frames, newest
+
+    def newest(self) -> np.ndarray | None:
+        """Return the newest file that can be loaded, stamped."""
+        for name in reversed(self.filenames):
+            if (frame := self.frame(name)) is not None:
+                return frame
+        return None
+
+
+def durations(count: int) -> list[int]:
+    """Return the frame durations: short for all but the last frame."""
+    return [FRAME_DURATION] * (count - 1) + [LAST_FRAME_DURATION]
+
+
+class AnimationBuilder:
+    """Encode the animation of one layer from the frames in the frame store.
+
+    The builder keeps no frames of its own, so the frame store is the single
+    owner of the frames and of their memory budget. The sources of the last
+    build are remembered, so scaled animations can be encoded from the same
+    frames.
+
+    APNG animations are built incrementally: the encoded part of every frame
+    (what changed since the frame before it) is kept, keyed by the names of
+    both frames and the stamp, so a new frame only loads, stamps and encodes
+    the frames whose part is new, and the parts are muxed again. Frame files
+    are never rewritten with other content, so their names identify them.
+    The size of the parts is reported to reserve, which counts it against the
+    frame store budget. Other formats are encoded from all (stamped) frames.
+    """
+
+    def __init__(self, reserve: Callable[[int], None] | None = None) -> None:
+        self._reserve = reserve
+        self._parts: dict[tuple[Hashable, Hashable], ApngPart | None] = {}
+        self._sources: _Sources | None = None
+        self._animation: tuple[bytes, str] | None = None
+        self._resized: OrderedDict[tuple[int, AnimationFormat], bytes] = OrderedDict()
+        self._newest: tuple[Hashable, str] | None = None
+        self._still: tuple[Hashable, StillFormat, bytes] | None = None
+        self._lock = threading.Lock()
+
+    @property
+    def data(self) -> bytes | None:
+        """Return the latest encoded animation."""
+        animation = self._animation
+        return animation[0] if animation else None
+
+    @property
+    def token(self) -> str | None:
+        """Return the change token (ETag) of the latest encoded animation."""
+        animation = self._animation
+        return animation[1] if animation else None
+
+    @property
+    def still_token(self) -> str | None:
+        """Return the change token of the latest frame."""
+        newest = self._newest
+        if newest is None:
+            return None
+        return blake2b(repr(newest[0]).encode(), digest_size=8).hexdigest()
+
+    def cached_still(self, fmt: StillFormat = StillFormat.WEBP) -> bytes | None:
+        """Return the latest frame if it is encoded already in a format."""
+        still, newest = self._still, self._newest
+        if still is None or newest is None or still[:2] != (newest[0], fmt):
+            return None
+        return still[2]
+
+    def still(self, fmt: StillFormat = StillFormat.WEBP) -> bytes | None:
+        """Return the latest frame, encoding it on the first request.
+
+        The frame is loaded and stamped as it was for the animation. Only
+        the format last asked for is kept.
+        """
+        if (data := self.cached_still(fmt)) is not None:
+            return data
+        sources, newest = self._sources, self._newest
+        if sources is None or newest is None:
+            return None
+        key, filename = newest
+        if (frame := sources.frame(filename)) is None:
+            return None
+        stream = BytesIO()
+        if fmt == StillFormat.WEBP:
+            Image.fromarray(frame).save(stream, format="WEBP", quality=STILL_QUALITY)
+        else:
+            Image.fromarray(frame).save(stream, format="PNG")
+        self._still = (key, fmt, stream.getvalue())
+        return self._still[2]
+
+    def set_data(self, data: bytes) -> None:
+        """Publish encoded animation bytes, e.g. read back from disk."""
+        # A single assignment, so readers never see bytes and token mismatch
+        with self._lock:
+            self._animation = (data, blake2b(data, digest_size=8).hexdigest())
+            self._resized.clear()
+
+    def clear(self) -> None:
+        """Forget the frame sources and drop the encoded animation."""
+        self._sources = None
+        self._newest = None
+        self._still = None
+        self.__set_parts({})
+        with self._lock:
+            self._animation = None
+            self._resized.clear()
+
+    def build(
+        self,
+        filenames: list[str],
+        load: Callable[[str], np.ndarray | None],
+        stamp: Callable[[np.ndarray], np.ndarray] | None = None,
+        stamp_key: Hashable = None,
+        appended: dict[str, np.ndarray] | None = None,
+    ) -> None:
+        """Set the frames of the animation, to be encoded by write.
+
+        Appended frames (e.g. a forecast) follow the files; the still is
+        always the newest file. Frames that cannot be loaded are skipped.
+        """
+        self._sources = _Sources(
+            list(filenames), load, stamp, stamp_key, appended or {}
+        )
+
+    def write(
+        self,
+        path: str | None,
+        fmt: AnimationFormat,
+        encoder: Callable[
+            [list[np.ndarray], list[int], AnimationFormat], bytes
+        ] = encode,
+    ) -> bool:
+        """Encode the frames as a looping animation, publish and store it.
+
+        Returns False when there are no frames to encode.
+        """
+        if (sources := self._sources) is None:
+            return False
+        if fmt == AnimationFormat.APNG:
+            data, newest = self.__encode_apng(sources)
+        else:
+            # Only APNG animations are built from parts
+            self.__set_parts({})
+            frames, newest = sources.frames()
+            data = encoder(frames, durations(len(frames)), fmt) if frames else None
+        # The still is only encoded when it is requested
+        self._newest = None if newest is None else ((newest, sources.stamp_key), newest)
+        if data is None:
+            return False
+        self.set_data(data)
+        if path is not None:
+            with open(path, "wb") as image_file:
+                image_file.write(data)
+        return True
+
+    def __encode_apng(self, sources: _Sources) -> tuple[bytes | None, str | None]:
+        parts: dict[tuple[Hashable, Hashable], ApngPart | None] = {}
+        # The previous frame that made it into the animation: its key, its
+        # name and the frame itself, if it was loaded
+        previous: tuple[Hashable, str, np.ndarray | None] | None = None
+        newest = None
+        for name in sources.names():
+            key = (name, sources.stamp_key)
+            part_key = (previous[0] if previous else None, key)
+            frame = None
+            if part_key in self._parts:
+                part = self._parts[part_key]
+            else:
+                if (frame := sources.frame(name)) is None:
+                    continue
+                before = None
+                if previous is not None:
+                    before = previous[2]
+                    if before is None:
+                        before = sources.frame(previous[1])
+                # Without the frame before it (e.g. dropped from memory) a
+                # full frame is encoded, which is valid after any frame
+                part = apng_part(before, frame)
+            parts[part_key] = part
+            previous = (key, name, frame)
+            if name not in sources.appended:
+                newest = name
+        self.__set_parts(parts)
+        if not parts:
+            return None, newest
+        return mux_apng(list(parts.values()), durations(len(parts))), newest
+
+    def __set_parts(
+        self, parts: dict[tuple[Hashable, Hashable], ApngPart | None]
+    ) -> None:
+        self._parts = parts
+        if self._reserve is not None:
+            self._reserve(sum(part.nbytes for part in parts.values() if part))
+
+    def cached_resized(self, width: int, fmt: AnimationFormat) -> bytes | None:
+        """Return the scaled animation if it is cached."""
+        with self._lock:
+            data = self._resized.get((width, fmt))
+            if data is not None:
+                self._resized.move_to_end((width, fmt))
+            return data
+
+    def resized(self, width: int, fmt: AnimationFormat) -> bytes | None:
+        """Return the animation scaled to width.
+
+        Up to PREVIEW_WIDTH a still of the newest file is returned instead,
+        only that frame is loaded. Results are cached until a new animation
+        is published.
+        """
+        if (data := self.cached_resized(width, fmt)) is not None:
+            return data
+        animation = self._animation
+        sources = self._sources
+        preview = width <= PREVIEW_WIDTH
+        if sources is None:
+            frames = []
+        elif preview:
+            frames = [] if (frame := sources.newest()) is None else [frame]
+        else:
+            frames = sources.frames()[0]
+        frames = frames or self.__frames_from_data(preview)
+        if not frames:
+            return None
+        height = round(width * frames[0].shape[0] / frames[0].shape[1])
+        data = encode(
+            [
+                np.asarray(
+                    Image.fromarray(frame).resize(
+                        (width, height), Image.Resampling.LANCZOS
+                    )
+                )
+                for frame in frames
+            ],
+            durations(len(frames)),
+            fmt,
+        )
+        with self._lock:
+            # Do not cache a result for an animation that was replaced meanwhile
+            if self._animation is animation:
+                self._resized[(width, fmt)] = data
+                while len(self._resized) > RESIZE_CACHE_SIZE:
+                    self._resized.popitem(last=False)
+        return data
+
+    def __frames_from_data(self, last_only: bool = False) -> list[np.ndarray]:
+        # Frames are not decoded yet (e.g. after a restart), use the animation
+        if (data := self.data) is None:
+            return []
+        with Image.open(BytesIO(data)) as image:
+            if last_only:
+                image.seek(getattr(image, "n_frames", 1) - 1)
+                return [np.array(image.convert("RGBA"))]
+            return [
+                np.array(frame.convert("RGBA"))
+                for frame in ImageSequence.Iterator(image)
+            ]
@@ -2,36 +2,81 @@
 
 from typing import Any
 
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 import os
-import glob
 import logging
+import threading
+import time
 from zoneinfo import ZoneInfo
-from io import BytesIO
+from collections import OrderedDict
+from collections.abc import Awaitable, Callable, Hashable
+from dataclasses import asdict
+from functools import partial
 from shutil import rmtree
 
 from datetime import datetime, timedelta
 import aiohttp
+from aiohttp import hdrs
 from pytz import timezone
 
 import async_timeout
 from homeassistant.core import HomeAssistant
 from homeassistant.helpers.aiohttp_client import async_get_clientsession
-from homeassistant.helpers.storage import STORAGE_DIR
-from PIL import Image, ImageFile, ImageDraw, ImageFont
-import imageio.v2 as imageio
+from homeassistant.helpers.storage import STORAGE_DIR, Store
+import numpy as np
+from PIL import Image
 
 from .const import (
+    ANIMATION_FORMAT,
+    CONF_FRAMES,
+    CONF_HOURS,
+    DEFAULT_FRAMES,
+    DEFAULT_HOURS,
     DOMAIN,
+    FRAME_MEMORY_BUDGET,
+    MARKERS,
+    NOWCAST,
+    NOWCAST_SCALE,
+    RAIN_RADIUS,
     MARKER_LATITUDE,
     MARKER_LONGITUDE,
+    PERSIST_FRAMES,
+    PROCESS_RENDERING,
     SHOW_MARKER,
+    STILL_FORMAT,
     LAST_UPDATED,
+    AnimationFormat,
     ImageType,
+    StillFormat,
 )
-from .tools import calculate_mercator_position
+from .animation import STILL_CONTENT_TYPES, AnimationBuilder, resize_width
+from .assets import FRAME_PROJECTION, FRAME_SIZE, ImageAssets
+from .compositor import Compositor
+from .frame_index import FrameIndex
+from .frame_store import FrameStore
+from .encoder import CONTENT_TYPES, EXTENSIONS, encode
+from .markers import Marker, render_markers
+from .nowcast import Nowcaster
+from .precipitation import RainSampler
+from .renderer import RENDER_ERRORS, ProcessRenderer, compose_frame, draw_time
+from .tools import ChunkStream, decode_image, decode_stream
 
 TIMEOUT = 10
-IMAGES_TO_KEEP = 18
+MAX_CONCURRENT_DOWNLOADS = 4
+TILE_CACHE_SIZE = 4
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+# All seven layers at the default frame count (about 2.1 MiB a frame) fit
+DEFAULT_FRAME_MEMORY_BUDGET = 320  # MiB
+DEFAULT_RAIN_RADIUS = 2  # km
+RAIN_SAMPLES_TO_KEEP = 32
+RAIN_ONSET_THRESHOLD = 0.1  # mm/h
+NOWCAST_LEADS = [10, 20, 30, 40, 50, 60]  # minutes
+DEFAULT_NOWCAST_SCALE = 4
+MARKERS_STORAGE_KEY = f"{DOMAIN}.markers"
+MARKERS_STORAGE_VERSION = 1
+LAYERS_PROCESSED = "processed"
+LAYERS_SKIPPED = "skipped"
 
 IMAGE_URLS = {
     ImageType.RAIN_RADAR: "https://api.meteoplaza.com/v2/splash/10728/obs?access_token=weerplaza&usehd=1",
@@ -50,16 +95,52 @@ class WeerplazaApi:
     """Weerplaza API client to fetch weather images."""
 
     _headers: dict[str, str] = {"User-Agent": "Home Assistant (Weer Plaza)"}
-    _images: dict[ImageType, Any] = {}
+    _images: dict[ImageType, FrameIndex] = {}
     _storage_paths: dict[ImageType, str] = {}
     _timezone: Any = None
     _settings: dict[str, Any] = {}
-    _cameras: dict[ImageType, bool] = {}
+    _cameras: dict[ImageType, int] = {}
+    _animations: dict[ImageType, AnimationBuilder] = {}
 
-    def __init__(self, hass: HomeAssistant) -> None:
+    def __init__(
+        self, hass: HomeAssistant, options: dict[str, Any] | None = None
+    ) -> None:
         self._hass = hass
+        self._options = options or {}
         self._timezone = self._hass.config.time_zone
         self._session = async_get_clientsession(self._hass)
+        self._download_semaphore = asyncio.Semaphore(MAX_CONCURRENT_DOWNLOADS)
+        # A tile is decoded while it downloads, one thread per download
+        self._decoders = ThreadPoolExecutor(
+            MAX_CONCURRENT_DOWNLOADS, thread_name_prefix=f"{DOMAIN}_decode"
+        )
+        self._assets: ImageAssets | None = None
+        self._requests: dict[str, asyncio.Task] = {}
+        self._tiles: OrderedDict[str, Image.Image] = OrderedDict()
+        self._compositors = threading.local()
+        self._validators: dict[str, tuple[dict[str, str], Any]] = {}
+        self._latest_frames: dict[ImageType, str] = {}
+        self._frame_times: dict[ImageType, list[float]] = {}
+        self._marker_overlay: tuple[Hashable, Any] | None = None
+        self._marker_store: Store[list[dict[str, Any]]] = Store(
+            hass, MARKERS_STORAGE_VERSION, MARKERS_STORAGE_KEY
+        )
+        self._rain_sampler: tuple[Hashable, RainSampler] | None = None
+        self._rain: dict[float, float] = {}
+        self._rain_lock = threading.Lock()
+        self._nowcaster = Nowcaster()
+        self._forecast: dict[str, np.ndarray] = {}
+        self._rain_onset: datetime | None = None
+        self._frame_store = FrameStore(DEFAULT_FRAME_MEMORY_BUDGET * 1024 * 1024)
+        self._flush_lock = threading.Lock()
+        self._renderer = ProcessRenderer()
+        self._setup_time = time.monotonic()
+        self._first_served = False
+        self._unloading = False
+        self._layer_counters: dict[str, int] = {
+            LAYERS_PROCESSED: 0,
+            LAYERS_SKIPPED: 0,
+        }
         self.set_setting(
             MARKER_LONGITUDE,
             (
@@ -75,16 +156,52 @@ class WeerplazaApi:
             ),
         )
         self.set_setting(SHOW_MARKER, hass.data[DOMAIN].get(SHOW_MARKER, True))
+        self.set_setting(MARKERS, hass.data[DOMAIN].get(MARKERS, []))
+        self.set_setting(
+            RAIN_RADIUS, hass.data[DOMAIN].get(RAIN_RADIUS, DEFAULT_RAIN_RADIUS)
+        )
+        self.set_setting(NOWCAST, hass.data[DOMAIN].get(NOWCAST, False))
+        self.set_setting(
+            NOWCAST_SCALE, hass.data[DOMAIN].get(NOWCAST_SCALE, DEFAULT_NOWCAST_SCALE)
+        )
+        self.set_setting(
+            ANIMATION_FORMAT,
+            hass.data[DOMAIN].get(ANIMATION_FORMAT, AnimationFormat.APNG.value),
+        )
+        self.set_setting(
+            STILL_FORMAT, hass.data[DOMAIN].get(STILL_FORMAT, StillFormat.WEBP.value)
+        )
+        self.set_setting(
+            FRAME_MEMORY_BUDGET,
+            hass.data[DOMAIN].get(FRAME_MEMORY_BUDGET, DEFAULT_FRAME_MEMORY_BUDGET),
+        )
+        self.set_setting(PERSIST_FRAMES, hass.data[DOMAIN].get(PERSIST_FRAMES, True))
+        self.set_setting(
+            PROCESS_RENDERING, hass.data[DOMAIN].get(PROCESS_RENDERING, False)
+        )
         for image_type in IMAGE_URLS:
-            self._images[image_type] = []
-            self._cameras[image_type] = False
+            self._cameras[image_type] = 0
+            self._animations[image_type] = AnimationBuilder(
+                partial(self._frame_store.reserve, image_type)
+            )
             self._storage_paths[image_type] = self._hass.config.path(
                 STORAGE_DIR, DOMAIN, image_type.value
             )
+            self._images[image_type] = FrameIndex(self._storage_paths[image_type])
 
     def set_setting(self, key: str, value: Any, store: bool = False) -> None:
         """Set a setting for the API."""
         self._settings[key] = value
+        if key == NOWCAST and not value:
+            self._nowcaster.clear()
+            self._forecast = {}
+            self._rain_onset = None
+        elif key == FRAME_MEMORY_BUDGET:
+            self._frame_store.budget = int(value * 1024 * 1024)
+        elif key == PERSIST_FRAMES:
+            self._frame_store.persist = bool(value)
+        elif key == PROCESS_RENDERING and not value:
+            self._renderer.shutdown()
         if store:
             self._hass.data[DOMAIN][key] = value
         _LOGGER.debug("Setting parameter %s to %s", key, value)
@@ -93,81 +210,253 @@ class WeerplazaApi:
         """Get a setting for the API."""
         return self._settings.get(key, None)
 
-    async def async_get_new_images(self) -> None:
-        """Fetch new images from the Weerplaza API."""
-        for image_type, file_path in IMAGE_URLS.items():
-            if not self.__is_camera_registered(image_type):
-                continue
-            if not file_path:
-                continue
-            if not self._images.get(image_type, None):
-                await self.__async_build_images_list(image_type)
-            data = await self.__async_get_image_data(image_type)
-            if not data:
-                return None
-            image_data = data.get("data", [])
-            if not image_data:
+    @property
+    def animation_format(self) -> AnimationFormat:
+        """Return the selected animation format."""
+        return AnimationFormat(self.setting(ANIMATION_FORMAT))
+
+    @property
+    def animation_content_type(self) -> str:
+        """Return the content type of the animations."""
+        return CONTENT_TYPES[self.animation_format]
+
+    @property
+    def still_format(self) -> StillFormat:
+        """Return the selected format of the latest frames."""
+        return StillFormat(self.setting(STILL_FORMAT))
+
+    @property
+    def still_content_type(self) -> str:
+        """Return the content type of the latest frames."""
+        return STILL_CONTENT_TYPES[self.still_format]
+
+    @property
+    def markers(self) -> tuple[Marker, ...]:
+        """Return the marker location followed by the named markers."""
+        markers = tuple(Marker(**marker) for marker in self.setting(MARKERS))
+        if self.setting(MARKER_LATITUDE) and self.setting(MARKER_LONGITUDE):
+            markers = (
+                Marker(
+                    "marker",
+                    self.setting(MARKER_LATITUDE),
+                    self.setting(MARKER_LONGITUDE),
+                ),
+            ) + markers
+        return markers
+
+    async def async_load_markers(self) -> None:
+        """Load the named markers saved by a previous run."""
+        if (markers := await self._marker_store.async_load()) is not None:
+            self.set_setting(MARKERS, markers, store=True)
+
+    async def async_add_marker(self, marker: Marker) -> None:
+        """Add a named marker, replacing a marker with the same name."""
+        markers = [m for m in self.setting(MARKERS) if m["name"] != marker.name]
+        await self.__async_save_markers([*markers, asdict(marker)])
+
+    async def async_remove_marker(self, name: str) -> None:
+        """Remove a named marker."""
+        markers = [m for m in self.setting(MARKERS) if m["name"] != name]
+        await self.__async_save_markers(markers)
+
+    async def __async_save_markers(self, markers: list[dict[str, Any]]) -> None:
+        # The markers are saved to disk, so they survive a restart
+        self.set_setting(MARKERS, markers, store=True)
+        await self._marker_store.async_save(markers)
+        await self.async_force_refresh()
+
+    @property
+    def rain_intensity(self) -> float | None:
+        """Return the mean rain intensity (mm/h) around the marker, newest frame."""
+        with self._rain_lock:
+            if not self._rain:
                 return None
+            return self._rain[max(self._rain)]
 
-            for data in image_data:
-                time_val = datetime.fromisoformat(data.get("dateTime"))
-                if self.__image_needed(image_type, time_val):
-                    filename, overlay_filename = (
-                        data.get("layerNameHD").split(";") + [None]
-                    )[:2]
-                    _LOGGER.debug("Downloading image (%s) for %s", image_type, filename)
-                    image_raw = await self.__async_download_lastest_image(filename)
-                    if image_type != ImageType.RAIN_LIGHTNING:
-                        overlay_raw = (
-                            await self.__async_download_lastest_image(overlay_filename)
-                            if overlay_filename
-                            else None
-                        )
-                    else:
-                        overlay_raw = await self.__async_download_lightning_image(
-                            time_val
-                        )
-                    if image_raw:
-                        try:
-                            original = Image.open(BytesIO(image_raw))
-                            overlay = (
-                                Image.open(BytesIO(overlay_raw))
-                                if overlay_raw
-                                else None
-                            )
-                            if original.width > 500:
-                                await self.__async_create_image(
-                                    original,
-                                    overlay,
-                                    image_type,
-                                    time_val,
-                                )
-                                self.__add_filename_to_images(image_type, time_val)
-                        except Exception as e:
-                            _LOGGER.error(
-                                "Error processing image (%s/%s): %s",
-                                filename,
-                                overlay_filename,
-                                e,
-                            )
+    @property
+    def rain_onset(self) -> datetime | None:
+        """Return when rain is expected at the marker, according to the nowcast."""
+        if not self.setting(NOWCAST):
+            return None
+        return self._rain_onset
+
+    def registered_image_types(self) -> list[ImageType]:
+        """Return the image types with a registered camera."""
+        return [
+            image_type
+            for image_type, file_path in IMAGE_URLS.items()
+            if file_path and self.__is_camera_registered(image_type)
+        ]
+
+    @property
+    def frame_memory_usage(self) -> int:
+        """Return the number of bytes used by the frames kept in memory."""
+        return self._frame_store.memory_usage
+
+    def layer_window(self, image_type: ImageType) -> tuple[int, timedelta]:
+        """Return the number of frames and the look-back window of a layer."""
+        options = self._options.get(image_type.value, {})
+        return (
+            int(options.get(CONF_FRAMES, DEFAULT_FRAMES)),
+            timedelta(hours=options.get(CONF_HOURS, DEFAULT_HOURS)),
+        )
 
-            await self.__async_create_animated_gif(image_type)
+    def frame_times(self, image_type: ImageType) -> list[float]:
+        """Return the upstream frame times (timestamps) seen by the last update."""
+        return self._frame_times.get(image_type, [])
+
+    async def async_update_layer(self, image_type: ImageType) -> bool:
+        """Fetch new images for one image type from the Weerplaza API."""
+        if not await self.__async_update_layer(image_type):
+            return False
 
         self.set_setting(
             LAST_UPDATED,
             datetime.now().replace(tzinfo=ZoneInfo(self._hass.config.time_zone)),
         )
+        return True
+
+    async def __async_update_layer(self, image_type: ImageType) -> bool:
+        data = await self.__async_get_image_data(image_type)
+        if not data:
+            return False
+        image_data = data.get("data", [])
+        if not image_data:
+            return False
+        self._frame_times[image_type] = [
+            datetime.fromisoformat(entry.get("dateTime")).timestamp()
+            for entry in image_data
+        ]
+
+        # Nothing changed upstream (304 or same newest frame), skip the layer
+        latest = max(entry.get("dateTime") for entry in image_data)
+        if latest == self._latest_frames.get(image_type):
+            self._layer_counters[LAYERS_SKIPPED] += 1
+            return True
+
+        if not self._images[image_type].loaded:
+            await self.__async_build_images_list(image_type)
+
+        # Only the newest entries inside the window end up in the animation,
+        # so only those are checked against the stored frames
+        count, window = self.layer_window(image_type)
+        cutoff = time.time() - window.total_seconds()
+        newest = sorted(
+            zip(self._frame_times[image_type], image_data),
+            key=lambda entry: entry[0],
+            reverse=True,
+        )[:count]
+        frames: list[tuple[datetime, str]] = []
+        for timestamp, data in reversed(newest):
+            if timestamp <= cutoff:
+                continue
+            time_val = datetime.fromisoformat(data.get("dateTime"))
+            if (
+                self.__get_image_filename(image_type, time_val)
+                not in self._images[image_type]
+            ):
+                frames.append((time_val, data.get("layerNameHD")))
+
+        # Download and composite all frames concurrently, but register them
+        # in the upstream order so the animation keeps its frame sequence.
+        results = await asyncio.gather(
+            *(
+                self.__async_process_frame(image_type, time_val, layer_name)
+                for time_val, layer_name in frames
+            )
+        )
+        for (time_val, _), created in zip(frames, results):
+            if created:
+                self.__add_filename_to_images(image_type, time_val)
+        # Also drops the frames that fell out of the (possibly shrunk) window
+        oldest = datetime.now(datetime.fromisoformat(latest).tzinfo) - window
+        if await self.__async_keep_last_images(image_type, oldest) or any(results):
+            self.__schedule_flush()
+
+        if image_type == ImageType.RAIN_RADAR and self.setting(NOWCAST):
+            if any(results):
+                await self.__async_create_forecast()
+        await self.__async_create_animated_gif(image_type)
+        self._layer_counters[LAYERS_PROCESSED] += 1
+        # Only skip the next identical response when nothing has to be retried
+        if all(results):
+            self._latest_frames[image_type] = latest
+        return True
+
+    @property
+    def layer_counters(self) -> dict[str, int]:
+        """Return how many layer updates were processed and skipped."""
+        return dict(self._layer_counters)
+
+    async def __async_process_frame(
+        self, image_type: ImageType, time_val: datetime, layer_name: str
+    ) -> bool:
+        filename, overlay_filename = (layer_name.split(";") + [None])[:2]
+        _LOGGER.debug("Downloading image (%s) for %s", image_type, filename)
+        try:
+            if image_type != ImageType.RAIN_LIGHTNING:
+                original, overlay = await asyncio.gather(
+                    self.__async_get_tile(filename),
+                    (
+                        self.__async_get_tile(overlay_filename)
+                        if overlay_filename
+                        else asyncio.sleep(0)
+                    ),
+                )
+            else:
+                original, overlay = await asyncio.gather(
+                    self.__async_get_tile(filename),
+                    self.__async_get_lightning_image(time_val),
+                )
+            if original and original.width > 500:
+                await self.__async_create_image(
+                    original,
+                    overlay,
+                    image_type,
+                    time_val,
+                )
+                return True
+        except Exception as e:
+            _LOGGER.error(
+                "Error processing image (%s/%s): %s",
+                filename,
+                overlay_filename,
+                e,
+            )
+        return False
+
+    async def __async_shared(
+        self, url: str, fetch: Callable[[str], Awaitable[Any]]
+    ) -> Any:
+        """Share one in-flight request between all image types using the same URL."""
+        task = self._requests.get(url)
+        if task is None:
+            task = self._hass.async_create_task(fetch(url))
+            self._requests[url] = task
+            task.add_done_callback(lambda _: self._requests.pop(url, None))
+        return await asyncio.shield(task)
 
     async def __async_get_image_data(
         self, image_type: ImageType
     ) -> dict[str, Any] | None:
+        return await self.__async_shared(
+            IMAGE_URLS[image_type], self.__async_fetch_image_data
+        )
+
+    async def __async_fetch_image_data(self, url: str) -> dict[str, Any] | None:
+        validators, cached = self._validators.get(url, ({}, None))
         try:
-            async with async_timeout.timeout(TIMEOUT):
+            async with self._download_semaphore, async_timeout.timeout(TIMEOUT):
                 async with self._session.get(
-                    IMAGE_URLS[image_type], headers=self._headers
+                    url, headers={**self._headers, **validators}
                 ) as response:
+                    if response.status == 304 and cached is not None:
+                        _LOGGER.debug("Image data not modified: %s", url)
+                        return cached
                     if response.status == 200:
-                        return await response.json()
+                        data = await response.json()
+                        self.__store_validators(url, response, data)
+                        return data
                     else:
                         _LOGGER.error("Failed to fetch image: %s", response.status)
                         return None
@@ -175,29 +464,79 @@ class WeerplazaApi:
             _LOGGER.error("Error fetching image data: %s", e)
             return None
 
-    async def __async_download_lastest_image(self, url) -> bytes | None:
-        try:
-            async with async_timeout.timeout(TIMEOUT):
-                async with self._session.get(url, headers=self._headers) as response:
-                    if response.status == 200:
-                        return await response.read()
-                    else:
-                        _LOGGER.error(
-                            "Failed to fetch image (%s): %s", url, response.status
-                        )
-                        return None
-        except aiohttp.ClientError as e:
-            _LOGGER.error("Error fetching image: %s", e)
+    def __store_validators(
+        self, url: str, response: aiohttp.ClientResponse, data: Any
+    ) -> None:
+        validators: dict[str, str] = {}
+        if etag := response.headers.get(hdrs.ETAG):
+            validators[hdrs.IF_NONE_MATCH] = etag
+        if last_modified := response.headers.get(hdrs.LAST_MODIFIED):
+            validators[hdrs.IF_MODIFIED_SINCE] = last_modified
+        if validators:
+            self._validators[url] = (validators, data)
+        else:
+            self._validators.pop(url, None)
+
+    async def __async_get_tile(self, url: str) -> Image.Image | None:
+        if (image := self._tiles.get(url)) is not None:
+            self._tiles.move_to_end(url)
+            return image
+        return await self.__async_shared(url, self.__async_fetch_tile)
+
+    async def __async_fetch_tile(self, url: str) -> Image.Image | None:
+        image = await self.__async_download_tile(url)
+        if image is None:
             return None
+        self._tiles[url] = image
+        while len(self._tiles) > TILE_CACHE_SIZE:
+            self._tiles.popitem(last=False)
+        return image
+
+    async def __async_download_tile(self, url: str) -> Image.Image | None:
+        async with self._download_semaphore:
+            try:
+                async with async_timeout.timeout(TIMEOUT):
+                    decoding = await self.__async_stream_tile(url)
+            except aiohttp.ClientError as e:
+                _LOGGER.error("Error fetching image: %s", e)
+                return None
+            # The timeout only covers the download, not the rest of the decode
+            return None if decoding is None else await decoding
 
-    async def __async_download_lightning_image(
+    async def __async_stream_tile(self, url: str) -> asyncio.Future[Image.Image] | None:
+        async with self._session.get(url, headers=self._headers) as response:
+            if response.status != 200:
+                _LOGGER.error("Failed to fetch image (%s): %s", url, response.status)
+                return None
+            # Decode the tile while it is downloaded, instead of buffering the
+            # whole body first. The decoder threads are not shared, so the
+            # decode starts right away and does not wait for an executor
+            # thread with the download queued up.
+            stream = ChunkStream()
+            decoding = asyncio.get_running_loop().run_in_executor(
+                self._decoders, self.__decode_tile, stream
+            )
+            try:
+                async for chunk in response.content.iter_chunked(DOWNLOAD_CHUNK_SIZE):
+                    await stream.feed(chunk)
+            except BaseException:
+                stream.abort()
+                decoding.cancel()
+                raise
+            stream.end()
+            return decoding
+
+    def __decode_tile(self, stream: ChunkStream) -> Image.Image:
+        return decode_stream(stream, self.__get_assets().canvas_size)
+
+    async def __async_get_lightning_image(
         self, time_val: datetime
-    ) -> bytes | None:
+    ) -> Image.Image | None:
         return await self._hass.async_add_executor_job(
-            self.__download_lightning_image, time_val
+            self.__get_lightning_image, time_val
         )
 
-    def __download_lightning_image(self, time_val: datetime) -> bytes | None:
+    def __get_lightning_image(self, time_val: datetime) -> Image.Image | None:
         filename = self._hass.config.path(
             STORAGE_DIR,
             "blitzortung_image",
@@ -206,29 +545,22 @@ class WeerplazaApi:
         if os.path.exists(filename):
             _LOGGER.debug("Blitzortung image found: %s", filename)
             with open(filename, "rb") as image_file:
-                return image_file.read()
+                return decode_image(image_file.read())
         return None
 
-    def __get_background_image(self) -> Image.Image:
-        with Image.open(
-            f"custom_components/{DOMAIN}/images/Radar-1050-v2.jpg"
-        ) as image:
-            return image.convert("RGBA")
+    async def async_load_assets(self) -> None:
+        """Decode the static image assets once, off the event loop."""
+        self._assets = await self._hass.async_add_executor_job(ImageAssets)
 
-    def __get_borders_image(self) -> Image.Image:
-        with Image.open(
-            f"custom_components/{DOMAIN}/images/Radar-1050-borders-v2.png"
-        ) as image:
-            return image.convert("RGBA")
-
-    def __get_marker_image(self) -> Image.Image:
-        with Image.open(f"custom_components/{DOMAIN}/images/pointer-50.png") as image:
-            return image.convert("RGBA")  # .resize((50, 50), Image.Resampling.LANCZOS)
+    def __get_assets(self) -> ImageAssets:
+        if self._assets is None:
+            self._assets = ImageAssets()
+        return self._assets
 
     async def __async_create_image(
         self,
-        original: ImageFile.ImageFile,
-        overlay: ImageFile.ImageFile | None,
+        original: Image.Image,
+        overlay: Image.Image | None,
         image_type: ImageType,
         time_val: datetime,
     ) -> None:
@@ -238,88 +570,170 @@ class WeerplazaApi:
 
     def __create_image(
         self,
-        original: ImageFile.ImageFile,
-        overlay: ImageFile.ImageFile | None,
+        original: Image.Image,
+        overlay: Image.Image | None,
         image_type: ImageType,
         time_val: datetime,
     ) -> None:
-        # final image size is 1050x1148
-        final = self.__get_background_image()
-
-        # Resize original image to fit the final image
-        original_image = original.resize(
-            (final.width, final.height), Image.Resampling.LANCZOS
-        ).convert("RGBA")
-        final.paste(original_image, (0, 0), original_image)
-
-        # If overlay is provided, paste it on top of the original image
-        if overlay and image_type != ImageType.RAIN_LIGHTNING:
-            overlay_image = overlay.resize(
-                (final.width, final.height), Image.Resampling.LANCZOS
-            ).convert("RGBA")
-            final.paste(overlay_image, (0, 0), overlay_image)
-
-        # Add borders
-        borders_image = self.__get_borders_image()
-        final.paste(borders_image, (0, 0), borders_image)
-
-        # Rotate the final image -6 degrees with transparent background
-        final = final.rotate(-6, expand=False, fillcolor=(0, 0, 0, 0))
-
-        # Crop the final image to 776x700
-        final = final.crop((157, 264, 157 + 776, 264 + 700))
-
-        if overlay and image_type == ImageType.RAIN_LIGHTNING:
-            overlay_image = overlay.resize(
-                (final.width, final.height), Image.Resampling.LANCZOS
-            ).convert("RGBA")
-            final.paste(overlay_image, (0, 0), overlay_image)
-            _LOGGER.debug("Overlay lightning image pasted for %s", image_type)
-
-        draw = ImageDraw.Draw(final)
-        # Colors
-        text_color = (254, 255, 255)
-        outline_color = (0, 0, 0)
-
-        # Font
-        font = ImageFont.load_default(30)
-
-        textx = 10
-        texty = final.height - font.size - 10  # type: ignore
-
-        # Draw time and shadow
+        lightning = image_type == ImageType.RAIN_LIGHTNING
         time_str = time_val.astimezone(timezone(self._timezone)).strftime("%H:%M")
-        for adj in range(-2, 3):
-            draw.text((textx + adj, texty), time_str, font=font, fill=outline_color)
-            draw.text((textx, texty + adj), time_str, font=font, fill=outline_color)
-        draw.text((textx, texty), time_str, font=font, fill=text_color)
+        rendered = None
+        if self.setting(PROCESS_RENDERING):
+            try:
+                rendered = self._renderer.render(
+                    original,
+                    overlay,
+                    lightning,
+                    time_str,
+                    image_type == ImageType.RAIN_RADAR,
+                )
+            except RENDER_ERRORS as e:
+                _LOGGER.warning("Rendering in a process failed, using a thread: %s", e)
+        if rendered is None:
+            assets = self.__get_assets()
+            frame, layer = compose_frame(
+                assets, self.__get_compositor(), original, overlay, lightning
+            )
+            rendered = (draw_time(frame, time_str, assets.font), layer)
+        final, layer = rendered
+
+        # Read the rain at the marker from the radar layer itself, as it was
+        # before it was blended with the background
+        if image_type == ImageType.RAIN_RADAR and layer is not None:
+            self.__sample_rain(layer, time_val)
+            if self.setting(NOWCAST):
+                self._nowcaster.add(
+                    time_val.timestamp(), layer, int(self.setting(NOWCAST_SCALE))
+                )
 
-        filename = self.__get_image_filename(image_type, time_val)
-        final.save(filename, "PNG")
-        mod_time = int(time_val.timestamp())
-        os.utime(filename, (mod_time, mod_time))
+        # The frame is written to disk later, by the flush job
+        self._frame_store.add(
+            self.__get_image_filename(image_type, time_val),
+            final,
+            int(time_val.timestamp()),
+        )
+
+    def __get_rain_sampler(self) -> RainSampler | None:
+        latitude = self.setting(MARKER_LATITUDE)
+        longitude = self.setting(MARKER_LONGITUDE)
+        if not latitude or not longitude:
+            return None
+        # The pixels to sample only change with the location and radius
+        key = (latitude, longitude, self.setting(RAIN_RADIUS))
+        sampler = self._rain_sampler
+        if sampler is None or sampler[0] != key:
+            sampler = (key, RainSampler(FRAME_PROJECTION, FRAME_SIZE, *key))
+            self._rain_sampler = sampler
+        return sampler[1]
+
+    def __sample_rain(self, layer: np.ndarray, time_val: datetime) -> None:
+        sampler = self.__get_rain_sampler()
+        if sampler is None or (rain := sampler.sample(layer)) is None:
+            return
+        with self._rain_lock:
+            self._rain[time_val.timestamp()] = rain
+            while len(self._rain) > RAIN_SAMPLES_TO_KEEP:
+                del self._rain[min(self._rain)]
+
+    async def __async_create_forecast(self) -> None:
+        await self._hass.async_add_executor_job(self.__create_forecast)
+
+    def __create_forecast(self) -> None:
+        started = time.monotonic()
+        result = self._nowcaster.forecast(NOWCAST_LEADS)
+        if result is None:
+            # No forecast for the newest frame, drop the outdated one
+            self._forecast = {}
+            self._rain_onset = None
+            return
+        timestamp, layers = result
+        assets = self.__get_assets()
+        compositor = self.__get_compositor()
+        sampler = self.__get_rain_sampler()
+        base_time = datetime.fromtimestamp(timestamp, tz=ZoneInfo("UTC"))
+        onset = None
+        current = self._rain.get(timestamp)
+        if current is not None and current >= RAIN_ONSET_THRESHOLD:
+            onset = base_time
+        frames: dict[str, np.ndarray] = {}
+        for lead, layer in zip(NOWCAST_LEADS, layers):
+            time_val = base_time + timedelta(minutes=lead)
+            if onset is None and sampler is not None:
+                rain = sampler.sample(layer)
+                if rain is not None and rain >= RAIN_ONSET_THRESHOLD:
+                    onset = time_val
+            time_str = time_val.astimezone(timezone(self._timezone)).strftime("%H:%M")
+            frames[f"forecast-{int(timestamp)}+{lead}"] = draw_time(
+                compositor.composite(assets.background, [layer, assets.borders]),
+                f"{time_str} (+{lead})",
+                assets.font,
+            )
+        self._forecast = frames
+        self._rain_onset = onset
+        _LOGGER.debug("Nowcast created in %.2f s", time.monotonic() - started)
+
+    def __get_compositor(self) -> Compositor:
+        # Frames are composited in parallel executor jobs, so every thread
+        # gets its own compositor (and scratch buffers)
+        compositor = getattr(self._compositors, "compositor", None)
+        if compositor is None:
+            compositor = Compositor(FRAME_SIZE[1], FRAME_SIZE[0])
+            self._compositors.compositor = compositor
+        return compositor
 
     def __get_image_filename(self, image_type: ImageType, time_val: datetime) -> str:
         return f"{self.__get_storage_path(image_type)}/{time_val.strftime('%Y%m%d-%H%M')}.png"
 
-    def __image_needed(self, image_type: ImageType, time_val: datetime) -> bool:
-        if time_val.timestamp() > (datetime.now() - timedelta(hours=12)).timestamp():
-            return not os.path.exists(self.__get_image_filename(image_type, time_val))
-        return False
-
     def __add_filename_to_images(
         self, image_type: ImageType, time_val: datetime
     ) -> None:
-        self._images[image_type].append(self.__get_image_filename(image_type, time_val))
-        self._images[image_type].sort()
-        self.__keep_last_images(image_type)
+        self._images[image_type].add(self.__get_image_filename(image_type, time_val))
 
-    def __keep_last_images(self, image_type: ImageType):
-        while len(self._images[image_type]) > IMAGES_TO_KEEP:
-            filename = self._images[image_type].pop(0)
-            if os.path.exists(filename):
+    async def __async_keep_last_images(
+        self, image_type: ImageType, oldest: datetime | None = None
+    ) -> bool:
+        return await self._hass.async_add_executor_job(
+            self.__keep_last_images, image_type, oldest
+        )
+
+    def __keep_last_images(
+        self, image_type: ImageType, oldest: datetime | None = None
+    ) -> bool:
+        count, _ = self.layer_window(image_type)
+        evicted = self._images[image_type].evict(
+            count,
+            self.__get_image_filename(image_type, oldest) if oldest else None,
+        )
+        self._frame_store.discard(evicted)
+        if not self._frame_store.persist:
+            return bool(evicted)
+        for filename in evicted:
+            try:
                 os.remove(filename)
                 _LOGGER.debug("Removed old image: %s", filename)
+            except FileNotFoundError:
+                pass
+        return bool(evicted)
+
+    def __schedule_flush(self) -> None:
+        if not self._frame_store.persist:
+            return
+        # Writing the frames does not hold up the cameras
+        self._hass.async_create_background_task(
+            self.__async_flush_frames(), name=f"{DOMAIN} flush frames"
+        )
+
+    async def __async_flush_frames(self) -> None:
+        await self._hass.async_add_executor_job(self.__flush_frames)
+
+    def __flush_frames(self) -> None:
+        with self._flush_lock:
+            self._frame_store.flush()
+            # Save the indexes after the frames, so they never list a frame
+            # that was not written yet
+            for image_type in self.registered_image_types():
+                if self._images[image_type].loaded:
+                    self._images[image_type].save()
 
     async def __async_create_animated_gif(self, image_type: ImageType) -> None:
         await self._hass.async_add_executor_job(self.__create_animated_gif, image_type)
@@ -327,81 +741,166 @@ class WeerplazaApi:
     def __create_animated_gif(self, image_type: ImageType):
         if not self.__is_camera_registered(image_type):
             return
-        images = []
-        duration = []
-        for index, image_data in enumerate(self._images[image_type]):
-            if not os.path.exists(image_data):
-                continue
-            # Add marker location if set
-            if (
-                self.setting(SHOW_MARKER)
-                and self.setting(MARKER_LONGITUDE)
-                and self.setting(MARKER_LATITUDE)
-            ):
-                final = Image.open(image_data).convert("RGBA")
-                marker = self.__get_marker_image().resize((40, 40))
-                marker_x, marker_y = calculate_mercator_position(
-                    self.setting(MARKER_LATITUDE),
-                    self.setting(MARKER_LONGITUDE),
-                    llon=1.556,
-                    rlon=8.8,
-                    tlat=54.239,
-                    width=final.width,
-                )
-                final.paste(
-                    marker,
-                    (
-                        marker_x - int(marker.width / 2),
-                        marker_y - int(marker.height / 2),
-                    ),
-                    marker,
-                )
-                image_stream = BytesIO()
-                final.save(image_stream, format="PNG")
-                images.append(imageio.imread(image_stream))
-            else:
-                images.append(imageio.imread(image_data))
-
-            duration.append(
-                2000 if index == len(self._images[image_type]) - 1 else 200
-            )  # 200 ms for all but the last frame
-        if len(images) > 0:
-            imageio.mimwrite(
-                f"{self.__get_storage_path(image_type)}/animated.png",
-                images,
-                loop=0,
-                duration=duration,
+        stamp = None
+        stamp_key = None
+        # Add the marker locations if set
+        if self.setting(SHOW_MARKER) and (markers := self.markers):
+            stamp = partial(self.__stamp_markers, markers)
+            stamp_key = markers
+
+        forecast = None
+        if image_type == ImageType.RAIN_RADAR and self.setting(NOWCAST):
+            forecast = self._forecast
+        animation = self._animations[image_type]
+        animation.build(
+            self._images[image_type].filenames,
+            self._frame_store.get,
+            stamp,
+            stamp_key,
+            forecast,
+        )
+        animation.write(
+            self.__get_animated_path(image_type) if self._frame_store.persist else None,
+            self.animation_format,
+            self.__encode,
+        )
+
+    def __encode(
+        self, frames: list[np.ndarray], durations: list[int], fmt: AnimationFormat
+    ) -> bytes:
+        if self.setting(PROCESS_RENDERING):
+            try:
+                return self._renderer.encode(frames, durations, fmt)
+            except RENDER_ERRORS as e:
+                _LOGGER.warning("Encoding in a process failed, using a thread: %s", e)
+        return encode(frames, durations, fmt)
+
+    def __stamp_markers(
+        self, markers: tuple[Marker, ...], frame: np.ndarray
+    ) -> np.ndarray:
+        """Return a copy of the frame with all markers blended onto it."""
+        overlay = self.__get_marker_overlay(markers)
+        if overlay is None:
+            return frame
+        image, x, y = overlay
+        stamped = frame.copy()
+        self.__get_compositor().blend_at(stamped, image, x, y)
+        return stamped
+
+    def __get_marker_overlay(
+        self, markers: tuple[Marker, ...]
+    ) -> tuple[np.ndarray, int, int] | None:
+        # The overlay only changes with the markers, so only the last one is
+        # remembered
+        if self._marker_overlay is None or self._marker_overlay[0] != markers:
+            assets = self.__get_assets()
+            overlay = render_markers(
+                markers,
+                assets.icons,
+                assets.label_font,
+                FRAME_PROJECTION,
+                FRAME_SIZE,
             )
+            self._marker_overlay = (markers, overlay)
+        return self._marker_overlay[1]
 
     async def __async_build_images_list(self, image_type: ImageType) -> None:
         await self._hass.async_add_executor_job(self.__build_images_list, image_type)
 
     def __build_images_list(self, image_type: ImageType) -> None:
-        self._images[image_type] = []
-        files = glob.glob(
-            os.path.join(self.__get_storage_path(image_type), "*[0-9].png")
-        )
-        files.sort()
-        for file in files:
-            self._images[image_type].append(file)
+        self._images[image_type].load()
         self.__keep_last_images(image_type)
 
-    async def async_get_animated_image(self, image_type: ImageType) -> bytes | None:
-        """Get the animated image."""
+    async def async_get_animated_image(
+        self,
+        image_type: ImageType,
+        width: int | None = None,
+        height: int | None = None,
+    ) -> bytes | None:
+        """Get the animated image, scaled down if a smaller size is requested."""
+        return self.__served(
+            image_type, await self.__async_get_animated_image(image_type, width, height)
+        )
+
+    async def __async_get_animated_image(
+        self, image_type: ImageType, width: int | None, height: int | None
+    ) -> bytes | None:
+        animation = self._animations[image_type]
+        fmt = self.animation_format
+        if (size := resize_width(width, height, FRAME_SIZE)) is not None:
+            if (data := animation.cached_resized(size, fmt)) is not None:
+                return data
+            if animation.data is None:
+                await self._hass.async_add_executor_job(
+                    self.__get_animated_image, image_type
+                )
+            return await self._hass.async_add_executor_job(animation.resized, size, fmt)
+        if (data := animation.data) is not None:
+            return data
         return await self._hass.async_add_executor_job(
             self.__get_animated_image, image_type
         )
 
+    async def async_get_latest_image(self, image_type: ImageType) -> bytes | None:
+        """Get the latest frame in the selected format."""
+        animation = self._animations[image_type]
+        fmt = self.still_format
+        if (data := animation.cached_still(fmt)) is None:
+            data = await self._hass.async_add_executor_job(animation.still, fmt)
+        return self.__served(image_type, data)
+
+    def __served(self, image_type: ImageType, data: bytes | None) -> bytes | None:
+        if data is not None and not self._first_served:
+            self._first_served = True
+            _LOGGER.debug(
+                "First image (%s) served %.2f s after setup",
+                image_type.value,
+                time.monotonic() - self._setup_time,
+            )
+        return data
+
+    def animated_image_token(self, image_type: ImageType) -> str | None:
+        """Get the change token of the animated image."""
+        return self._animations[image_type].token
+
+    def latest_image_token(self, image_type: ImageType) -> str | None:
+        """Get the change token of the latest frame, in the selected format."""
+        if (token := self._animations[image_type].still_token) is None:
+            return None
+        return f"{token}-{self.still_format.value}"
+
     def __get_animated_image(self, image_type: ImageType) -> bytes | None:
-        animated_path = f"{self.__get_storage_path(image_type)}/animated.png"
+        animated_path = self.__get_animated_path(image_type)
         if os.path.exists(animated_path):
             with open(animated_path, "rb") as image_file:
-                return image_file.read()
+                data = image_file.read()
+            self._animations[image_type].set_data(data)
+            return data
         return None
 
+    def __get_animated_path(self, image_type: ImageType) -> str:
+        extension = EXTENSIONS[self.animation_format]
+        return f"{self.__get_storage_path(image_type)}/animated.{extension}"
+
     def __get_storage_path(self, image_type: ImageType) -> str:
         return self._storage_paths.get(image_type, "")
 
+    async def async_set_animation_format(self, fmt: AnimationFormat) -> None:
+        """Select the animation format and re-encode all animations."""
+        old_paths = [self.__get_animated_path(image_type) for image_type in IMAGE_URLS]
+        self.set_setting(ANIMATION_FORMAT, fmt.value, store=True)
+        await self._hass.async_add_executor_job(self.__remove_files, old_paths)
+        await self.async_force_refresh()
+
+    def set_still_format(self, fmt: StillFormat) -> None:
+        """Select the format of the latest frames, encoded on the next request."""
+        self.set_setting(STILL_FORMAT, fmt.value, store=True)
+
+    def __remove_files(self, paths: list[str]) -> None:
+        for path in paths:
+            if os.path.exists(path):
+                os.remove(path)
+
     async def async_force_refresh(self) -> None:
         """Force refresh of the images."""
         _LOGGER.debug("Refreshing Weerplaza images")
@@ -409,26 +908,51 @@ class WeerplazaApi:
             if not self.__is_camera_registered(image_type):
                 continue
             await self.__async_create_animated_gif(image_type)
+        # Frames kept in memory only are written once persisting is enabled
+        self.__schedule_flush()
 
     def __is_camera_registered(self, image_type: ImageType) -> bool:
-        return self._cameras.get(image_type, False)
+        return self._cameras.get(image_type, 0) > 0
 
     async def async_register_camera(self, image_type: ImageType) -> None:
         """Register a camera for the given image type."""
-        await self._hass.async_add_executor_job(self.__register_camera, image_type)
+        # Both the animated and the latest frame camera register the layer
+        self._cameras[image_type] += 1
+        if self._cameras[image_type] == 1:
+            await self._hass.async_add_executor_job(self.__register_camera, image_type)
 
     def __register_camera(self, image_type: ImageType) -> None:
-        self._cameras[image_type] = True
         storage_path = self.__get_storage_path(image_type)
         if not os.path.exists(storage_path):
             os.makedirs(storage_path, exist_ok=True)
+        # Warm start: serve the stored animation until the first refresh, which
+        # then only fetches the frames missing from the stored index
+        if not self._images[image_type].loaded:
+            self.__build_images_list(image_type)
+        if self._animations[image_type].data is None:
+            self.__get_animated_image(image_type)
 
     async def async_unregister_camera(self, image_type: ImageType) -> None:
         """Unregister a camera for the given image type."""
+        self._cameras[image_type] = max(self._cameras[image_type] - 1, 0)
+        if self.__is_camera_registered(image_type):
+            return
         await self._hass.async_add_executor_job(self.__unregister_camera, image_type)
 
     def __unregister_camera(self, image_type: ImageType) -> None:
-        self._cameras[image_type] = False
+        self._latest_frames.pop(image_type, None)
+        self._animations[image_type].clear()
+        self._frame_store.discard(self._images[image_type].filenames)
+        self._images[image_type].clear()
+        # When unloading (e.g. a reload) the stored frames are kept for a
+        # warm start, otherwise the camera was disabled or removed
         storage_path = self.__get_storage_path(image_type)
-        if os.path.exists(storage_path):
+        if not self._unloading and os.path.exists(storage_path):
             rmtree(storage_path)
+
+    async def async_unload(self) -> None:
+        """Write all pending frames and keep them, before the cameras unload."""
+        self._unloading = True
+        self._renderer.shutdown()
+        self._decoders.shutdown(wait=False, cancel_futures=True)
+        await self._hass.async_add_executor_job(self.__flush_frames)
@@ -1,6 +1,7 @@
 """Weerplaza Camera Component for Home Assistant."""
 
-from dataclasses import dataclass
+from dataclasses import dataclass, replace
+from typing import Any
 from homeassistant.config_entries import ConfigEntry
 from homeassistant.core import HomeAssistant
 from homeassistant.components.camera import Camera, CameraEntityDescription
@@ -19,7 +20,7 @@ from .const import (
     RAIN_LIGHTNING,
     ImageType,
 )
-from .coordinator import WeerplazaDataUpdateCoordinator
+from .coordinator import WeerplazaLayerCoordinator
 from .entity import WeerplazaEntity
 
 
@@ -31,6 +32,7 @@ class WeerplazaCameraEntityDescription(CameraEntityDescription):
     translation_key: str | None = None
     icon: str | None = None
     image_type: ImageType
+    still: bool = False
     entity_registry_enabled_default: bool = True
     entity_registry_visible_default: bool = True
 
@@ -89,6 +91,17 @@ def __get_descriptions(hass: HomeAssistant) -> list[WeerplazaCameraEntityDescrip
                 entity_registry_enabled_default=False,
             ),
         )
+    # Every image type also gets a camera with only its latest frame
+    descriptions.extend(
+        replace(
+            description,
+            key=f"{description.key}_latest",
+            translation_key=f"{description.translation_key}_latest",
+            still=True,
+            entity_registry_enabled_default=False,
+        )
+        for description in list(descriptions)
+    )
     return descriptions
 
 
@@ -106,7 +119,7 @@ async def async_setup_entry(
     for description in __get_descriptions(hass):
         entities.append(
             WeerplazaCamera(
-                coordinator=coordinator,
+                coordinator=coordinator.layers[description.image_type],
                 entry_id=entry.entry_id,
                 description=description,
             )
@@ -120,7 +133,7 @@ class WeerplazaCamera(WeerplazaEntity, Camera):
 
     def __init__(
         self,
-        coordinator: WeerplazaDataUpdateCoordinator,
+        coordinator: WeerplazaLayerCoordinator,
         entry_id: str,
         description: WeerplazaCameraEntityDescription,
     ) -> None:
@@ -130,7 +143,9 @@ class WeerplazaCamera(WeerplazaEntity, Camera):
             coordinator=coordinator, description=description, entry_id=entry_id
         )
 
-        self._attr_content_type = "image/gif"
+        self._attr_content_type = coordinator.api.animation_content_type
+        if description.still:
+            self._attr_content_type = coordinator.api.still_content_type
         self._attr_unique_id = f"{entry_id}_{description.key}"
 
     async def async_camera_image(
@@ -138,9 +153,24 @@ class WeerplazaCamera(WeerplazaEntity, Camera):
     ) -> bytes | None:
         """Return bytes of camera image or None."""
         image_type = self.entity_description.image_type or ImageType.RAIN_RADAR  # type: ignore
-        image = await self.coordinator.api.async_get_animated_image(image_type)
+        if self.entity_description.still:  # type: ignore
+            image = await self.coordinator.api.async_get_latest_image(image_type)
+            self._attr_content_type = self.coordinator.api.still_content_type
+            return image
+        image = await self.coordinator.api.async_get_animated_image(
+            image_type, width, height
+        )
+        self._attr_content_type = self.coordinator.api.animation_content_type
         return image
 
+    @property
+    def extra_state_attributes(self) -> dict[str, Any]:
+        """Return the change token of the current image."""
+        image_type = self.entity_description.image_type  # type: ignore
+        if self.entity_description.still:  # type: ignore
+            return {"image_token": self.coordinator.api.latest_image_token(image_type)}
+        return {"image_token": self.coordinator.api.animated_image_token(image_type)}
+
     async def async_added_to_hass(self) -> None:
         """Run when entity about to be added to hass."""
         await super().async_added_to_hass()
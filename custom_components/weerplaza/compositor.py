@@ -0,0 +1,113 @@
+"""NumPy alpha compositing for the Weerplaza frames."""
+
+import numpy as np
+
+# Layers with fewer visible pixels than this share of the frame (the rain,
+# the borders) only blend their visible pixels
+SPARSE_LAYER = 0.25
+
+
+class Compositor:
+    """Blend RGBA uint8 layers onto frames in place.
+
+    The blend matches Image.paste(layer, (0, 0), layer): every channel,
+    alpha included, is interpolated towards the layer by the layer's alpha.
+    Intermediate results are kept in preallocated scratch buffers, so
+    compositing a frame does not allocate full-size images. Because of those
+    buffers an instance must not be shared between threads. Transparent
+    pixels leave the frame as it is, so mostly transparent layers only
+    blend their visible pixels.
+    """
+
+    def __init__(self, height: int, width: int) -> None:
+        self._shape = (height, width, 4)
+        self._scratch = np.empty(self._shape, dtype=np.uint16)
+        self._scratch_under = np.empty(self._shape, dtype=np.uint16)
+        self._alpha = np.empty((height, width, 1), dtype=np.uint16)
+
+    def blend(self, frame: np.ndarray, layer: np.ndarray) -> None:
+        """Blend layer over frame (both H x W x 4 uint8), in place."""
+        rows, cols = frame.shape[:2]
+        visible: np.ndarray | tuple[np.ndarray, ...]
+        if frame.flags.c_contiguous and layer.flags.c_contiguous:
+            # Flat indices are cheaper to find and to gather by
+            pixels, layer_pixels = frame.reshape(-1, 4), layer.reshape(-1, 4)
+            visible = np.flatnonzero(layer[..., 3])
+            count = visible.size
+        else:
+            pixels, layer_pixels = frame, layer
+            visible = np.nonzero(layer[..., 3])
+            count = visible[0].size
+        if count < SPARSE_LAYER * rows * cols:
+            selected = pixels[visible]
+            self.__blend(
+                selected,
+                layer_pixels[visible],
+                self._scratch.reshape(-1, 4)[:count],
+                self._scratch_under.reshape(-1, 4)[:count],
+                self._alpha.reshape(-1, 1)[:count],
+            )
+            pixels[visible] = selected
+            return
+        self.__blend(
+            frame,
+            layer,
+            self._scratch[:rows, :cols],
+            self._scratch_under[:rows, :cols],
+            self._alpha[:rows, :cols],
+        )
+
+    def blend_at(self, frame: np.ndarray, layer: np.ndarray, x: int, y: int) -> None:
+        """Blend a small layer over frame with its top left corner at x, y.
+
+        Only the overlapping area is blended; parts of the layer outside the
+        frame are clipped, as Image.paste does.
+        """
+        height, width = layer.shape[:2]
+        left, top = max(x, 0), max(y, 0)
+        right = min(x + width, frame.shape[1])
+        bottom = min(y + height, frame.shape[0])
+        if left >= right or top >= bottom:
+            return
+        self.blend(
+            frame[top:bottom, left:right],
+            layer[top - y : bottom - y, left - x : right - x],
+        )
+
+    @staticmethod
+    def __blend(
+        frame: np.ndarray,
+        layer: np.ndarray,
+        scratch: np.ndarray,
+        under: np.ndarray,
+        alpha: np.ndarray,
+    ) -> None:
+        np.copyto(alpha, layer[..., 3:4])
+        # frame + (layer - frame) * alpha / 255, computed as
+        # (frame * (255 - alpha) + layer * alpha + 127) // 255, which never
+        # exceeds 255 * 255 + 127 and so fits in uint16
+        np.multiply(layer, alpha, out=scratch, dtype=np.uint16)
+        np.subtract(255, alpha, out=alpha)
+        np.multiply(frame, alpha, out=under, dtype=np.uint16)
+        scratch += under
+        scratch += 127
+        scratch //= 255
+        np.copyto(frame, scratch, casting="unsafe")
+
+    def composite(self, base: np.ndarray, layers: list[np.ndarray]) -> np.ndarray:
+        """Return a copy of base with all layers blended over it in order."""
+        frame = base.copy()
+        for layer in layers:
+            self.blend(frame, layer)
+        return frame
+
+    def composite_batch(
+        self, base: np.ndarray, frames_layers: list[list[np.ndarray]]
+    ) -> np.ndarray:
+        """Composite several frames in one call into an N x H x W x 4 array."""
+        frames = np.empty((len(frames_layers), *self._shape), dtype=np.uint8)
+        frames[...] = base
+        for frame, layers in zip(frames, frames_layers):
+            for layer in layers:
+                self.blend(frame, layer)
+        return frames
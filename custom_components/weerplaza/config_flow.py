@@ -6,10 +6,30 @@ from typing import Any
 import voluptuous as vol
 
 from homeassistant import config_entries
-from homeassistant.config_entries import ConfigFlowResult
+from homeassistant.config_entries import ConfigEntry, ConfigFlowResult
+from homeassistant.core import callback
 from homeassistant.exceptions import HomeAssistantError
+from homeassistant.helpers.selector import (
+    NumberSelector,
+    NumberSelectorConfig,
+    NumberSelectorMode,
+    SelectSelector,
+    SelectSelectorConfig,
+)
 
-from .const import DOMAIN, NAME
+from .const import (
+    CONF_FRAMES,
+    CONF_HOURS,
+    CONF_LAYER,
+    DEFAULT_FRAMES,
+    DEFAULT_HOURS,
+    DOMAIN,
+    NAME,
+    ImageType,
+)
+
+MAX_FRAMES = 72
+MAX_HOURS = 12
 
 
 class ConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
@@ -33,6 +53,86 @@ class ConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
 
         return self.async_create_entry(title=NAME, data=user_input)
 
+    @staticmethod
+    @callback
+    def async_get_options_flow(config_entry: ConfigEntry) -> OptionsFlowHandler:
+        """Get the options flow for this handler."""
+        return OptionsFlowHandler()
+
+
+class OptionsFlowHandler(config_entries.OptionsFlow):
+    """Handle the animation length and window per layer."""
+
+    def __init__(self) -> None:
+        """Initialize options flow."""
+        self._layer: str | None = None
+
+    async def async_step_init(
+        self, user_input: dict[str, Any] | None = None
+    ) -> ConfigFlowResult:
+        """Select the layer to configure."""
+        if user_input is not None:
+            self._layer = user_input[CONF_LAYER]
+            return await self.async_step_layer()
+
+        return self.async_show_form(
+            step_id="init",
+            data_schema=vol.Schema(
+                {
+                    vol.Required(CONF_LAYER): SelectSelector(
+                        SelectSelectorConfig(
+                            options=[image_type.value for image_type in ImageType],
+                            translation_key=CONF_LAYER,
+                        )
+                    ),
+                }
+            ),
+        )
+
+    async def async_step_layer(
+        self, user_input: dict[str, Any] | None = None
+    ) -> ConfigFlowResult:
+        """Set the number of frames and the look-back window of the layer."""
+        assert self._layer is not None
+        if user_input is not None:
+            return self.async_create_entry(
+                data={
+                    **self.config_entry.options,
+                    self._layer: {
+                        CONF_FRAMES: int(user_input[CONF_FRAMES]),
+                        CONF_HOURS: user_input[CONF_HOURS],
+                    },
+                }
+            )
+
+        current = self.config_entry.options.get(self._layer, {})
+        return self.async_show_form(
+            step_id="layer",
+            data_schema=vol.Schema(
+                {
+                    vol.Required(
+                        CONF_FRAMES, default=current.get(CONF_FRAMES, DEFAULT_FRAMES)
+                    ): NumberSelector(
+                        NumberSelectorConfig(
+                            min=2, max=MAX_FRAMES, mode=NumberSelectorMode.BOX
+                        )
+                    ),
+                    vol.Required(
+                        CONF_HOURS, default=current.get(CONF_HOURS, DEFAULT_HOURS)
+                    ): NumberSelector(
+                        NumberSelectorConfig(
+                            min=0.5,
+                            max=MAX_HOURS,
+                            step=0.5,
+                            unit_of_measurement="h",
+                            mode=NumberSelectorMode.BOX,
+                        )
+                    ),
+                }
+            ),
+            description_placeholders={"layer": self._layer},
+        )
+
 
 class CannotConnect(HomeAssistantError):
     """Error to indicate we cannot connect."""
@@ -7,12 +7,30 @@ DOMAIN = NAME.lower()
 MANUFACTURER = NAME
 
 DEFAULT_SYNC_INTERVAL = 300  # seconds
+DEFAULT_FRAMES = 18
+DEFAULT_HOURS = 12
+
+CONF_LAYER = "layer"
+CONF_FRAMES = "frames"
+CONF_HOURS = "hours"
 
 DEFAULT_NAME = NAME.lower()
 
 MARKER_LATITUDE = "marker_latitude"
 MARKER_LONGITUDE = "marker_longitude"
 SHOW_MARKER = "show_marker"
+MARKERS = "markers"
+ANIMATION_FORMAT = "animation_format"
+STILL_FORMAT = "still_format"
+FRAME_MEMORY_BUDGET = "frame_memory_budget"
+PERSIST_FRAMES = "persist_frames"
+PROCESS_RENDERING = "process_rendering"
+FRAME_MEMORY = "frame_memory"
+RAIN_RADIUS = "rain_radius"
+RAIN_INTENSITY = "rain_intensity"
+NOWCAST = "nowcast"
+NOWCAST_SCALE = "nowcast_scale"
+RAIN_ONSET = "rain_onset"
 LAST_UPDATED = "last_updated"
 RAIN_RADAR = "rain_radar"
 SATELLITE = "satellite"
@@ -33,3 +51,19 @@ class ImageType(Enum):
     DRIZZLE_SNOW = DRIZZLE_SNOW
     RADAR_SATELLITE = RADAR_SATELLITE
     RAIN_LIGHTNING = RAIN_LIGHTNING
+
+
+class AnimationFormat(Enum):
+    """Enum for animation output formats."""
+
+    APNG = "apng"
+    WEBP = "webp"
+    WEBP_LOSSLESS = "webp_lossless"
+    GIF = "gif"
+
+
+class StillFormat(Enum):
+    """Enum for the formats of the latest frame."""
+
+    WEBP = "webp"
+    PNG = "png"
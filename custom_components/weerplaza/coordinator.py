@@ -1,23 +1,35 @@
 """Weerplaza Data Update Coordinator"""
 
+import asyncio
 from datetime import timedelta
 import logging
+import time
 
+import async_timeout
 from homeassistant import config_entries
 from homeassistant.helpers.update_coordinator import DataUpdateCoordinator, UpdateFailed
 from homeassistant.core import HomeAssistant
 
-from .api import WeerplazaApi
+from .api import IMAGE_URLS, WeerplazaApi
 from .const import (
-    DEFAULT_SYNC_INTERVAL,
     DOMAIN,
+    ImageType,
 )
+from .scheduler import MIN_INTERVAL, LayerSchedule
+
+LAYER_TIMEOUT = 120  # seconds
 
 _LOGGER: logging.Logger = logging.getLogger(__package__)
 
 
 class WeerplazaDataUpdateCoordinator(DataUpdateCoordinator):
-    """Class to manage fetching data from the API."""
+    """Class to manage the layer coordinators.
+
+    Every image type is updated by its own WeerplazaLayerCoordinator. This
+    coordinator does not poll; it refreshes all layers once at setup and
+    notifies its listeners (the settings and last updated entities) whenever
+    a layer was updated.
+    """
 
     def __init__(
         self,
@@ -27,19 +39,77 @@ class WeerplazaDataUpdateCoordinator(DataUpdateCoordinator):
     ) -> None:
         """Initialize."""
         self.api: WeerplazaApi = api
+        self.layers: dict[ImageType, WeerplazaLayerCoordinator] = {
+            image_type: WeerplazaLayerCoordinator(hass, self, image_type, config_entry)
+            for image_type in IMAGE_URLS
+        }
 
         super().__init__(
             hass,
             _LOGGER,
             name=DOMAIN,
-            update_interval=timedelta(seconds=DEFAULT_SYNC_INTERVAL),
+            update_interval=None,
+            config_entry=config_entry,
+        )
+
+    async def _async_update_data(self) -> None:
+        """Update all registered layers."""
+        await asyncio.gather(
+            *(
+                self.layers[image_type].async_refresh()
+                for image_type in self.api.registered_image_types()
+            )
+        )
+
+
+class WeerplazaLayerCoordinator(DataUpdateCoordinator):
+    """Class to manage fetching the images of a single image type.
+
+    Each layer has its own schedule, timeout and failure state, so a slow or
+    failing layer does not hold back the others.
+    """
+
+    def __init__(
+        self,
+        hass: HomeAssistant,
+        hub: WeerplazaDataUpdateCoordinator,
+        image_type: ImageType,
+        config_entry: config_entries.ConfigEntry,
+    ) -> None:
+        """Initialize."""
+        self.hub = hub
+        self.api: WeerplazaApi = hub.api
+        self.image_type = image_type
+        self.schedule = LayerSchedule()
+
+        super().__init__(
+            hass,
+            _LOGGER,
+            name=f"{DOMAIN}_{image_type.value}",
+            update_interval=timedelta(seconds=MIN_INTERVAL),
             config_entry=config_entry,
         )
 
     async def _async_update_data(self) -> None:
         """Update data via api."""
         try:
-            await self.api.async_get_new_images()
+            async with async_timeout.timeout(LAYER_TIMEOUT):
+                updated = await self.api.async_update_layer(self.image_type)
         except Exception as exception:
-            _LOGGER.warning("Error communicating with API: %s", exception)
+            _LOGGER.warning(
+                "Error communicating with API (%s): %s", self.image_type, exception
+            )
+            self.__retry()
             raise UpdateFailed from exception
+        if not updated:
+            self.__retry()
+            raise UpdateFailed(f"No images received for {self.image_type.value}")
+
+        now = time.time()
+        next_poll = self.schedule.observe(self.api.frame_times(self.image_type), now)
+        self.update_interval = timedelta(seconds=max(next_poll - now, MIN_INTERVAL))
+        self.hub.async_update_listeners()
+
+    def __retry(self) -> None:
+        # Failed updates do not count as polls of the schedule, retry soon
+        self.update_interval = timedelta(seconds=MIN_INTERVAL)
@@ -0,0 +1,241 @@
+"""Encoders for the Weerplaza animations."""
+
+from dataclasses import dataclass
+from io import BytesIO
+from itertools import pairwise
+import struct
+import zlib
+
+import numpy as np
+from PIL import Image
+
+from .const import AnimationFormat
+
+WEBP_QUALITY = 80
+# GIF frames share one palette, the last entry is kept for transparency
+GIF_COLORS = 255
+GIF_SAMPLE_STEP = 4
+
+CONTENT_TYPES = {
+    AnimationFormat.APNG: "image/png",
+    AnimationFormat.WEBP: "image/webp",
+    AnimationFormat.WEBP_LOSSLESS: "image/webp",
+    AnimationFormat.GIF: "image/gif",
+}
+
+EXTENSIONS = {
+    AnimationFormat.APNG: "png",
+    AnimationFormat.WEBP: "webp",
+    AnimationFormat.WEBP_LOSSLESS: "webp",
+    AnimationFormat.GIF: "gif",
+}
+
+
+APNG_DISPOSE_OP_NONE = 0
+APNG_BLEND_OP_SOURCE = 0
+APNG_BLEND_OP_OVER = 1
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+
+def encode(
+    frames: list[np.ndarray], durations: list[int], fmt: AnimationFormat
+) -> bytes:
+    """Encode RGBA frames as a looping animation (or a still for one frame)."""
+    if fmt == AnimationFormat.APNG and len(frames) > 1:
+        return encode_apng(frames, durations)
+
+    images = [Image.fromarray(frame) for frame in frames]
+    if fmt == AnimationFormat.GIF:
+        images = quantize(images)
+        params = {"transparency": GIF_COLORS, "optimize": False}
+        image_format = "GIF"
+    elif fmt == AnimationFormat.APNG:
+        params = {}
+        image_format = "PNG"
+    else:
+        params = {
+            "lossless": fmt == AnimationFormat.WEBP_LOSSLESS,
+            "quality": WEBP_QUALITY,
+        }
+        image_format = "WEBP"
+
+    stream = BytesIO()
+    if len(images) == 1:
+        images[0].save(stream, format=image_format, **params)
+    else:
+        # Pillow only stores the changed area of each GIF frame and libwebp
+        # picks sub-frame rectangles and blending itself
+        images[0].save(
+            stream,
+            format=image_format,
+            save_all=True,
+            append_images=images[1:],
+            loop=0,
+            duration=durations,
+            **params,
+        )
+    return stream.getvalue()
+
+
+def quantize(images: list[Image.Image]) -> list[Image.Image]:
+    """Convert RGBA images to palette images sharing a single palette."""
+    sample = np.concatenate(
+        [
+            np.asarray(image.convert("RGB"))[::GIF_SAMPLE_STEP, ::GIF_SAMPLE_STEP]
+            for image in images
+        ]
+    )
+    palette = Image.fromarray(sample).quantize(
+        GIF_COLORS, method=Image.Quantize.MEDIANCUT
+    )
+    frames: list[Image.Image] = []
+    for image in images:
+        frame = image.convert("RGB").quantize(palette=palette, dither=Image.Dither.NONE)
+        transparent = np.asarray(image.getchannel("A")) < 128
+        if transparent.any():
+            frame.paste(
+                GIF_COLORS, mask=Image.fromarray(transparent.astype(np.uint8) * 255)
+            )
+        frames.append(frame)
+    return frames
+
+
+@dataclass(frozen=True)
+class ApngPart:
+    """An encoded APNG (sub-)frame, muxed into an animation by mux_apng."""
+
+    x: int
+    y: int
+    width: int
+    height: int
+    blend: int
+    header: bytes  # IHDR of the (sub-)frame
+    data: tuple[bytes, ...]  # IDAT payloads
+
+    @property
+    def nbytes(self) -> int:
+        """Return the size of the encoded data."""
+        return len(self.header) + sum(len(data) for data in self.data)
+
+
+def apng_part(previous: np.ndarray | None, frame: np.ndarray) -> ApngPart | None:
+    """Encode what changed in frame since previous (a full frame without one).
+
+    The sub-frame is the bounding box of the pixels that differ from the
+    previous frame. When all changed pixels are opaque, unchanged pixels
+    inside that box are made transparent and the sub-frame is blended over
+    the previous one, which compresses much better. None is returned for a
+    frame without changes. A full frame is a valid part after any frame.
+    """
+    if previous is None:
+        return _encode_part(frame, 0, 0, APNG_BLEND_OP_SOURCE)
+    changed = np.any(frame != previous, axis=2)
+    rows = np.flatnonzero(changed.any(axis=1))
+    if not rows.size:
+        return None
+    cols = np.flatnonzero(changed.any(axis=0))
+    top, bottom = rows[0], rows[-1] + 1
+    left, right = cols[0], cols[-1] + 1
+    sub = frame[top:bottom, left:right]
+    mask = changed[top:bottom, left:right]
+    if np.all(sub[mask, 3] == 255):
+        sub = np.where(mask[..., None], sub, np.uint8(0))
+        blend = APNG_BLEND_OP_OVER
+    else:
+        blend = APNG_BLEND_OP_SOURCE
+    return _encode_part(sub, int(left), int(top), blend)
+
+
+def mux_apng(parts: list[ApngPart | None], durations: list[int]) -> bytes:
+    """Write encoded parts as a looping APNG (or a PNG for a single frame).
+
+    The first part must be a full frame. Parts without changes (None) only
+    extend the duration of the frame before them.
+    """
+    frames: list[tuple[ApngPart, int]] = []
+    for part, duration in zip(parts, durations):
+        if part is None:
+            previous, total = frames[-1]
+            frames[-1] = (previous, total + duration)
+        else:
+            frames.append((part, duration))
+
+    stream = BytesIO()
+    stream.write(PNG_SIGNATURE)
+    _write_chunk(stream, b"IHDR", frames[0][0].header)
+    if len(frames) == 1:
+        for data in frames[0][0].data:
+            _write_chunk(stream, b"IDAT", data)
+        _write_chunk(stream, b"IEND", b"")
+        return stream.getvalue()
+
+    _write_chunk(stream, b"acTL", struct.pack(">II", len(frames), 0))
+    sequence = 0
+    for index, (part, duration) in enumerate(frames):
+        _write_chunk(
+            stream,
+            b"fcTL",
+            struct.pack(
+                ">IIIIIHHBB",
+                sequence,
+                part.width,
+                part.height,
+                part.x,
+                part.y,
+                duration,
+                1000,
+                APNG_DISPOSE_OP_NONE,
+                part.blend,
+            ),
+        )
+        sequence += 1
+        for data in part.data:
+            if index == 0:
+                _write_chunk(stream, b"IDAT", data)
+            else:
+                _write_chunk(stream, b"fdAT", struct.pack(">I", sequence) + data)
+                sequence += 1
+    _write_chunk(stream, b"IEND", b"")
+    return stream.getvalue()
+
+
+def encode_apng(frames: list[np.ndarray], durations: list[int]) -> bytes:
+    """Encode RGBA frames as an APNG storing only what changed per frame."""
+    parts = [apng_part(None, frames[0])]
+    parts.extend(apng_part(previous, frame) for previous, frame in pairwise(frames))
+    return mux_apng(parts, durations)
+
+
+def _encode_part(frame: np.ndarray, x: int, y: int, blend: int) -> ApngPart:
+    chunks = _png_chunks(frame)
+    return ApngPart(
+        x,
+        y,
+        frame.shape[1],
+        frame.shape[0],
+        blend,
+        chunks[b"IHDR"][0],
+        tuple(chunks[b"IDAT"]),
+    )
+
+
+def _png_chunks(frame: np.ndarray) -> dict[bytes, list[bytes]]:
+    """Encode a frame as PNG and return its chunks by type."""
+    stream = BytesIO()
+    Image.fromarray(frame).save(stream, format="PNG")
+    data = stream.getvalue()
+    chunks: dict[bytes, list[bytes]] = {}
+    offset = len(PNG_SIGNATURE)
+    while offset < len(data):
+        (length,) = struct.unpack(">I", data[offset : offset + 4])
+        chunk_type = data[offset + 4 : offset + 8]
+        chunks.setdefault(chunk_type, []).append(data[offset + 8 : offset + 8 + length])
+        offset += length + 12
+    return chunks
+
+
+def _write_chunk(stream: BytesIO, chunk_type: bytes, data: bytes) -> None:
+    stream.write(struct.pack(">I", len(data)))
+    stream.write(chunk_type)
+    stream.write(data)
+    stream.write(struct.pack(">I", zlib.crc32(chunk_type + data)))
@@ -6,17 +6,19 @@ from homeassistant.helpers.entity import EntityDescription
 from homeassistant.helpers.update_coordinator import CoordinatorEntity
 
 from .const import DEFAULT_NAME, DOMAIN, MANUFACTURER, NAME
-from .coordinator import WeerplazaDataUpdateCoordinator
+from .coordinator import WeerplazaDataUpdateCoordinator, WeerplazaLayerCoordinator
 
 
-class WeerplazaEntity(CoordinatorEntity[WeerplazaDataUpdateCoordinator]):
+class WeerplazaEntity(
+    CoordinatorEntity[WeerplazaDataUpdateCoordinator | WeerplazaLayerCoordinator]
+):
     """Base class for Weerplaza entities."""
 
     _attr_has_entity_name = True
 
     def __init__(
         self,
-        coordinator: WeerplazaDataUpdateCoordinator,
+        coordinator: WeerplazaDataUpdateCoordinator | WeerplazaLayerCoordinator,
         description: EntityDescription,
         entry_id: str,
     ) -> None:
@@ -0,0 +1,102 @@
+"""Persistent index of the stored frames of a layer."""
+
+import bisect
+import glob
+import json
+import logging
+import os
+
+INDEX_FILENAME = "frames.json"
+FRAME_PATTERN = "*[0-9].png"
+
+_LOGGER: logging.Logger = logging.getLogger(__package__)
+
+
+class FrameIndex:
+    """Sorted index of the frame files of one layer.
+
+    The index lives in memory, as a sorted list of file names plus a set for
+    membership checks, and is saved as a JSON manifest next to the frames.
+    The storage directory is only scanned when the manifest is missing or
+    corrupt. Frame file names sort by time, so the list is in frame order.
+    """
+
+    def __init__(self, path: str) -> None:
+        self._path = path
+        self._names: list[str] = []
+        self._members: set[str] = set()
+        self.loaded = False
+
+    def __contains__(self, filename: str) -> bool:
+        return os.path.basename(filename) in self._members
+
+    def __len__(self) -> int:
+        return len(self._names)
+
+    @property
+    def filenames(self) -> list[str]:
+        """Return the full paths of the frames, oldest first."""
+        return [os.path.join(self._path, name) for name in self._names]
+
+    def load(self) -> None:
+        """Load the manifest, or rebuild it from the directory."""
+        try:
+            with open(self.__manifest, encoding="utf-8") as manifest:
+                names = json.load(manifest)
+            if not isinstance(names, list) or not all(
+                isinstance(name, str) for name in names
+            ):
+                raise ValueError("Invalid frame index")
+        except (OSError, ValueError) as e:
+            _LOGGER.debug("Rebuilding frame index for %s: %s", self._path, e)
+            names = [
+                os.path.basename(file)
+                for file in glob.glob(os.path.join(self._path, FRAME_PATTERN))
+            ]
+            self.__set(names)
+            self.save()
+        else:
+            self.__set(names)
+        self.loaded = True
+
+    def __set(self, names: list[str]) -> None:
+        self._names = sorted(set(names))
+        self._members = set(self._names)
+
+    def add(self, filename: str) -> None:
+        """Add a frame file."""
+        name = os.path.basename(filename)
+        if name not in self._members:
+            bisect.insort(self._names, name)
+            self._members.add(name)
+
+    def evict(self, keep: int, oldest: str | None = None) -> list[str]:
+        """Drop all but the newest keep frames and return their full paths.
+
+        When oldest is given, frames older than that file name are dropped too.
+        """
+        count = max(len(self._names) - keep, 0)
+        if oldest is not None:
+            name = os.path.basename(oldest)
+            count = max(count, bisect.bisect_left(self._names, name))
+        evicted, self._names = self._names[:count], self._names[count:]
+        self._members.difference_update(evicted)
+        return [os.path.join(self._path, name) for name in evicted]
+
+    def save(self) -> None:
+        """Write the manifest (atomically, so it is never left half written)."""
+        if not os.path.isdir(self._path):
+            return
+        temp_path = f"{self.__manifest}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as manifest:
+            json.dump(self._names, manifest)
+        os.replace(temp_path, self.__manifest)
+
+    def clear(self) -> None:
+        """Forget all frames, e.g. when the storage directory is removed."""
+        self.__set([])
+        self.loaded = False
+
+    @property
+    def __manifest(self) -> str:
+        return os.path.join(self._path, INDEX_FILENAME)
@@ -0,0 +1,175 @@
+"""Memory budgeted store of the composited Weerplaza frames."""
+
+from collections.abc import Hashable
+import logging
+import os
+import threading
+
+import numpy as np
+from PIL import Image
+
+_LOGGER: logging.Logger = logging.getLogger(__package__)
+
+
+class FrameStore:
+    """Keep the composited frames of all layers in memory, within a budget.
+
+    Frames are kept as RGBA uint8 arrays keyed by file name. When frames are
+    persisted, new frames are written to disk later by flush (from a
+    background job) and frames that do not fit in the memory budget are
+    dropped, oldest first, and read back from disk when needed again.
+    Without persistence nothing is written to disk and frames that do not
+    fit in the budget are lost.
+    """
+
+    def __init__(self, budget: int, persist: bool = True) -> None:
+        self._budget = budget
+        self._persist = persist
+        self._frames: dict[str, np.ndarray] = {}
+        self._dirty: dict[str, int | None] = {}
+        self._writing: set[str] = set()
+        self._reserved: dict[Hashable, int] = {}
+        self._memory = 0
+        self._dropped = False
+        self._lock = threading.Lock()
+
+    @property
+    def memory_usage(self) -> int:
+        """Return the number of bytes used by the frames in memory."""
+        return self._memory
+
+    def reserve(self, owner: Hashable, size: int) -> None:
+        """Count memory held elsewhere for the frames against the budget.
+
+        E.g. the encoded parts of an animation; frames are dropped from
+        memory to make room for it. A later call replaces the size of owner.
+        """
+        with self._lock:
+            self._memory += size - self._reserved.pop(owner, 0)
+            if size:
+                self._reserved[owner] = size
+            self.__trim()
+
+    @property
+    def budget(self) -> int:
+        """Return the memory budget in bytes."""
+        return self._budget
+
+    @budget.setter
+    def budget(self, budget: int) -> None:
+        with self._lock:
+            self._budget = budget
+            self._dropped = False
+            self.__trim()
+
+    @property
+    def persist(self) -> bool:
+        """Return whether frames are written to disk."""
+        return self._persist
+
+    @persist.setter
+    def persist(self, persist: bool) -> None:
+        with self._lock:
+            self._persist = persist
+            self._dropped = False
+            # Frames kept in memory only are written once persisting again
+            self._dirty = dict.fromkeys(self._frames) if persist else {}
+
+    def add(self, filename: str, frame: np.ndarray, mod_time: int | None) -> None:
+        """Add a frame, to be written to disk by the next flush."""
+        with self._lock:
+            self.__discard(filename)
+            self._frames[filename] = frame
+            self._memory += frame.nbytes
+            if self._persist:
+                self._dirty[filename] = mod_time
+            self.__trim()
+
+    def get(self, filename: str) -> np.ndarray | None:
+        """Return a frame, reading it back from disk if it is not in memory."""
+        with self._lock:
+            frame = self._frames.get(filename)
+        if frame is not None or not os.path.exists(filename):
+            return frame
+        with Image.open(filename) as image:
+            frame = np.array(image.convert("RGBA"))
+        with self._lock:
+            if filename not in self._frames:
+                self._frames[filename] = frame
+                self._memory += frame.nbytes
+                self.__trim()
+        return frame
+
+    def discard(self, filenames: list[str]) -> None:
+        """Drop frames from memory (and from the pending writes)."""
+        with self._lock:
+            for filename in filenames:
+                self.__discard(filename)
+
+    def flush(self) -> None:
+        """Write the frames added since the last flush to disk."""
+        with self._lock:
+            dirty, self._dirty = self._dirty, {}
+            frames = {
+                filename: self._frames[filename]
+                for filename in dirty
+                if filename in self._frames
+            }
+            # Frames being written are not on disk yet, keep them in memory
+            self._writing.update(frames)
+        try:
+            for filename, frame in frames.items():
+                self.__write(filename, frame, dirty[filename])
+                # Written frames may now be dropped from memory
+                with self._lock:
+                    self._writing.discard(filename)
+                    self.__trim()
+        finally:
+            with self._lock:
+                self._writing.difference_update(frames)
+
+    @staticmethod
+    def __write(filename: str, frame: np.ndarray, mod_time: int | None) -> None:
+        # Written next to the frame and moved in place, so a frame on disk is
+        # always complete
+        temp_filename = f"{filename}.tmp"
+        try:
+            Image.fromarray(frame).save(temp_filename, "PNG")
+            if mod_time is not None:
+                os.utime(temp_filename, (mod_time, mod_time))
+            os.replace(temp_filename, filename)
+        except OSError as e:
+            _LOGGER.error("Error writing image %s: %s", filename, e)
+            try:
+                os.remove(temp_filename)
+            except OSError:
+                pass
+
+    def __discard(self, filename: str) -> None:
+        frame = self._frames.pop(filename, None)
+        if frame is not None:
+            self._memory -= frame.nbytes
+        self._dirty.pop(filename, None)
+
+    def __trim(self) -> None:
+        # Frame file names sort by time, so drop the oldest frames first, but
+        # never frames that still have to be (or are being) written to disk
+        while self._memory > self._budget:
+            candidates = [
+                name
+                for name in self._frames
+                if name not in self._dirty and name not in self._writing
+            ]
+            if not candidates:
+                break
+            self.__discard(min(candidates, key=os.path.basename))
+            if not self._persist and not self._dropped:
+                # Without persistence the dropped frames are lost, warn once
+                # per budget
+                self._dropped = True
+                _LOGGER.warning(
+                    "The frame memory budget (%d MiB) is too small to keep all "
+                    "frames without storing them on disk, the oldest frames "
+                    "are dropped",
+                    self._budget // (1024 * 1024),
+                )
@@ -0,0 +1,87 @@
+"""Named markers (points of interest) drawn on the Weerplaza images."""
+
+from dataclasses import dataclass
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+
+from .tools import Projection
+
+DEFAULT_ICON = "pointer"
+LABEL_MARGIN = 4
+LABEL_COLOR = (254, 255, 255, 255)
+LABEL_OUTLINE_COLOR = (0, 0, 0, 255)
+
+
+@dataclass(frozen=True)
+class Marker:
+    """A named location, drawn as an icon with an optional label."""
+
+    name: str
+    latitude: float
+    longitude: float
+    icon: str = DEFAULT_ICON
+    label: str | None = None
+
+
+def render_markers(
+    markers: tuple[Marker, ...],
+    icons: dict[str, np.ndarray],
+    font: ImageFont.FreeTypeFont | ImageFont.ImageFont,
+    projection: Projection,
+    size: tuple[int, int],
+) -> tuple[np.ndarray, int, int] | None:
+    """Render all markers into a single overlay for frames of the given size.
+
+    All locations are projected in one batch and the icons and labels are
+    composited into one RGBA overlay, cropped to the area they cover, so a
+    frame needs one blend no matter how many markers there are. Return the
+    overlay and its position, or None when no marker falls within the frame.
+    """
+    if not markers:
+        return None
+    xs, ys = projection.forward(
+        np.array([marker.latitude for marker in markers]),
+        np.array([marker.longitude for marker in markers]),
+    )
+    xs, ys = np.rint(xs).astype(int), np.rint(ys).astype(int)
+    canvas = Image.new("RGBA", size, (0, 0, 0, 0))
+    draw = ImageDraw.Draw(canvas)
+    for marker, x, y in zip(markers, xs.tolist(), ys.tolist()):
+        icon = Image.fromarray(icons.get(marker.icon, icons[DEFAULT_ICON]))
+        _paste_icon(canvas, icon, x - int(icon.width / 2), y - int(icon.height / 2))
+        if marker.label:
+            draw.text(
+                (x + int(icon.width / 2) + LABEL_MARGIN, y),
+                marker.label,
+                font=font,
+                anchor="lm",
+                fill=LABEL_COLOR,
+                stroke_width=2,
+                stroke_fill=LABEL_OUTLINE_COLOR,
+            )
+
+    overlay = np.asarray(canvas)
+    rows = np.flatnonzero(overlay[..., 3].any(axis=1))
+    cols = np.flatnonzero(overlay[..., 3].any(axis=0))
+    if not len(rows):
+        return None
+    top, bottom = rows[0], rows[-1] + 1
+    left, right = cols[0], cols[-1] + 1
+    overlay = overlay[top:bottom, left:right].copy()
+    overlay.flags.writeable = False
+    return overlay, int(left), int(top)
+
+
+def _paste_icon(canvas: Image.Image, icon: Image.Image, left: int, top: int) -> None:
+    # Image.alpha_composite does not accept negative offsets, so crop the
+    # part of the icon that falls off the top or left edge
+    source = (max(-left, 0), max(-top, 0))
+    if (
+        source[0] >= icon.width
+        or source[1] >= icon.height
+        or left >= canvas.width
+        or top >= canvas.height
+    ):
+        return
+    canvas.alpha_composite(icon, (max(left, 0), max(top, 0)), source)
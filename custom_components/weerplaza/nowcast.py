@@ -0,0 +1,232 @@
+"""Precipitation nowcast: extrapolate the rain radar along its motion."""
+
+import math
+import threading
+
+import numpy as np
+
+from .precipitation import MIN_ALPHA, QUANT_SHIFT, RAIN_LOOKUP_TABLE
+
+BLOCK_SIZE = 8  # field pixels per motion block
+MAX_SPEED = 3.0  # frame pixels per minute (about 115 km/h)
+MAX_GAP = 20  # minutes between the frames the motion is estimated from
+SUBSTEP = 5  # minutes per step of the trajectory backtracking
+FIELDS_TO_KEEP = 3
+
+
+def intensity_field(layer: np.ndarray, scale: int) -> np.ndarray:
+    """Return the rain intensity of a radar layer, averaged over scale pixels.
+
+    Every field pixel is the mean of a block of scale x scale layer pixels,
+    so rain moving by a fraction of a field pixel still changes the field
+    (sampling every scale-th pixel would miss it). Intensities are log
+    scaled, so light and heavy rain weigh alike when matching fields.
+    """
+    rows, cols = layer.shape[0] // scale, layer.shape[1] // scale
+    alpha = layer[: rows * scale, : cols * scale, 3]
+    # Only the (few) pixels with rain are looked up and summed per block
+    ys, xs = np.nonzero(alpha >= MIN_ALPHA)
+    codes = layer[ys, xs, :3].astype(np.intp) >> QUANT_SHIFT
+    values = np.log1p(
+        RAIN_LOOKUP_TABLE[(codes[:, 0] << 10) | (codes[:, 1] << 5) | codes[:, 2]]
+    )
+    sums = np.bincount(
+        (ys // scale) * cols + xs // scale, weights=values, minlength=rows * cols
+    )
+    return (sums / (scale * scale)).reshape(rows, cols).astype(np.float32)
+
+
+def estimate_motion(
+    previous: np.ndarray, current: np.ndarray, search: int
+) -> np.ndarray:
+    """Return the displacement (dy, dx) per block from previous to current.
+
+    Every block of current is matched against previous shifted by up to
+    search pixels (smallest sum of absolute differences, smaller shifts
+    winning ties), refined to sub-pixel precision. Blocks without rain and
+    blocks that match every shift equally well (uniform rain) get the median
+    motion of the other blocks, and the field is median filtered over
+    neighbouring blocks.
+    """
+    rows, cols = current.shape[0] // BLOCK_SIZE, current.shape[1] // BLOCK_SIZE
+    height, width = rows * BLOCK_SIZE, cols * BLOCK_SIZE
+    target = current[:height, :width]
+    padded = np.pad(previous[:height, :width], search)
+
+    def block_sum(field: np.ndarray) -> np.ndarray:
+        return field.reshape(rows, BLOCK_SIZE, cols, BLOCK_SIZE).sum(axis=(1, 3))
+
+    span = np.arange(-search, search + 1)
+    costs = np.empty((span.size, span.size, rows, cols), dtype=np.float32)
+    for i, dy in enumerate(span):
+        for j, dx in enumerate(span):
+            # current(y) matches previous(y - d) when the rain moved by d
+            top, left = search - dy, search - dx
+            shifted = padded[top : top + height, left : left + width]
+            costs[i, j] = block_sum(np.abs(target - shifted))
+
+    # Smaller shifts win ties
+    penalty = (span[:, None] ** 2 + span[None, :] ** 2) * 1e-6
+    flat = (costs + penalty[..., None, None]).reshape(-1, rows, cols).argmin(axis=0)
+    best_y, best_x = np.unravel_index(flat, (span.size, span.size))
+    block_y, block_x = np.mgrid[0:rows, 0:cols]
+    best = costs[best_y, best_x, block_y, block_x]
+    worst = costs.max(axis=(0, 1))
+    flow = np.stack(
+        [
+            span[best_y] + _refine(costs, best_y, best_x, block_y, block_x, 0),
+            span[best_x] + _refine(costs, best_y, best_x, block_y, block_x, 1),
+        ],
+        axis=-1,
+    ).astype(np.float32)
+
+    # Blocks without rain match zero motion as well as any other: they say
+    # nothing about the motion of the rain next to them
+    informative = (worst > best) & (block_sum(target) > 0)
+    if not informative.any():
+        return np.zeros_like(flow)
+    flow[~informative] = np.median(flow[informative], axis=0)
+
+    # Take the median of every block and its neighbours, which removes
+    # single mismatched blocks without blurring the motion
+    padded_flow = np.pad(flow, ((1, 1), (1, 1), (0, 0)), mode="edge")
+    neighbours = np.stack(
+        [
+            padded_flow[dy : dy + rows, dx : dx + cols]
+            for dy in range(3)
+            for dx in range(3)
+        ]
+    )
+    return np.median(neighbours, axis=0)
+
+
+def _refine(
+    costs: np.ndarray,
+    best_y: np.ndarray,
+    best_x: np.ndarray,
+    block_y: np.ndarray,
+    block_x: np.ndarray,
+    axis: int,
+) -> np.ndarray:
+    # Sub-pixel offset of the best shift along one axis, from a parabola
+    # through the costs of the best shift and its two neighbours
+    index = best_y if axis == 0 else best_x
+    size = costs.shape[axis]
+    lower = np.clip(index - 1, 0, size - 1)
+    upper = np.clip(index + 1, 0, size - 1)
+    if axis == 0:
+        before = costs[lower, best_x, block_y, block_x]
+        after = costs[upper, best_x, block_y, block_x]
+    else:
+        before = costs[best_y, lower, block_y, block_x]
+        after = costs[best_y, upper, block_y, block_x]
+    center = costs[best_y, best_x, block_y, block_x]
+    curvature = before - 2 * center + after
+    inner = (index > 0) & (index < size - 1) & (curvature > 0)
+    offset = np.zeros(index.shape, dtype=np.float32)
+    offset[inner] = 0.5 * (before - after)[inner] / curvature[inner]
+    return np.clip(offset, -0.5, 0.5)
+
+
+def advect(
+    layer: np.ndarray,
+    velocity: np.ndarray,
+    block: int,
+    scale: int,
+    leads: list[int],
+) -> list[np.ndarray]:
+    """Move a radar layer along the velocity field for each lead time.
+
+    Velocity is given per block of block x block frame pixels, in frame
+    pixels per minute (dy, dx). The trajectories are traced back from every
+    scale-th pixel (semi-Lagrangian, in steps of at most SUBSTEP minutes)
+    and each output pixel takes the colour of the layer pixel it came from,
+    so the radar colours are kept as they are. Leads (minutes) must be
+    increasing.
+    """
+    height, width = layer.shape[:2]
+    ys, xs = np.mgrid[0:height:scale, 0:width:scale].astype(np.float32)
+    grid_y, grid_x = ys.copy(), xs.copy()
+    rows, cols = velocity.shape[:2]
+    # Every RGBA pixel as one uint32, gathered by its flat index
+    pixels = np.ascontiguousarray(layer).view(np.uint32).reshape(-1)
+    full_y = np.arange(height, dtype=np.int32)[:, None]
+    full_x = np.arange(width, dtype=np.int32)[None, :]
+    frames: list[np.ndarray] = []
+    elapsed = 0
+    for lead in leads:
+        steps = max(math.ceil((lead - elapsed) / SUBSTEP), 1)
+        step = (lead - elapsed) / steps
+        for _ in range(steps):
+            row = np.clip((ys // block).astype(np.intp), 0, rows - 1)
+            col = np.clip((xs // block).astype(np.intp), 0, cols - 1)
+            ys -= velocity[row, col, 0] * step
+            xs -= velocity[row, col, 1] * step
+        elapsed = lead
+        # Spread the displacement of every traced pixel over its neighbours
+        shift_y = np.rint(ys - grid_y).astype(np.int32)
+        shift_x = np.rint(xs - grid_x).astype(np.int32)
+        source_y = full_y + shift_y.repeat(scale, 0).repeat(scale, 1)[:height, :width]
+        source_x = full_x + shift_x.repeat(scale, 0).repeat(scale, 1)[:height, :width]
+        outside = (
+            (source_y < 0) | (source_y >= height) | (source_x < 0) | (source_x >= width)
+        )
+        source = source_y * width + source_x
+        source[outside] = 0
+        frame = pixels[source]
+        frame[outside] = 0
+        frames.append(frame.view(np.uint8).reshape(height, width, 4))
+    return frames
+
+
+class Nowcaster:
+    """Keep the recent rain radar layers and extrapolate the newest one.
+
+    Layers are handed over as they are composited (possibly out of order);
+    only a downsampled intensity field is kept of each, plus the newest
+    layer itself. The motion is estimated from the two newest fields.
+    """
+
+    def __init__(self) -> None:
+        self._fields: dict[float, tuple[int, np.ndarray]] = {}
+        self._layer: tuple[float, np.ndarray] | None = None
+        self._lock = threading.Lock()
+
+    def add(self, timestamp: float, layer: np.ndarray, scale: int) -> None:
+        """Add the radar layer of the frame at timestamp."""
+        field = intensity_field(layer, scale)
+        with self._lock:
+            self._fields[timestamp] = (scale, field)
+            while len(self._fields) > FIELDS_TO_KEEP:
+                del self._fields[min(self._fields)]
+            if self._layer is None or timestamp >= self._layer[0]:
+                self._layer = (timestamp, layer)
+
+    def clear(self) -> None:
+        """Forget all layers."""
+        with self._lock:
+            self._fields.clear()
+            self._layer = None
+
+    def forecast(self, leads: list[int]) -> tuple[float, list[np.ndarray]] | None:
+        """Return the newest frame time and its layer advected to each lead.
+
+        None is returned when there are no two recent enough fields (of the
+        same resolution) to estimate the motion from.
+        """
+        with self._lock:
+            if self._layer is None or len(self._fields) < 2:
+                return None
+            newest, previous = sorted(self._fields, reverse=True)[:2]
+            (scale, current_field), (previous_scale, previous_field) = (
+                self._fields[newest],
+                self._fields[previous],
+            )
+            timestamp, layer = self._layer
+        gap = (newest - previous) / 60
+        if timestamp != newest or scale != previous_scale or not 0 < gap <= MAX_GAP:
+            return None
+        search = max(math.ceil(MAX_SPEED * gap / scale), 1)
+        flow = estimate_motion(previous_field, current_field, search)
+        velocity = flow * scale / gap
+        return timestamp, advect(layer, velocity, BLOCK_SIZE * scale, scale, leads)
@@ -2,13 +2,20 @@
 
 from homeassistant.components.number import NumberEntity, NumberEntityDescription
 from homeassistant.config_entries import ConfigEntry
-from homeassistant.const import EntityCategory
+from homeassistant.const import EntityCategory, UnitOfInformation, UnitOfLength
 from homeassistant.core import HomeAssistant
 from homeassistant.components.number.const import NumberMode
 from homeassistant.helpers.entity_platform import AddConfigEntryEntitiesCallback
 
 from .coordinator import WeerplazaDataUpdateCoordinator
-from .const import DOMAIN, MARKER_LATITUDE, MARKER_LONGITUDE
+from .const import (
+    DOMAIN,
+    FRAME_MEMORY_BUDGET,
+    MARKER_LATITUDE,
+    MARKER_LONGITUDE,
+    NOWCAST_SCALE,
+    RAIN_RADIUS,
+)
 from .entity import WeerplazaEntity
 
 DESCRIPTIONS: list[NumberEntityDescription] = [
@@ -30,6 +37,38 @@ DESCRIPTIONS: list[NumberEntityDescription] = [
         native_max_value=90,
         mode=NumberMode.BOX,
     ),
+    NumberEntityDescription(
+        key=FRAME_MEMORY_BUDGET,
+        translation_key=FRAME_MEMORY_BUDGET,
+        entity_category=EntityCategory.CONFIG,
+        icon="mdi:memory",
+        native_min_value=16,
+        native_max_value=2048,
+        native_step=16,
+        native_unit_of_measurement=UnitOfInformation.MEBIBYTES,
+        mode=NumberMode.BOX,
+    ),
+    NumberEntityDescription(
+        key=RAIN_RADIUS,
+        translation_key=RAIN_RADIUS,
+        entity_category=EntityCategory.CONFIG,
+        icon="mdi:map-marker-radius-outline",
+        native_min_value=0,
+        native_max_value=25,
+        native_step=0.5,
+        native_unit_of_measurement=UnitOfLength.KILOMETERS,
+        mode=NumberMode.BOX,
+    ),
+    NumberEntityDescription(
+        key=NOWCAST_SCALE,
+        translation_key=NOWCAST_SCALE,
+        entity_category=EntityCategory.CONFIG,
+        icon="mdi:grid",
+        native_min_value=2,
+        native_max_value=8,
+        native_step=1,
+        mode=NumberMode.BOX,
+    ),
 ]
 
 
@@ -0,0 +1,87 @@
+"""Precipitation intensity read from the rain radar layer."""
+
+import math
+
+import numpy as np
+
+from .tools import Projection
+
+# Legend colours of the rain radar layer and the intensity (mm/h) they stand
+# for. Colours in between map to the nearest legend colour; colours far from
+# all of them (and transparent pixels) mean no rain. The scale approximates
+# the radar legend; it is not calibrated against the published one, so the
+# intensities read with it are estimates.
+RAIN_SCALE: tuple[tuple[tuple[int, int, int], float], ...] = (
+    ((170, 210, 255), 0.1),
+    ((110, 170, 255), 0.3),
+    ((40, 110, 255), 1.0),
+    ((0, 60, 200), 2.0),
+    ((0, 30, 140), 3.0),
+    ((255, 255, 0), 5.0),
+    ((255, 170, 0), 10.0),
+    ((255, 80, 0), 20.0),
+    ((220, 0, 0), 30.0),
+    ((160, 0, 160), 50.0),
+    ((255, 120, 255), 100.0),
+)
+MAX_COLOR_DISTANCE = 60
+MIN_ALPHA = 128
+QUANT_SHIFT = 3  # colours are looked up with 5 bits per channel
+
+
+def _build_lookup_table() -> np.ndarray:
+    # Intensity for every quantized colour, indexed by (r << 10) | (g << 5) | b
+    levels = (np.arange(256 >> QUANT_SHIFT) << QUANT_SHIFT) + (1 << QUANT_SHIFT) // 2
+    red, green, blue = np.meshgrid(levels, levels, levels, indexing="ij")
+    colors = np.stack([red, green, blue], axis=-1).reshape(-1, 1, 3)
+    legend = np.array([color for color, _ in RAIN_SCALE]).reshape(1, -1, 3)
+    distances = ((colors - legend) ** 2).sum(axis=-1)
+    intensities = np.array([value for _, value in RAIN_SCALE], dtype=np.float32)
+    table = intensities[distances.argmin(axis=1)]
+    table[distances.min(axis=1) > MAX_COLOR_DISTANCE**2] = 0
+    table.flags.writeable = False
+    return table
+
+
+RAIN_LOOKUP_TABLE = _build_lookup_table()
+
+
+class RainSampler:
+    """Sample the precipitation intensity around a location in radar layers.
+
+    The pixels within the radius are found once, so sampling a layer is a
+    single gather of those pixels and a table lookup of their colours.
+    """
+
+    def __init__(
+        self,
+        projection: Projection,
+        size: tuple[int, int],
+        lat: float,
+        lon: float,
+        radius: float,
+    ) -> None:
+        center_x, center_y = projection.forward(lat, lon)
+        # At least the pixel of the location itself
+        pixels = max(radius / projection.pixel_size(lat), 0.5)
+        reach = math.ceil(pixels)
+        ys, xs = np.mgrid[-reach : reach + 1, -reach : reach + 1]
+        inside = xs**2 + ys**2 <= pixels**2
+        xs = xs[inside] + int(np.rint(center_x))
+        ys = ys[inside] + int(np.rint(center_y))
+        within = (xs >= 0) & (xs < size[0]) & (ys >= 0) & (ys < size[1])
+        self._pixels = (ys[within], xs[within])
+
+    def sample(self, layer: np.ndarray) -> float | None:
+        """Return the mean intensity (mm/h) in a radar layer.
+
+        None is returned when the location is outside the layer.
+        """
+        if not self._pixels[0].size:
+            return None
+        pixels = layer[self._pixels].astype(np.intp) >> QUANT_SHIFT
+        colors = (pixels[:, 0] << 10) | (pixels[:, 1] << 5) | pixels[:, 2]
+        values = np.where(
+            layer[self._pixels][:, 3] >= MIN_ALPHA, RAIN_LOOKUP_TABLE[colors], 0
+        )
+        return float(values.mean())
@@ -0,0 +1,274 @@
+"""Compositing of the Weerplaza frames, in threads or in a process pool."""
+
+from typing import Any, Self
+
+from collections.abc import Callable, Sequence
+from concurrent.futures import CancelledError, Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass
+import multiprocessing
+from multiprocessing.shared_memory import SharedMemory
+import os
+import threading
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+
+from .assets import FRAME_SIZE, ImageAssets
+from .compositor import Compositor
+from .const import AnimationFormat
+from .encoder import encode
+
+RENDER_PROCESSES = 2
+TEXT_COLOR = (254, 255, 255)
+TEXT_OUTLINE_COLOR = (0, 0, 0)
+
+
+class RendererShutDown(Exception):
+    """The process renderer was shut down while a job was submitted."""
+
+
+# Errors after which a job is rendered in a thread instead: no shared memory
+# or worker processes (OSError), a broken pool, and jobs cancelled by or
+# submitted during a shutdown
+RENDER_ERRORS = (OSError, BrokenProcessPool, CancelledError, RendererShutDown)
+
+
+def compose_frame(
+    assets: ImageAssets,
+    compositor: Compositor,
+    original: Image.Image,
+    overlay: Image.Image | None,
+    lightning: bool = False,
+) -> tuple[np.ndarray, np.ndarray]:
+    """Composite a frame and return it with its warped source layer.
+
+    The plates are already rotated and cropped to the frame geometry, the
+    source layers are warped straight onto it. A lightning overlay covers
+    the whole frame, on top of the borders; any other overlay is warped
+    like the source layer and goes below the borders.
+    """
+    layers = [np.asarray(assets.warp(original))]
+    if overlay and not lightning:
+        layers.append(np.asarray(assets.warp(overlay)))
+    layers.append(assets.borders)
+    if overlay and lightning:
+        overlay_image = overlay.resize(FRAME_SIZE, Image.Resampling.LANCZOS)
+        layers.append(np.asarray(overlay_image.convert("RGBA")))
+    return compositor.composite(assets.background, layers), layers[0]
+
+
+def draw_time(
+    frame: np.ndarray,
+    time_str: str,
+    font: ImageFont.FreeTypeFont | ImageFont.ImageFont,
+) -> np.ndarray:
+    """Return the frame with the time drawn in its bottom left corner."""
+    final = Image.fromarray(frame)
+    draw = ImageDraw.Draw(final)
+    textx = 10
+    texty = final.height - font.size - 10  # type: ignore
+
+    # Draw time and shadow
+    for adj in range(-2, 3):
+        draw.text((textx + adj, texty), time_str, font=font, fill=TEXT_OUTLINE_COLOR)
+        draw.text((textx, texty + adj), time_str, font=font, fill=TEXT_OUTLINE_COLOR)
+    draw.text((textx, texty), time_str, font=font, fill=TEXT_COLOR)
+    return np.asarray(final)
+
+
+@dataclass(frozen=True)
+class SharedArray:
+    """A uint8 array in shared memory, as handed to a worker process."""
+
+    name: str
+    shape: tuple[int, ...]
+
+    def read(self) -> np.ndarray:
+        """Return a copy of the array."""
+        shm = SharedMemory(self.name)
+        try:
+            return np.ndarray(self.shape, np.uint8, buffer=shm.buf).copy()
+        finally:
+            shm.close()
+
+    def write(self, array: np.ndarray) -> None:
+        """Copy an array (of the same shape) into the shared array."""
+        shm = SharedMemory(self.name)
+        try:
+            np.ndarray(self.shape, np.uint8, buffer=shm.buf)[...] = array
+        finally:
+            shm.close()
+
+    def write_stack(self, arrays: Sequence[np.ndarray]) -> None:
+        """Copy arrays (of one shape) into the shared array, one per row."""
+        shm = SharedMemory(self.name)
+        try:
+            view = np.ndarray(self.shape, np.uint8, buffer=shm.buf)
+            for index, array in enumerate(arrays):
+                view[index] = array
+            del view
+        finally:
+            shm.close()
+
+
+class _SharedArrays:
+    """Shared arrays owned by the parent process, released as a group."""
+
+    def __init__(self) -> None:
+        self._blocks: list[SharedMemory] = []
+
+    def create(self, shape: tuple[int, ...]) -> SharedArray:
+        shm = SharedMemory(create=True, size=max(int(np.prod(shape)), 1))
+        self._blocks.append(shm)
+        return SharedArray(shm.name, shape)
+
+    def __enter__(self) -> Self:
+        return self
+
+    def __exit__(self, *args: object) -> None:
+        for shm in self._blocks:
+            shm.close()
+            shm.unlink()
+
+
+# Worker process state, created by the initializer of every worker
+_worker: tuple[ImageAssets, Compositor] | None = None
+
+
+def _init_worker() -> None:
+    global _worker
+    _worker = (ImageAssets(), Compositor(FRAME_SIZE[1], FRAME_SIZE[0]))
+
+
+def _worker_state() -> tuple[ImageAssets, Compositor]:
+    assert _worker is not None
+    return _worker
+
+
+def _render_frame(
+    original: SharedArray,
+    overlay: SharedArray | None,
+    lightning: bool,
+    time_str: str,
+    frame: SharedArray,
+    layer: SharedArray | None,
+) -> None:
+    assets, compositor = _worker_state()
+    composite, source = compose_frame(
+        assets,
+        compositor,
+        Image.fromarray(original.read()),
+        Image.fromarray(overlay.read()) if overlay else None,
+        lightning,
+    )
+    frame.write(draw_time(composite, time_str, assets.font))
+    if layer is not None:
+        layer.write(source)
+
+
+def _encode(frames: SharedArray, durations: list[int], fmt: AnimationFormat) -> bytes:
+    return encode(list(frames.read()), durations, fmt)
+
+
+class ProcessRenderer:
+    """Composite frames and encode animations in a small process pool.
+
+    The work runs outside the Home Assistant process, so it uses other cores
+    and does not compete for the GIL. Frames travel through shared memory,
+    only their names and shapes are pickled. The workers are spawned (not
+    forked, as Home Assistant runs many threads) on first use and load their
+    own image assets. The workers import the job functions by module name,
+    which runs the package __init__: every worker also imports Home
+    Assistant and the API, and keeps them in memory for its lifetime. The
+    calls block until the worker is done and are meant to be run in an
+    executor job. A pool that broke (e.g. a worker was killed) is replaced
+    by the next call.
+    """
+
+    def __init__(self, processes: int = RENDER_PROCESSES) -> None:
+        self._processes = max(min(processes, os.cpu_count() or 1), 1)
+        self._pool: ProcessPoolExecutor | None = None
+        self._lock = threading.Lock()
+
+    def render(
+        self,
+        original: Image.Image,
+        overlay: Image.Image | None,
+        lightning: bool,
+        time_str: str,
+        keep_layer: bool = False,
+    ) -> tuple[np.ndarray, np.ndarray | None]:
+        """Return the frame with its time, and the warped layer if asked."""
+        frame_shape = (FRAME_SIZE[1], FRAME_SIZE[0], 4)
+        with _SharedArrays() as shared:
+            sources = [
+                self.__share(shared, np.asarray(image.convert("RGBA")))
+                if image
+                else None
+                for image in (original, overlay)
+            ]
+            frame = shared.create(frame_shape)
+            layer = shared.create(frame_shape) if keep_layer else None
+            self.__run(
+                _render_frame, sources[0], sources[1], lightning, time_str, frame, layer
+            )
+            return frame.read(), layer.read() if layer else None
+
+    def encode(
+        self,
+        frames: Sequence[np.ndarray],
+        durations: list[int],
+        fmt: AnimationFormat,
+    ) -> bytes:
+        """Encode RGBA frames (of one size) as a looping animation."""
+        with _SharedArrays() as shared:
+            stack = shared.create((len(frames), *frames[0].shape))
+            stack.write_stack(frames)
+            return self.__run(_encode, stack, durations, fmt)
+
+    def shutdown(self) -> None:
+        """Stop the worker processes, without waiting for running jobs."""
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    @staticmethod
+    def __share(shared: _SharedArrays, array: np.ndarray) -> SharedArray:
+        target = shared.create(array.shape)
+        target.write(array)
+        return target
+
+    def __run(self, function: Callable[..., Any], *args: Any) -> Any:
+        with self._lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(
+                    self._processes,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_init_worker,
+                )
+            pool = self._pool
+        try:
+            return self.__submit(pool, function, *args).result()
+        except BrokenProcessPool:
+            # A broken pool stays broken, start over on the next call
+            with self._lock:
+                if self._pool is pool:
+                    self._pool = None
+            pool.shutdown(wait=False)
+            raise
+
+    def __submit(
+        self, pool: ProcessPoolExecutor, function: Callable[..., Any], *args: Any
+    ) -> Future:
+        try:
+            return pool.submit(function, *args)
+        except BrokenProcessPool:
+            raise
+        except RuntimeError as e:
+            # Only a pool that shutdown() took away may refuse new jobs
+            with self._lock:
+                if self._pool is pool:
+                    raise
+            raise RendererShutDown from e
@@ -0,0 +1,54 @@
+"""Adaptive update scheduling for the Weerplaza layers."""
+
+from itertools import pairwise
+from statistics import median
+
+from .const import DEFAULT_SYNC_INTERVAL
+
+MIN_INTERVAL = 60  # seconds
+MAX_INTERVAL = 30 * 60  # seconds
+PUBLISH_MARGIN = 20  # seconds
+
+
+class LayerSchedule:
+    """Learn when a layer publishes new frames and plan its next poll.
+
+    All times are POSIX timestamps, so the schedule can be driven by any
+    clock. The cadence is the median spacing of the upstream frame times, the
+    publication delay the smallest lag seen between a frame time and the
+    first poll that found the frame. The next poll is planned shortly after
+    the next frame is expected to be published. Polls that find nothing new
+    back off exponentially, up to MAX_INTERVAL.
+    """
+
+    def __init__(self) -> None:
+        self.cadence: float | None = None
+        self.delay: float | None = None
+        self.latest: float | None = None
+        self._misses = 0
+
+    def observe(self, frame_times: list[float], now: float) -> float:
+        """Record the frame times found by a poll at now, return the next poll."""
+        times = sorted(set(frame_times))
+        if len(times) > 1:
+            self.cadence = median(b - a for a, b in pairwise(times))
+        if times and (self.latest is None or times[-1] > self.latest):
+            if self.latest is not None:
+                lag = max(now - times[-1], 0)
+                self.delay = lag if self.delay is None else min(self.delay, lag)
+            self.latest = times[-1]
+            self._misses = 0
+        else:
+            self._misses += 1
+        return now + self.__interval(now)
+
+    def __interval(self, now: float) -> float:
+        if not self.cadence or self.latest is None:
+            return DEFAULT_SYNC_INTERVAL
+        expected = self.latest + self.cadence + (self.delay or 0) + PUBLISH_MARGIN
+        if expected > now and not self._misses:
+            interval = expected - now
+        else:
+            # The frame is late or the layer is idle
+            interval = MIN_INTERVAL * 2 ** max(self._misses - 1, 0)
+        return min(max(interval, MIN_INTERVAL), MAX_INTERVAL)
@@ -0,0 +1,82 @@
+"""Weerplaza Select Entities"""
+
+from homeassistant.components.select import SelectEntity, SelectEntityDescription
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.const import EntityCategory
+from homeassistant.core import HomeAssistant
+from homeassistant.helpers.entity_platform import AddConfigEntryEntitiesCallback
+
+from .coordinator import WeerplazaDataUpdateCoordinator
+from .const import DOMAIN, ANIMATION_FORMAT, STILL_FORMAT, AnimationFormat, StillFormat
+from .entity import WeerplazaEntity
+
+DESCRIPTIONS: list[SelectEntityDescription] = [
+    SelectEntityDescription(
+        key=ANIMATION_FORMAT,
+        translation_key=ANIMATION_FORMAT,
+        entity_category=EntityCategory.CONFIG,
+        icon="mdi:file-gif-box",
+        options=[fmt.value for fmt in AnimationFormat],
+    ),
+    SelectEntityDescription(
+        key=STILL_FORMAT,
+        translation_key=STILL_FORMAT,
+        entity_category=EntityCategory.CONFIG,
+        icon="mdi:file-image",
+        options=[fmt.value for fmt in StillFormat],
+    ),
+]
+
+
+async def async_setup_entry(
+    hass: HomeAssistant,
+    entry: ConfigEntry,
+    async_add_entities: AddConfigEntryEntitiesCallback,
+) -> None:
+    """Set up Weerplaza selects based on a config entry."""
+    coordinator = hass.data[DOMAIN][entry.entry_id]
+
+    entities: list[WeerplazaSelect] = []
+
+    # Add all selects described above.
+    for description in DESCRIPTIONS:
+        entities.append(
+            WeerplazaSelect(
+                coordinator=coordinator,
+                entry_id=entry.entry_id,
+                description=description,
+            )
+        )
+
+    async_add_entities(entities)
+
+
+class WeerplazaSelect(WeerplazaEntity, SelectEntity):
+    """Representation of a Weerplaza select entity."""
+
+    def __init__(
+        self,
+        coordinator: WeerplazaDataUpdateCoordinator,
+        entry_id: str,
+        description: SelectEntityDescription,
+    ) -> None:
+        """Initialize the select entity."""
+        super().__init__(
+            coordinator=coordinator, description=description, entry_id=entry_id
+        )
+        self._attr_unique_id = f"{entry_id}_{description.key}"
+
+    @property
+    def current_option(self) -> str | None:
+        """Return the selected option."""
+        return self.coordinator.api.setting(self.entity_description.key)
+
+    async def async_select_option(self, option: str) -> None:
+        """Change the selected option."""
+        if self.entity_description.key == STILL_FORMAT:
+            self.coordinator.api.set_still_format(StillFormat(option))
+        else:
+            await self.coordinator.api.async_set_animation_format(
+                AnimationFormat(option)
+            )
+        self.async_write_ha_state()
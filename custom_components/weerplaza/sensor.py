@@ -1,26 +1,78 @@
 """Weerplaza Sensor Entities"""
 
+from collections.abc import Callable
+from dataclasses import dataclass
+
 from homeassistant.config_entries import ConfigEntry
-from homeassistant.const import EntityCategory
+from homeassistant.const import (
+    EntityCategory,
+    UnitOfInformation,
+    UnitOfVolumetricFlux,
+)
 from homeassistant.components.sensor import SensorEntity, SensorEntityDescription
 from homeassistant.components.sensor.const import (
     DOMAIN as SENSOR_DOMAIN,
     SensorDeviceClass,
+    SensorStateClass,
 )
 from homeassistant.helpers.entity_platform import AddEntitiesCallback
 from homeassistant.helpers.typing import StateType
-from .const import DOMAIN, DEFAULT_NAME, LAST_UPDATED
+from .api import WeerplazaApi
+from .const import (
+    DOMAIN,
+    DEFAULT_NAME,
+    FRAME_MEMORY,
+    LAST_UPDATED,
+    RAIN_INTENSITY,
+    RAIN_ONSET,
+)
 from .coordinator import WeerplazaDataUpdateCoordinator
 from .entity import WeerplazaEntity
 
-DESCRIPTIONS: list[SensorEntityDescription] = [
-    SensorEntityDescription(
+
+@dataclass(frozen=True, kw_only=True)
+class WeerplazaSensorEntityDescription(SensorEntityDescription):
+    """Describes Weerplaza sensor entity."""
+
+    value_fn: Callable[[WeerplazaApi], StateType]
+
+
+DESCRIPTIONS: list[WeerplazaSensorEntityDescription] = [
+    WeerplazaSensorEntityDescription(
         key=LAST_UPDATED,
         translation_key=LAST_UPDATED,
         icon="mdi:clock-outline",
         device_class=SensorDeviceClass.TIMESTAMP,
         entity_category=EntityCategory.DIAGNOSTIC,
-    )
+        value_fn=lambda api: api.setting(LAST_UPDATED),
+    ),
+    WeerplazaSensorEntityDescription(
+        key=FRAME_MEMORY,
+        translation_key=FRAME_MEMORY,
+        icon="mdi:memory",
+        device_class=SensorDeviceClass.DATA_SIZE,
+        native_unit_of_measurement=UnitOfInformation.MEBIBYTES,
+        suggested_display_precision=1,
+        entity_category=EntityCategory.DIAGNOSTIC,
+        value_fn=lambda api: api.frame_memory_usage / (1024 * 1024),
+    ),
+    WeerplazaSensorEntityDescription(
+        key=RAIN_INTENSITY,
+        translation_key=RAIN_INTENSITY,
+        icon="mdi:weather-pouring",
+        device_class=SensorDeviceClass.PRECIPITATION_INTENSITY,
+        state_class=SensorStateClass.MEASUREMENT,
+        native_unit_of_measurement=UnitOfVolumetricFlux.MILLIMETERS_PER_HOUR,
+        suggested_display_precision=1,
+        value_fn=lambda api: api.rain_intensity,
+    ),
+    WeerplazaSensorEntityDescription(
+        key=RAIN_ONSET,
+        translation_key=RAIN_ONSET,
+        icon="mdi:weather-rainy",
+        device_class=SensorDeviceClass.TIMESTAMP,
+        value_fn=lambda api: api.rain_onset,
+    ),
 ]
 
 
@@ -49,11 +101,13 @@ async def async_setup_entry(
 class WeerplazaSensor(WeerplazaEntity, SensorEntity):
     """Defines a Weerplaza sensor."""
 
+    entity_description: WeerplazaSensorEntityDescription
+
     def __init__(
         self,
         coordinator: WeerplazaDataUpdateCoordinator,
         entry_id: str,
-        description: SensorEntityDescription,
+        description: WeerplazaSensorEntityDescription,
     ) -> None:
         """Initialize Weerplaza sensor."""
         super().__init__(
@@ -66,4 +120,4 @@ class WeerplazaSensor(WeerplazaEntity, SensorEntity):
     @property
     def native_value(self) -> StateType:  # type: ignore
         """Return the state of the sensor."""
-        return self.coordinator.api.setting(LAST_UPDATED)
+        return self.entity_description.value_fn(self.coordinator.api)
@@ -1,10 +1,29 @@
 """Global services file."""
 
+import voluptuous as vol
+
 from homeassistant.config_entries import ConfigEntry
+from homeassistant.const import ATTR_ICON, ATTR_LATITUDE, ATTR_LONGITUDE, ATTR_NAME
 from homeassistant.core import HomeAssistant, ServiceCall
+import homeassistant.helpers.config_validation as cv
 
 from .coordinator import WeerplazaDataUpdateCoordinator
 from .const import DOMAIN
+from .markers import DEFAULT_ICON, Marker
+
+ATTR_LABEL = "label"
+MARKER_ICONS = ["pointer", "dot"]
+
+ADD_MARKER_SCHEMA = vol.Schema(
+    {
+        vol.Required(ATTR_NAME): cv.string,
+        vol.Required(ATTR_LATITUDE): cv.latitude,
+        vol.Required(ATTR_LONGITUDE): cv.longitude,
+        vol.Optional(ATTR_ICON, default=DEFAULT_ICON): vol.In(MARKER_ICONS),
+        vol.Optional(ATTR_LABEL): cv.string,
+    }
+)
+REMOVE_MARKER_SCHEMA = vol.Schema({vol.Required(ATTR_NAME): cv.string})
 
 
 class WeerplazaServicesSetup:
@@ -28,8 +47,36 @@ class WeerplazaServicesSetup:
             "force_update",
             self.force_update,
         )
+        self.hass.services.async_register(
+            DOMAIN,
+            "add_marker",
+            self.add_marker,
+            schema=ADD_MARKER_SCHEMA,
+        )
+        self.hass.services.async_register(
+            DOMAIN,
+            "remove_marker",
+            self.remove_marker,
+            schema=REMOVE_MARKER_SCHEMA,
+        )
 
     async def force_update(self, _: ServiceCall) -> None:
         """Force update service"""
         api = self.coordinator.api
         await api.async_force_refresh()
+
+    async def add_marker(self, call: ServiceCall) -> None:
+        """Add (or replace) a named marker"""
+        await self.coordinator.api.async_add_marker(
+            Marker(
+                name=call.data[ATTR_NAME],
+                latitude=call.data[ATTR_LATITUDE],
+                longitude=call.data[ATTR_LONGITUDE],
+                icon=call.data[ATTR_ICON],
+                label=call.data.get(ATTR_LABEL),
+            )
+        )
+
+    async def remove_marker(self, call: ServiceCall) -> None:
+        """Remove a named marker"""
+        await self.coordinator.api.async_remove_marker(call.data[ATTR_NAME])
@@ -13,7 +13,14 @@ from homeassistant.components.switch.const import DOMAIN as SWITCH_DOMAIN
 from homeassistant.helpers.entity_platform import AddConfigEntryEntitiesCallback
 
 from .coordinator import WeerplazaDataUpdateCoordinator
-from .const import DOMAIN, DEFAULT_NAME, SHOW_MARKER
+from .const import (
+    DOMAIN,
+    DEFAULT_NAME,
+    NOWCAST,
+    PERSIST_FRAMES,
+    PROCESS_RENDERING,
+    SHOW_MARKER,
+)
 from .entity import WeerplazaEntity
 
 DESCRIPTIONS: list[SwitchEntityDescription] = [
@@ -23,6 +30,27 @@ DESCRIPTIONS: list[SwitchEntityDescription] = [
         device_class=SwitchDeviceClass.SWITCH,
         entity_category=EntityCategory.CONFIG,
     ),
+    SwitchEntityDescription(
+        key=PERSIST_FRAMES,
+        translation_key=PERSIST_FRAMES,
+        icon="mdi:content-save-outline",
+        device_class=SwitchDeviceClass.SWITCH,
+        entity_category=EntityCategory.CONFIG,
+    ),
+    SwitchEntityDescription(
+        key=NOWCAST,
+        translation_key=NOWCAST,
+        icon="mdi:weather-cloudy-clock",
+        device_class=SwitchDeviceClass.SWITCH,
+        entity_category=EntityCategory.CONFIG,
+    ),
+    SwitchEntityDescription(
+        key=PROCESS_RENDERING,
+        translation_key=PROCESS_RENDERING,
+        icon="mdi:cpu-64-bit",
+        device_class=SwitchDeviceClass.SWITCH,
+        entity_category=EntityCategory.CONFIG,
+    ),
 ]
 
 
@@ -1,32 +1,321 @@
-"""Calculate Mercator position based on latitude and longitude."""
+"""Helper functions for the Weerplaza images."""
 
+import asyncio
+from collections import deque
+from io import BytesIO, RawIOBase
 import math
+import os
+import threading
+
+import numpy as np
+from PIL import Image
+
+
+KM_PER_DEGREE = 111.32  # km per degree of longitude at the equator
+STREAM_HISTORY = 64 * 1024  # bytes
+STREAM_QUEUE_LIMIT = 256 * 1024  # bytes
+
+
+class Projection:
+    """Mercator projection of a map extent onto image pixels.
+
+    The extent is given by its left and right longitude and top latitude and
+    spans width pixels. The Mercator constants are computed once, and both
+    directions work on scalars as well as NumPy arrays, so many points (or
+    every pixel) can be mapped in one call. Optionally the map is rotated by
+    angle degrees around center (like Image.rotate) and then shifted by
+    offset (the top left of a crop box), so pixels of a rotated and cropped
+    frame can be mapped too.
+    """
+
+    def __init__(
+        self,
+        llon: float,
+        rlon: float,
+        tlat: float,
+        width: int = 1050,
+        angle: float = 0,
+        center: tuple[float, float] = (0, 0),
+        offset: tuple[float, float] = (0, 0),
+    ) -> None:
+        self.llon = llon
+        self.rlon = rlon
+        self.tlat = tlat
+        self.width = width
+        self._dlon = rlon - llon
+        self._dlon_rad = deg2rad(rlon - llon)
+        # Convert to radial
+        tlat_rad = tlat / 180 * math.pi
+        # Calculate Mercator factor for top latitude
+        ty = 0.5 * math.log((1 + math.sin(tlat_rad)) / (1 - math.sin(tlat_rad)))
+        self._ty = width * ty / self._dlon_rad
+        # Image.rotate turns counter clockwise (on screen) for positive angles
+        self._cos = math.cos(deg2rad(angle))
+        self._sin = math.sin(deg2rad(angle))
+        self._rotated = angle != 0
+        self._center = center
+        self._offset = offset
+
+    def pixel_size(self, lat: float) -> float:
+        """Return the size of a pixel in km at the given latitude."""
+        return self._dlon / self.width * KM_PER_DEGREE * math.cos(deg2rad(lat))
+
+    def forward(
+        self, lat: float | np.ndarray, lon: float | np.ndarray
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """Return the (unrounded) pixel positions of locations."""
+        lat = np.asarray(lat, dtype=float)
+        lon = np.asarray(lon, dtype=float)
+        x = (lon - self.llon) / self._dlon * self.width
+
+        # Convert to radial
+        lat = lat / 180 * math.pi
+        # Calculate Mercator factor for given latitude
+        y = 0.5 * np.log((1 + np.sin(lat)) / (1 - np.sin(lat)))
+        y = self._ty - self.width * y / self._dlon_rad
+        if self._rotated:
+            dx, dy = x - self._center[0], y - self._center[1]
+            x = self._center[0] + dx * self._cos + dy * self._sin
+            y = self._center[1] - dx * self._sin + dy * self._cos
+        return x - self._offset[0], y - self._offset[1]
+
+    def inverse(
+        self, x: float | np.ndarray, y: float | np.ndarray
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """Return the latitudes and longitudes of pixel positions."""
+        x = np.asarray(x, dtype=float) + self._offset[0]
+        y = np.asarray(y, dtype=float) + self._offset[1]
+        if self._rotated:
+            dx, dy = x - self._center[0], y - self._center[1]
+            x = self._center[0] + dx * self._cos - dy * self._sin
+            y = self._center[1] + dx * self._sin + dy * self._cos
+        lon = self.llon + x / self.width * self._dlon
+        # The Mercator factor is atanh(sin(lat)), so lat = asin(tanh(factor))
+        lat = np.arcsin(np.tanh((self._ty - y) * self._dlon_rad / self.width))
+        return lat * 180 / math.pi, lon
 
 
 def calculate_mercator_position(
-    lat: float,
-    lon: float,
+    lat: float | np.ndarray,
+    lon: float | np.ndarray,
     llon: float,
     rlon: float,
     tlat: float,
     width: int = 1050,
-) -> tuple[int, int]:
-    x = round((lon - llon) / (rlon - llon) * width)
+) -> tuple[int, int] | tuple[np.ndarray, np.ndarray]:
+    """Return the pixel position(s) of one or more locations on the map.
+
+    Latitudes and longitudes may be arrays, to project many locations in one
+    call; the positions are then returned as integer arrays.
+    """
+    x, y = Projection(llon, rlon, tlat, width).forward(lat, lon)
+    x, y = np.rint(x), np.rint(y)
+    if x.ndim == 0:
+        return (int(x), int(y))
+    return (x.astype(int), y.astype(int))
+
 
-    # Convert to radial
-    tlat_rad = tlat / 180 * math.pi
-    # Calculate Mercator factor for top latitude
-    ty = 0.5 * math.log((1 + math.sin(tlat_rad)) / (1 - math.sin(tlat_rad)))
-    ty = width * ty / deg2rad(rlon - llon)
+def frame_transform(
+    source_size: tuple[int, int],
+    canvas_size: tuple[int, int],
+    angle: float,
+    box: tuple[int, int, int, int],
+) -> tuple[float, float, float, float, float, float]:
+    """Return the affine coefficients mapping frame pixels to source pixels.
 
-    # Convert to radial
-    lat = lat / 180 * math.pi
-    # Calculate Mercator factor for given latitude
-    y = 0.5 * math.log((1 + math.sin(lat)) / (1 - math.sin(lat)))
-    y = round(ty - width * y / deg2rad(rlon - llon))
-    return (x, y)
+    The frame is defined as: scale the source to the canvas size, rotate the
+    canvas by angle degrees around its center (like Image.rotate) and crop
+    it to box. The coefficients can be passed to Image.transform to do all of
+    it in a single warp.
+    """
+    scale_x = source_size[0] / canvas_size[0]
+    scale_y = source_size[1] / canvas_size[1]
+    center_x = canvas_size[0] / 2
+    center_y = canvas_size[1] / 2
+    cos = math.cos(deg2rad(-angle))
+    sin = math.sin(deg2rad(-angle))
+    left = box[0] - center_x
+    top = box[1] - center_y
+    return (
+        scale_x * cos,
+        scale_x * sin,
+        scale_x * (cos * left + sin * top + center_x),
+        scale_y * -sin,
+        scale_y * cos,
+        scale_y * (-sin * left + cos * top + center_y),
+    )
 
 
 def deg2rad(degrees: float) -> float:
     """Convert degrees to radians."""
     return degrees * math.pi / 180
+
+
+def decode_image(data: bytes) -> Image.Image:
+    """Fully decode image data, so the image can be shared between threads."""
+    image = Image.open(BytesIO(data))
+    image.load()
+    return image
+
+
+class ChunkStream(RawIOBase):
+    """A file fed with chunks of data by the event loop, read by a thread.
+
+    Reads block until the data arrived, so an image can be decoded while it
+    is downloaded. Up to limit bytes of chunks are queued for the reader;
+    feeding more waits until the reader caught up, so a slow reader slows
+    the download down instead of having it buffered. Everything read is
+    kept until release is called (so the image header can be parsed again);
+    after that only the last STREAM_HISTORY bytes before the current
+    position are kept, for short seeks back. Closing the stream (e.g. when
+    the decoder is done or failed) drops any further chunks.
+    """
+
+    def __init__(self, limit: int = STREAM_QUEUE_LIMIT) -> None:
+        super().__init__()
+        self._limit = limit
+        self._chunks: deque[bytes] = deque()
+        self._queued = 0
+        self._condition = threading.Condition()
+        self._space: tuple[asyncio.AbstractEventLoop, asyncio.Event] | None = None
+        self._buffer = bytearray()
+        self._base = 0  # stream position of the first byte in the buffer
+        self._pos = 0
+        self._fed = False  # all chunks are queued
+        self._ended = False  # all chunks are read
+        self._aborted = False
+        self._keep = True
+
+    async def feed(self, data: bytes) -> None:
+        """Add a chunk of data, waiting while the queue is full."""
+        while True:
+            with self._condition:
+                if self.closed:
+                    return
+                if self._queued < self._limit:
+                    self._chunks.append(bytes(data))
+                    self._queued += len(data)
+                    self._condition.notify()
+                    return
+                space = asyncio.Event()
+                self._space = (asyncio.get_running_loop(), space)
+            await space.wait()
+
+    def end(self) -> None:
+        """Mark the end of the data."""
+        with self._condition:
+            self._fed = True
+            self._condition.notify()
+
+    def abort(self) -> None:
+        """End the data with an error, e.g. when the download failed."""
+        with self._condition:
+            self._aborted = self._fed = True
+            self._condition.notify()
+
+    def close(self) -> None:
+        """Stop reading; chunks fed from now on are dropped."""
+        with self._condition:
+            super().close()
+            self._chunks.clear()
+            self.__wake_feeder()
+
+    def release(self) -> None:
+        """Stop keeping the data before the current position."""
+        self._keep = False
+        self.__trim()
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self._pos
+
+    def seek(self, offset: int, whence: int = os.SEEK_SET) -> int:
+        if whence == os.SEEK_CUR:
+            offset += self._pos
+        elif whence != os.SEEK_SET:
+            raise OSError("Cannot seek from the end of a stream")
+        if offset < self._base:
+            raise OSError("Cannot seek back that far in a released stream")
+        self._pos = offset
+        return offset
+
+    def read(self, size: int | None = -1) -> bytes:
+        if size is None or size < 0:
+            self.__fill(None)
+            end = self._base + len(self._buffer)
+        else:
+            end = self.__fill(self._pos + size)
+        start = self._pos - self._base
+        data = bytes(self._buffer[start : max(end - self._base, start)])
+        self._pos += len(data)
+        self.__trim()
+        return data
+
+    def readinto(self, buffer) -> int:  # type: ignore[override]
+        data = self.read(len(buffer))
+        buffer[: len(data)] = data
+        return len(data)
+
+    def __fill(self, end: int | None) -> int:
+        # Wait for chunks until the data up to end (or all data) arrived
+        while not self._ended and (end is None or self._base + len(self._buffer) < end):
+            with self._condition:
+                while not self._chunks and not self._fed:
+                    self._condition.wait()
+                if not self._chunks:
+                    self._ended = True
+                    break
+                chunk = self._chunks.popleft()
+                self._queued -= len(chunk)
+                self.__wake_feeder()
+            self._buffer += chunk
+        if self._aborted:
+            raise OSError("Download aborted")
+        available = self._base + len(self._buffer)
+        return available if end is None else min(end, available)
+
+    def __wake_feeder(self) -> None:
+        # Called with the condition held
+        if self._space is not None:
+            loop, space = self._space
+            self._space = None
+            loop.call_soon_threadsafe(space.set)
+
+    def __trim(self) -> None:
+        drop = min(self._pos - STREAM_HISTORY - self._base, len(self._buffer))
+        if self._keep or drop <= 0:
+            return
+        del self._buffer[:drop]
+        self._base += drop
+
+
+def decode_stream(stream: ChunkStream, size: tuple[int, int]) -> Image.Image:
+    """Decode an image while it arrives, reduced to no less than size.
+
+    JPEG images are decoded straight at a reduced scale (draft mode); other
+    images are reduced after decoding, by the largest whole factor that
+    keeps them at least size. The stream is closed when the image is decoded
+    or cannot be.
+    """
+    with stream:
+        image = Image.open(stream)
+        stream.release()
+        if image.format == "JPEG":
+            image.draft(image.mode, size)
+        image.load()
+    return reduce_image(image, size)
+
+
+def reduce_image(image: Image.Image, size: tuple[int, int]) -> Image.Image:
+    """Return the image reduced by the largest whole factor keeping it size."""
+    factor = min(image.width // size[0], image.height // size[1])
+    if factor < 2:
+        return image
+    if image.mode not in ("L", "LA", "RGB", "RGBA"):
+        image = image.convert("RGBA")
+    return image.reduce(factor)
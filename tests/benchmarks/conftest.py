@@ -0,0 +1,26 @@
+"""Fixtures of the benchmarks.
+
+The benchmarks use the radar frames of the radar_frames fixture, see
+tests/conftest.py.
+"""
+
+from collections.abc import Callable
+import time
+
+import pytest
+
+
+def _measure(function: Callable[[], object], repeat: int = 3) -> tuple[float, float]:
+    wall = cpu = float("inf")
+    for _ in range(repeat):
+        started, started_cpu = time.perf_counter(), time.process_time()
+        function()
+        wall = min(wall, time.perf_counter() - started)
+        cpu = min(cpu, time.process_time() - started_cpu)
+    return wall, cpu
+
+
+@pytest.fixture
+def measure() -> Callable[..., tuple[float, float]]:
+    """Return the best wall and CPU time (seconds) of calls to a function."""
+    return _measure
@@ -0,0 +1,124 @@
+"""Steady state of the animation: one new frame per refresh.
+
+The old path read every frame file of the animation, stamped the marker
+with a PNG round trip per frame and encoded all frames again. The builder
+takes the frames from the frame store and reuses the APNG parts of the
+frames it encoded before.
+"""
+
+from collections.abc import Callable
+from io import BytesIO
+import os
+import time
+
+import numpy as np
+from PIL import Image
+import pytest
+
+from custom_components.weerplaza.animation import AnimationBuilder, durations
+from custom_components.weerplaza.const import DEFAULT_FRAMES, AnimationFormat
+from custom_components.weerplaza.frame_store import FrameStore
+
+pytestmark = pytest.mark.benchmark
+
+MIB = 1024 * 1024
+
+
+class ReadCounter:
+    """Count the bytes of the files opened by Pillow."""
+
+    def __init__(self, monkeypatch: pytest.MonkeyPatch) -> None:
+        self.bytes = 0
+        self._open = Image.open
+        monkeypatch.setattr(Image, "open", self.__open)
+
+    def __open(self, fp, *args, **kwargs) -> Image.Image:
+        if isinstance(fp, str):
+            self.bytes += os.path.getsize(fp)
+        return self._open(fp, *args, **kwargs)
+
+
+def old_animation(filenames: list[str], marker: Image.Image, path: str) -> None:
+    """The animation as the integration made it before the frame store."""
+    images = []
+    for filename in filenames:
+        final = Image.open(filename).convert("RGBA")
+        final.paste(marker, (0, 0), marker)
+        stream = BytesIO()
+        final.save(stream, format="PNG")
+        stream.seek(0)
+        images.append(Image.open(stream).convert("RGBA"))
+    images[0].save(
+        path,
+        format="PNG",
+        save_all=True,
+        append_images=images[1:],
+        loop=0,
+        duration=durations(len(images)),
+    )
+
+
+def steady_state(
+    filenames: list[str], cycle: Callable[[list[str]], object]
+) -> tuple[float, float]:
+    """Return the mean wall and CPU time of the cycles after the first."""
+    cycle(filenames[:DEFAULT_FRAMES])
+    started, started_cpu = time.perf_counter(), time.process_time()
+    cycles = len(filenames) - DEFAULT_FRAMES
+    for start in range(1, cycles + 1):
+        cycle(filenames[start : start + DEFAULT_FRAMES])
+    return (
+        (time.perf_counter() - started) / cycles,
+        (time.process_time() - started_cpu) / cycles,
+    )
+
+
+def test_new_frame(
+    tmp_path,
+    monkeypatch: pytest.MonkeyPatch,
+    radar_frames: list[np.ndarray],
+    marker_stamp: Callable[[np.ndarray], np.ndarray],
+    report: Callable[[str], None],
+) -> None:
+    if len(radar_frames) <= DEFAULT_FRAMES:
+        pytest.skip(f"More than {DEFAULT_FRAMES} frames needed")
+    filenames = [
+        os.path.join(tmp_path, f"20261018-{index:04d}.png")
+        for index in range(len(radar_frames))
+    ]
+    for filename, frame in zip(filenames, radar_frames):
+        Image.fromarray(frame).save(filename)
+    path = os.path.join(tmp_path, "animated.png")
+    # The marker of the old path: the stamp, cut out of a transparent frame
+    transparent = np.zeros_like(radar_frames[0])
+    marker = Image.fromarray(marker_stamp(transparent))
+
+    counter = ReadCounter(monkeypatch)
+    old_wall, old_cpu = steady_state(
+        filenames, lambda window: old_animation(window, marker, path)
+    )
+    old_read, counter.bytes = counter.bytes, 0
+
+    store = FrameStore(256 * MIB)
+    for filename, frame in zip(filenames, radar_frames):
+        store.add(filename, frame, None)
+    store.flush()
+    builder = AnimationBuilder(lambda size: store.reserve("animation", size))
+
+    def cycle(window: list[str]) -> None:
+        builder.build(window, store.get, marker_stamp, "marker")
+        assert builder.write(path, AnimationFormat.APNG)
+
+    new_wall, new_cpu = steady_state(filenames, cycle)
+    new_read = counter.bytes
+
+    cycles = len(filenames) - DEFAULT_FRAMES + 1
+    report(
+        f"animation, one new frame of {DEFAULT_FRAMES}: "
+        f"old {old_cpu * 1000:.0f} ms CPU ({old_wall * 1000:.0f} ms), "
+        f"{old_read / cycles / MIB:.2f} MiB read; "
+        f"new {new_cpu * 1000:.0f} ms CPU ({new_wall * 1000:.0f} ms), "
+        f"{new_read / cycles / MIB:.2f} MiB read"
+    )
+    assert new_cpu < old_cpu
+    assert new_read == 0
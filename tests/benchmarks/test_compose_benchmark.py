@@ -0,0 +1,75 @@
+"""Compositing a frame: compose_frame against the old pipeline.
+
+The old pipeline loaded the background and borders for every frame,
+resized the layer to the canvas, composited the canvas, rotated it and
+cropped it to the frame. compose_frame warps the layer straight onto the
+plates, which are rotated and cropped once.
+"""
+
+from collections.abc import Callable
+import os
+
+import numpy as np
+from PIL import Image
+import pytest
+
+from custom_components.weerplaza.assets import (
+    BACKGROUND_IMAGE,
+    BORDERS_IMAGE,
+    FRAME_BOX,
+    FRAME_ROTATION,
+    IMAGES_PATH,
+    ImageAssets,
+)
+from custom_components.weerplaza.compositor import Compositor
+from custom_components.weerplaza.renderer import compose_frame
+
+pytestmark = pytest.mark.benchmark
+
+
+def load(filename: str) -> Image.Image:
+    with Image.open(os.path.join(IMAGES_PATH, filename)) as image:
+        return image.convert("RGBA")
+
+
+def old_compose(original: Image.Image) -> np.ndarray:
+    final = load(BACKGROUND_IMAGE)
+    original_image = original.resize(
+        (final.width, final.height), Image.Resampling.LANCZOS
+    ).convert("RGBA")
+    final.paste(original_image, (0, 0), original_image)
+    borders_image = load(BORDERS_IMAGE)
+    final.paste(borders_image, (0, 0), borders_image)
+    final = final.rotate(FRAME_ROTATION, expand=False, fillcolor=(0, 0, 0, 0))
+    return np.asarray(final.crop(FRAME_BOX))
+
+
+@pytest.mark.parametrize("scale", [1, 2], ids=["canvas size", "half size"])
+def test_compose_frame(
+    scale: int,
+    assets: ImageAssets,
+    radar_layer: Image.Image,
+    measure: Callable[..., tuple[float, float]],
+    report: Callable[[str], None],
+) -> None:
+    width, height = radar_layer.size
+    original = radar_layer.resize((width // scale, height // scale))
+    compositor = Compositor(*assets.background.shape[:2])
+
+    def new_compose() -> np.ndarray:
+        return compose_frame(assets, compositor, original, None)[0]
+
+    old_wall, old_cpu = measure(lambda: old_compose(original))
+    new_wall, new_cpu = measure(new_compose)
+    # Scaled layers are resampled differently (bicubic warp against a Lanczos
+    # resize and a nearest neighbour rotation); canvas size layers are not
+    difference = np.abs(
+        old_compose(original).astype(np.int16) - new_compose().astype(np.int16)
+    )
+    report(
+        f"compose_frame, {original.width}x{original.height} layer: "
+        f"old {old_cpu * 1000:.0f} ms CPU ({old_wall * 1000:.0f} ms), "
+        f"new {new_cpu * 1000:.0f} ms CPU ({new_wall * 1000:.0f} ms), "
+        f"mean difference {difference.mean():.2f}"
+    )
+    assert new_cpu < old_cpu
@@ -0,0 +1,92 @@
+"""Size and time of the animation encoders.
+
+Every format is encoded for every layer with frames (see layer_frames),
+and decoded again with Pillow to show what a client pays for it.
+"""
+
+from collections.abc import Callable
+from io import BytesIO
+
+import numpy as np
+from PIL import Image, ImageSequence
+import pytest
+
+from custom_components.weerplaza.animation import durations
+from custom_components.weerplaza.const import (
+    DEFAULT_FRAMES,
+    AnimationFormat,
+    ImageType,
+)
+from custom_components.weerplaza.encoder import encode, encode_apng
+
+pytestmark = pytest.mark.benchmark
+
+KIB = 1024
+
+
+def pillow_apng(frames: list[np.ndarray], times: list[int]) -> bytes:
+    """APNG as written by Pillow (and imageio before): every frame in full."""
+    images = [Image.fromarray(frame) for frame in frames]
+    stream = BytesIO()
+    images[0].save(
+        stream,
+        format="PNG",
+        save_all=True,
+        append_images=images[1:],
+        loop=0,
+        duration=times,
+        default_image=False,
+        disposal=0,
+        blend=0,
+    )
+    return stream.getvalue()
+
+
+@pytest.mark.parametrize(
+    "encoder",
+    [encode_apng, pillow_apng],
+    ids=["encode_apng", "pillow"],
+)
+def test_apng(
+    encoder: Callable[[list[np.ndarray], list[int]], bytes],
+    radar_frames: list[np.ndarray],
+    measure: Callable[..., tuple[float, float]],
+    report: Callable[[str], None],
+) -> None:
+    frames = radar_frames[:DEFAULT_FRAMES]
+    times = durations(len(frames))
+    data = encoder(frames, times)
+    wall, cpu = measure(lambda: encoder(frames, times))
+    report(
+        f"APNG {encoder.__name__}, {len(frames)} frames: "
+        f"{len(data) / KIB:.0f} KiB, {cpu * 1000:.0f} ms CPU ({wall * 1000:.0f} ms)"
+    )
+
+
+def decode(data: bytes) -> None:
+    with Image.open(BytesIO(data)) as image:
+        for frame in ImageSequence.Iterator(image):
+            frame.convert("RGBA")
+
+
+@pytest.mark.parametrize("fmt", list(AnimationFormat), ids=lambda fmt: fmt.value)
+@pytest.mark.parametrize("image_type", list(ImageType), ids=lambda layer: layer.value)
+def test_encode(
+    image_type: ImageType,
+    fmt: AnimationFormat,
+    layer_frames: dict[ImageType, list[np.ndarray]],
+    measure: Callable[..., tuple[float, float]],
+    report: Callable[[str], None],
+) -> None:
+    if image_type not in layer_frames:
+        pytest.skip(f"No recorded {image_type.value} frames")
+    frames = layer_frames[image_type][:DEFAULT_FRAMES]
+    times = durations(len(frames))
+    data = encode(frames, times, fmt)
+    wall, cpu = measure(lambda: encode(frames, times, fmt))
+    _, decode_cpu = measure(lambda: decode(data))
+    report(
+        f"{image_type.value} as {fmt.value}, {len(frames)} frames: "
+        f"{len(data) / KIB:.0f} KiB, encode {cpu * 1000:.0f} ms CPU "
+        f"({wall * 1000:.0f} ms), decode {decode_cpu * 1000:.0f} ms CPU"
+    )
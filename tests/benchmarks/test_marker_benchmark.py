@@ -0,0 +1,91 @@
+"""Cost of the markers per frame.
+
+A frame with markers is a copy of the frame with the overlay of all
+markers blended onto it (Compositor.blend_at), like the API's stamp. The
+old integration pasted the marker and made a PNG round trip per frame.
+"""
+
+from collections.abc import Callable
+from io import BytesIO
+
+import numpy as np
+from PIL import Image
+import pytest
+
+from custom_components.weerplaza.animation import AnimationBuilder
+from custom_components.weerplaza.assets import FRAME_PROJECTION, FRAME_SIZE, ImageAssets
+from custom_components.weerplaza.compositor import Compositor
+from custom_components.weerplaza.const import DEFAULT_FRAMES, AnimationFormat
+from custom_components.weerplaza.markers import Marker, render_markers
+
+pytestmark = pytest.mark.benchmark
+
+MARKERS = {
+    "one marker": (Marker("home", 52.1, 5.18),),
+    "ten markers": tuple(
+        Marker(f"marker {index}", 51.0 + 0.25 * index, 3.8 + 0.35 * index, "dot")
+        for index in range(10)
+    ),
+}
+
+
+def stamper(
+    assets: ImageAssets, markers: tuple[Marker, ...]
+) -> Callable[[np.ndarray], np.ndarray]:
+    overlay = render_markers(
+        markers, assets.icons, assets.label_font, FRAME_PROJECTION, FRAME_SIZE
+    )
+    assert overlay is not None
+    image, x, y = overlay
+    compositor = Compositor(FRAME_SIZE[1], FRAME_SIZE[0])
+
+    def stamp(frame: np.ndarray) -> np.ndarray:
+        stamped = frame.copy()
+        compositor.blend_at(stamped, image, x, y)
+        return stamped
+
+    return stamp
+
+
+def old_stamp(frame: np.ndarray, marker: Image.Image) -> np.ndarray:
+    final = Image.fromarray(frame)
+    final.paste(marker, (0, 0), marker)
+    stream = BytesIO()
+    final.save(stream, format="PNG")
+    stream.seek(0)
+    return np.asarray(Image.open(stream).convert("RGBA"))
+
+
+@pytest.mark.parametrize("markers", list(MARKERS))
+def test_stamp(
+    markers: str,
+    assets: ImageAssets,
+    radar_frames: list[np.ndarray],
+    measure: Callable[..., tuple[float, float]],
+    report: Callable[[str], None],
+) -> None:
+    frames = radar_frames[:DEFAULT_FRAMES]
+    stamp = stamper(assets, MARKERS[markers])
+    names = [str(index) for index in range(len(frames))]
+
+    def animation(marker: bool) -> None:
+        builder = AnimationBuilder()
+        if marker:
+            builder.build(names, lambda name: frames[int(name)], stamp, markers)
+        else:
+            builder.build(names, lambda name: frames[int(name)])
+        builder.write(None, AnimationFormat.APNG)
+
+    _, stamp_cpu = measure(lambda: [stamp(frame) for frame in frames])
+    marker = Image.fromarray(stamp(np.zeros_like(frames[0])))
+    _, old_cpu = measure(lambda: [old_stamp(frame, marker) for frame in frames])
+    _, off_cpu = measure(lambda: animation(False))
+    _, on_cpu = measure(lambda: animation(True))
+    count = len(frames)
+    report(
+        f"{markers}, per frame: stamp {stamp_cpu / count * 1000:.2f} ms CPU "
+        f"(old paste and PNG round trip {old_cpu / count * 1000:.1f} ms); "
+        f"animation without markers {off_cpu / count * 1000:.0f} ms, "
+        f"with {on_cpu / count * 1000:.0f} ms"
+    )
+    assert stamp_cpu < old_cpu
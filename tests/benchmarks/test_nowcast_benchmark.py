@@ -0,0 +1,39 @@
+"""Time of the nowcast per NOWCAST_SCALE (2 to 8, see the number entity)."""
+
+from collections.abc import Callable
+
+import numpy as np
+import pytest
+
+from custom_components.weerplaza.nowcast import Nowcaster
+
+pytestmark = pytest.mark.benchmark
+
+# The leads of the API (NOWCAST_LEADS), in minutes
+LEADS = [10, 20, 30, 40, 50, 60]
+# Rain pixels moved per five minutes
+SHIFT = (4, 6)
+
+
+@pytest.mark.parametrize("scale", range(2, 9))
+def test_forecast(
+    scale: int,
+    rain_layer: np.ndarray,
+    measure: Callable[..., tuple[float, float]],
+    report: Callable[[str], None],
+) -> None:
+    previous = np.roll(rain_layer, (-SHIFT[0], -SHIFT[1]), axis=(0, 1))
+    nowcaster = Nowcaster()
+
+    def add() -> None:
+        nowcaster.add(0, previous, scale)
+        nowcaster.add(300, rain_layer, scale)
+
+    _, add_cpu = measure(add)
+    assert nowcaster.forecast(LEADS) is not None
+    wall, cpu = measure(lambda: nowcaster.forecast(LEADS))
+    report(
+        f"nowcast at scale {scale}: add {add_cpu / 2 * 1000:.1f} ms per layer, "
+        f"forecast of {len(LEADS)} leads {cpu * 1000:.0f} ms CPU "
+        f"({wall * 1000:.0f} ms)"
+    )
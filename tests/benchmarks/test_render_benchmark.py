@@ -0,0 +1,85 @@
+"""Wall time of a refresh of all seven layers, in threads and in processes.
+
+A refresh composites the new frame of every layer and encodes its
+animation, the layers in parallel executor jobs. In threads the jobs share
+the GIL; the process renderer runs them in its worker processes. The
+workers import the package __init__, so they need Home Assistant.
+"""
+
+from collections.abc import Callable, Iterator
+from concurrent.futures import ThreadPoolExecutor
+import os
+import threading
+
+import numpy as np
+from PIL import Image
+import pytest
+
+from custom_components.weerplaza.animation import durations
+from custom_components.weerplaza.assets import FRAME_SIZE, ImageAssets
+from custom_components.weerplaza.compositor import Compositor
+from custom_components.weerplaza.const import DEFAULT_FRAMES, AnimationFormat, ImageType
+from custom_components.weerplaza.encoder import encode
+from custom_components.weerplaza.renderer import (
+    ProcessRenderer,
+    compose_frame,
+    draw_time,
+)
+
+pytestmark = pytest.mark.benchmark
+
+LAYERS = len(ImageType)
+TIME = "12:00"
+
+
+@pytest.fixture(scope="module")
+def renderer() -> Iterator[ProcessRenderer]:
+    pytest.importorskip("homeassistant")
+    renderer = ProcessRenderer()
+    yield renderer
+    renderer.shutdown()
+
+
+def test_refresh(
+    assets: ImageAssets,
+    radar_layer: Image.Image,
+    layer_frames: dict[ImageType, list[np.ndarray]],
+    renderer: ProcessRenderer,
+    measure: Callable[..., tuple[float, float]],
+    report: Callable[[str], None],
+) -> None:
+    # Layers without recorded frames are refreshed with the radar frames
+    radar_frames = layer_frames[ImageType.RAIN_RADAR]
+    animations = [
+        layer_frames.get(image_type, radar_frames)[-DEFAULT_FRAMES:]
+        for image_type in ImageType
+    ]
+    compositors = threading.local()
+
+    def thread_refresh(frames: list[np.ndarray]) -> None:
+        compositor = getattr(compositors, "compositor", None)
+        if compositor is None:
+            compositor = Compositor(FRAME_SIZE[1], FRAME_SIZE[0])
+            compositors.compositor = compositor
+        frame, _ = compose_frame(assets, compositor, radar_layer, None)
+        draw_time(frame, TIME, assets.font)
+        encode(frames, durations(len(frames)), AnimationFormat.APNG)
+
+    def process_refresh(frames: list[np.ndarray]) -> None:
+        renderer.render(radar_layer, None, False, TIME)
+        renderer.encode(frames, durations(len(frames)), AnimationFormat.APNG)
+
+    def refresh(layer_refresh: Callable[[list[np.ndarray]], None]) -> None:
+        with ThreadPoolExecutor(LAYERS) as executor:
+            list(executor.map(layer_refresh, animations))
+
+    # The first refresh spawns the workers
+    refresh(process_refresh)
+    thread_wall, thread_cpu = measure(lambda: refresh(thread_refresh))
+    process_wall, process_cpu = measure(lambda: refresh(process_refresh))
+    report(
+        f"refresh of {LAYERS} layers on {os.cpu_count()} CPUs: "
+        f"threads {thread_wall * 1000:.0f} ms ({thread_cpu * 1000:.0f} ms CPU), "
+        f"processes {process_wall * 1000:.0f} ms "
+        f"({process_cpu * 1000:.0f} ms CPU in Home Assistant)"
+    )
@@ -0,0 +1,198 @@
+"""Test setup for the Weerplaza integration.
+
+The imaging modules (tools, compositor, scheduler, ...) do not depend on
+Home Assistant. When Home Assistant is not installed the integration
+package is registered without running its __init__, so those modules can
+still be tested; tests of the API skip in that case.
+
+Tests and benchmarks use the frames recorded by the integration when
+WEERPLAZA_FRAMES points at them (a copy of .storage/weerplaza, with a
+directory per layer). Otherwise only radar frames are available: they are
+made from the recorded example frame in assets/, whose rain is composited
+onto the plates and moved a few pixels per frame, and every frame gets
+its time, so the frames change like real radar frames do.
+
+The benchmarks (tests/benchmarks) only run with --benchmark; their results
+are shown after the tests.
+"""
+
+from collections.abc import Callable
+import glob
+import importlib.util
+import os
+import sys
+import types
+
+import numpy as np
+from PIL import Image
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PACKAGE = "custom_components.weerplaza"
+REPORT = pytest.StashKey[list[str]]()
+
+sys.path.insert(0, ROOT)
+
+if importlib.util.find_spec("homeassistant") is None:
+    package = types.ModuleType(PACKAGE)
+    package.__path__ = [os.path.join(ROOT, *PACKAGE.split("."))]
+    sys.modules.setdefault(PACKAGE, package)
+
+# Only importable once the package is registered
+from custom_components.weerplaza.assets import (
+    FRAME_BOX,
+    FRAME_PROJECTION,
+    FRAME_SIZE,
+    ImageAssets,
+)
+from custom_components.weerplaza.compositor import Compositor
+from custom_components.weerplaza.const import ImageType
+from custom_components.weerplaza.frame_index import FRAME_PATTERN
+from custom_components.weerplaza.markers import Marker, render_markers
+from custom_components.weerplaza.renderer import draw_time
+
+EXAMPLE = os.path.join(ROOT, "assets", "camera_weerplaza_rain_radar_example.jpg")
+FRAMES = 24
+# Pixels the rain moves per frame, roughly 15 km/h to the north east
+MOTION = (3, -2)
+MARKER = Marker("marker", 52.1, 5.18)
+
+
+def pytest_addoption(parser: pytest.Parser) -> None:
+    parser.addoption(
+        "--benchmark",
+        action="store_true",
+        default=False,
+        help="run the benchmarks (tests/benchmarks)",
+    )
+
+
+def pytest_configure(config: pytest.Config) -> None:
+    config.addinivalue_line("markers", "benchmark: only run with --benchmark")
+
+
+def pytest_collection_modifyitems(
+    config: pytest.Config, items: list[pytest.Item]
+) -> None:
+    if config.getoption("--benchmark"):
+        return
+    skip = pytest.mark.skip(reason="benchmark, run with --benchmark")
+    for item in items:
+        if "benchmark" in item.keywords:
+            item.add_marker(skip)
+
+
+@pytest.fixture
+def report(request: pytest.FixtureRequest) -> Callable[[str], None]:
+    """Add a line to the benchmark results, shown after the tests."""
+    return request.config.stash.setdefault(REPORT, []).append
+
+
+def pytest_terminal_summary(
+    terminalreporter: pytest.TerminalReporter, config: pytest.Config
+) -> None:
+    if lines := config.stash.get(REPORT, []):
+        terminalreporter.section("benchmarks")
+        for line in lines:
+            terminalreporter.write_line(line)
+
+
+def recorded_rain() -> np.ndarray:
+    """The rain of the example frame, as an RGBA layer of the frame size."""
+    example = Image.open(EXAMPLE).convert("RGB").resize(FRAME_SIZE, Image.NEAREST)
+    pixels = np.asarray(example).astype(np.int16)
+    red, green, blue = pixels[..., 0], pixels[..., 1], pixels[..., 2]
+    # Blue to white and red rain, not the green land, the blue sea or the
+    # yellow borders and marker
+    rain = ((blue > green + 40) & (red > 90)) | ((red > green + 80) & (red > 150))
+    rain |= (red > 200) & (green > 200) & (blue > 200)
+    # Not the time in the bottom left corner
+    rain[-60:, :150] = False
+    layer = np.zeros((FRAME_SIZE[1], FRAME_SIZE[0], 4), dtype=np.uint8)
+    layer[rain, :3] = pixels[rain]
+    layer[rain, 3] = 255
+    return layer
+
+
+def moved(layer: np.ndarray, dx: int, dy: int) -> np.ndarray:
+    result = np.zeros_like(layer)
+    height, width = layer.shape[:2]
+    result[max(dy, 0) : height + min(dy, 0), max(dx, 0) : width + min(dx, 0)] = layer[
+        max(-dy, 0) : height - max(dy, 0), max(-dx, 0) : width - max(dx, 0)
+    ]
+    return result
+
+
+@pytest.fixture(scope="session")
+def assets() -> ImageAssets:
+    return ImageAssets()
+
+
+@pytest.fixture(scope="session")
+def rain_layer() -> np.ndarray:
+    """The recorded rain, warped to the frame (read-only)."""
+    layer = recorded_rain()
+    layer.flags.writeable = False
+    return layer
+
+
+@pytest.fixture(scope="session")
+def radar_layer(assets: ImageAssets, rain_layer: np.ndarray) -> Image.Image:
+    """A source layer with the recorded rain, as Weerplaza serves it."""
+    layer = Image.new("RGBA", assets.canvas_size, (0, 0, 0, 0))
+    layer.paste(Image.fromarray(rain_layer), FRAME_BOX[:2])
+    return layer
+
+
+def recorded_frames(image_type: ImageType) -> list[np.ndarray]:
+    """The frames of a layer in WEERPLAZA_FRAMES, oldest first."""
+    if not (root := os.environ.get("WEERPLAZA_FRAMES")):
+        return []
+    directory = os.path.join(root, image_type.value)
+    filenames = sorted(glob.glob(os.path.join(directory, FRAME_PATTERN)))
+    return [np.array(Image.open(name).convert("RGBA")) for name in filenames]
+
+
+@pytest.fixture(scope="session")
+def radar_frames(assets: ImageAssets) -> list[np.ndarray]:
+    """Composited radar frames, oldest first."""
+    if os.environ.get("WEERPLAZA_FRAMES"):
+        frames = recorded_frames(ImageType.RAIN_RADAR)
+        assert len(frames) > 1, "No recorded radar frames"
+        return frames
+    rain = recorded_rain()
+    compositor = Compositor(FRAME_SIZE[1], FRAME_SIZE[0])
+    frames = []
+    for index in range(FRAMES):
+        layer = moved(rain, MOTION[0] * index, MOTION[1] * index)
+        frame = compositor.composite(assets.background, [layer, assets.borders])
+        minutes = 12 * 60 + 5 * index
+        time_str = f"{minutes // 60:02d}:{minutes % 60:02d}"
+        frames.append(draw_time(frame, time_str, assets.font))
+    return frames
+
+
+@pytest.fixture(scope="session")
+def layer_frames(radar_frames: list[np.ndarray]) -> dict[ImageType, list[np.ndarray]]:
+    """The frames of every layer with recorded frames (at least the radar)."""
+    layers = {image_type: recorded_frames(image_type) for image_type in ImageType}
+    layers[ImageType.RAIN_RADAR] = radar_frames
+    return {image_type: frames for image_type, frames in layers.items() if frames}
+
+
+@pytest.fixture(scope="session")
+def marker_stamp(assets: ImageAssets) -> Callable[[np.ndarray], np.ndarray]:
+    """Stamp the marker onto a copy of a frame, as the API does."""
+    overlay = render_markers(
+        (MARKER,), assets.icons, assets.label_font, FRAME_PROJECTION, FRAME_SIZE
+    )
+    assert overlay is not None
+    image, x, y = overlay
+    compositor = Compositor(FRAME_SIZE[1], FRAME_SIZE[0])
+
+    def stamp(frame: np.ndarray) -> np.ndarray:
+        stamped = frame.copy()
+        compositor.blend_at(stamped, image, x, y)
+        return stamped
+
+    return stamp
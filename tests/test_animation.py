@@ -0,0 +1,186 @@
+"""Tests for the incremental animation builder."""
+
+from collections import Counter
+from io import BytesIO
+
+import numpy as np
+from PIL import Image, ImageSequence
+import pytest
+
+from custom_components.weerplaza.animation import (
+    PREVIEW_WIDTH,
+    AnimationBuilder,
+    durations,
+)
+from custom_components.weerplaza.const import AnimationFormat, StillFormat
+from custom_components.weerplaza.encoder import encode
+
+SHAPE = (60, 80, 4)
+
+
+def make_frames(count: int) -> dict[str, np.ndarray]:
+    """Frames on a common background with a moving opaque block."""
+    rng = np.random.default_rng(4)
+    background = rng.integers(0, 256, SHAPE, dtype=np.uint8)
+    background[..., 3] = 255
+    frames = {}
+    for index in range(count):
+        frame = background.copy()
+        frame[10:20, 2 * index : 2 * index + 8] = (0, 100, 255, 255)
+        frames[f"/frames/20261018-{1000 + 5 * index}.png"] = frame
+    return frames
+
+
+def decoded(data: bytes) -> list[np.ndarray]:
+    with Image.open(BytesIO(data)) as image:
+        return [
+            np.array(frame.convert("RGBA")) for frame in ImageSequence.Iterator(image)
+        ]
+
+
+class Loader:
+    """Load frames from a dict, counting the loads."""
+
+    def __init__(self, frames: dict[str, np.ndarray]) -> None:
+        self.frames = frames
+        self.loads: Counter[str] = Counter()
+
+    def __call__(self, filename: str) -> np.ndarray | None:
+        self.loads[filename] += 1
+        return self.frames.get(filename)
+
+
+def stamp(frame: np.ndarray) -> np.ndarray:
+    stamped = frame.copy()
+    stamped[40:45, 40:45] = (255, 255, 0, 255)
+    return stamped
+
+
+def test_new_frame_only_encodes_what_is_new() -> None:
+    frames = make_frames(12)
+    names = list(frames)
+    loader = Loader(frames)
+    reserved = []
+    builder = AnimationBuilder(reserved.append)
+
+    builder.build(names[:8], loader, stamp, "marker")
+    assert builder.write(None, AnimationFormat.APNG)
+    assert loader.loads == Counter(names[:8])
+    for start in range(1, 5):
+        window = names[start : start + 8]
+        loader.loads.clear()
+        builder.build(window, loader, stamp, "marker")
+        assert builder.write(None, AnimationFormat.APNG)
+        # The new frame, the one before it and the new first frame
+        assert loader.loads == Counter([window[0], window[-2], window[-1]])
+        expected = [stamp(frames[name]) for name in window]
+        assert builder.data == encode(expected, durations(8), AnimationFormat.APNG)
+    assert reserved[-1] > 0
+
+
+def test_stamp_change_rebuilds() -> None:
+    frames = make_frames(4)
+    loader = Loader(frames)
+    builder = AnimationBuilder()
+    builder.build(list(frames), loader, stamp, "marker")
+    builder.write(None, AnimationFormat.APNG)
+    builder.build(list(frames), loader)
+    builder.write(None, AnimationFormat.APNG)
+    for frame, expected in zip(decoded(builder.data), frames.values()):
+        np.testing.assert_array_equal(frame, expected)
+
+
+def test_appended_frames_follow_the_files() -> None:
+    frames = make_frames(6)
+    names = list(frames)
+    files = {name: frames[name] for name in names[:4]}
+    appended = {f"forecast+{i}": frames[name] for i, name in enumerate(names[4:])}
+    builder = AnimationBuilder()
+    builder.build(list(files), Loader(files), appended=appended)
+    builder.write(None, AnimationFormat.APNG)
+    for frame, expected in zip(decoded(builder.data), frames.values(), strict=True):
+        np.testing.assert_array_equal(frame, expected)
+    # The still is the newest file, not a forecast
+    with Image.open(BytesIO(builder.still())) as still:
+        assert still.format == "WEBP"
+
+
+def test_still_formats() -> None:
+    frames = make_frames(3)
+    builder = AnimationBuilder()
+    builder.build(list(frames), Loader(frames))
+    builder.write(None, AnimationFormat.APNG)
+    # Nothing is encoded until the still is requested
+    assert builder.cached_still(StillFormat.PNG) is None
+    data = builder.still(StillFormat.PNG)
+    assert builder.cached_still(StillFormat.PNG) == data
+    with Image.open(BytesIO(data)) as still:
+        assert still.format == "PNG"
+        np.testing.assert_array_equal(np.asarray(still), list(frames.values())[-1])
+    assert builder.cached_still(StillFormat.WEBP) is None
+
+
+def test_missing_frames_are_skipped() -> None:
+    frames = make_frames(6)
+    names = list(frames)
+    loader = Loader(dict(frames))
+    builder = AnimationBuilder()
+    builder.build(names, loader)
+    builder.write(None, AnimationFormat.APNG)
+    # A frame dropped from memory (without persistence) can no longer be
+    # loaded, but its part is kept; the part after it is cached as well
+    del loader.frames[names[2]]
+    builder.build(names[1:], loader)
+    builder.write(None, AnimationFormat.APNG)
+    result = decoded(builder.data)
+    assert len(result) == 5
+    for frame, name in zip(result, names[1:]):
+        np.testing.assert_array_equal(frame, frames[name])
+    # The first frame after a missing frame is encoded in full
+    builder.build([names[1], names[3], names[4]], loader)
+    builder.write(None, AnimationFormat.APNG)
+    result = decoded(builder.data)
+    assert len(result) == 3
+    for frame, name in zip(result, [names[1], names[3], names[4]]):
+        np.testing.assert_array_equal(frame, frames[name])
+
+
+@pytest.mark.parametrize("fmt", [AnimationFormat.WEBP_LOSSLESS, AnimationFormat.GIF])
+def test_other_formats_encode_all_frames(fmt: AnimationFormat) -> None:
+    frames = make_frames(5)
+    reserved = []
+    builder = AnimationBuilder(reserved.append)
+    builder.build(list(frames), Loader(frames))
+    builder.write(None, AnimationFormat.APNG)
+    builder.write(None, fmt)
+    assert len(decoded(builder.data)) == 5
+    # Switching away from APNG releases the parts
+    assert reserved[-1] == 0
+
+
+def test_nothing_to_write() -> None:
+    builder = AnimationBuilder()
+    assert not builder.write(None, AnimationFormat.APNG)
+    builder.build(["/frames/missing.png"], Loader({}))
+    assert not builder.write(None, AnimationFormat.APNG)
+    assert builder.data is None
+
+
+def test_preview_only_loads_the_newest_file() -> None:
+    frames = make_frames(6)
+    names = list(frames)
+    files = {name: frames[name] for name in names[:4]}
+    appended = {f"forecast+{i}": frames[name] for i, name in enumerate(names[4:])}
+    loader = Loader(files)
+    builder = AnimationBuilder()
+    builder.build(list(files), loader, stamp, appended=appended)
+    builder.write(None, AnimationFormat.APNG)
+    loader.loads.clear()
+    data = builder.resized(PREVIEW_WIDTH, AnimationFormat.APNG)
+    assert loader.loads == {names[3]: 1}
+    # The preview is the newest file, not a forecast
+    expected = Image.fromarray(stamp(frames[names[3]]))
+    height = PREVIEW_WIDTH * SHAPE[0] // SHAPE[1]
+    expected = expected.resize((PREVIEW_WIDTH, height), Image.Resampling.LANCZOS)
+    (preview,) = decoded(data)
+    np.testing.assert_array_equal(preview, np.asarray(expected))
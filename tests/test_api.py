@@ -0,0 +1,381 @@
+"""Tests for the API client, against a Weerplaza server on localhost."""
+
+from typing import Any
+
+import asyncio
+from collections import Counter
+from collections.abc import AsyncIterator, Awaitable, Callable
+from contextlib import asynccontextmanager
+from datetime import UTC, datetime, timedelta
+from email.utils import format_datetime
+from functools import cache
+import io
+import os
+import time
+from urllib.parse import urlsplit
+
+from PIL import Image, ImageDraw
+import pytest
+
+pytest.importorskip("homeassistant")
+
+from aiohttp import ClientSession, hdrs, web
+from aiohttp.test_utils import TestServer, unused_port
+
+from custom_components.weerplaza import api as weerplaza_api
+from custom_components.weerplaza.api import (
+    IMAGE_URLS,
+    LAYERS_PROCESSED,
+    LAYERS_SKIPPED,
+    WeerplazaApi,
+)
+from custom_components.weerplaza.const import (
+    DOMAIN,
+    PERSIST_FRAMES,
+    ImageType,
+)
+
+TILE_SIZE = (1050, 1148)
+HOST = "127.0.0.1"
+
+
+@cache
+def tile_png() -> bytes:
+    image = Image.new("RGBA", TILE_SIZE, (0, 0, 0, 0))
+    ImageDraw.Draw(image).ellipse((300, 400, 700, 800), fill=(0, 120, 255, 200))
+    buffer = io.BytesIO()
+    image.save(buffer, "PNG")
+    return buffer.getvalue()
+
+
+def frame_times(count: int) -> list[datetime]:
+    """The times of the newest count frames, five minutes apart."""
+    now = datetime.now(UTC).replace(second=0, microsecond=0)
+    newest = now - timedelta(minutes=now.minute % 5 + 5)
+    return [newest - timedelta(minutes=5 * i) for i in reversed(range(count))]
+
+
+class WeerplazaServer:
+    """The splash data of the layers and their tiles, served on localhost.
+
+    Requests, their delays and the statuses of the responses are kept per
+    URL. The splash data of a layer can carry an ETag or a Last-Modified
+    date, and is answered with 304 Not Modified when the request's
+    validators match, as the Weerplaza API does.
+    """
+
+    def __init__(self, port: int) -> None:
+        self.url = f"http://{HOST}:{port}"
+        self.session: ClientSession | None = None
+        self.delays: dict[str, float] = {}
+        self.requests: Counter[str] = Counter()
+        self.statuses: dict[str, list[int]] = {}
+        self._port = port
+        self._splash: dict[
+            str, tuple[dict[str, Any], dict[str, str], datetime | None]
+        ] = {}
+        self._tiles: set[str] = set()
+
+    def splash_url(self, image_type: ImageType) -> str:
+        """The local URL of the splash data (shared like the real ones)."""
+        parts = urlsplit(IMAGE_URLS[image_type])
+        return f"{self.url}/splash/{parts.path.rsplit('/', 1)[-1]}?{parts.query}"
+
+    def tile_url(self, image_type: ImageType, time_val: datetime) -> str:
+        return f"{self.url}/tiles/{image_type.value}/{time_val:%Y%m%d%H%M}.png"
+
+    def add_layer(
+        self,
+        image_type: ImageType,
+        times: list[datetime],
+        etag: str | None = None,
+        last_modified: datetime | None = None,
+        delay: float = 0,
+    ) -> list[str]:
+        """Serve the splash data of a layer and its tiles, return the tile URLs."""
+        tiles = [self.tile_url(image_type, time_val) for time_val in times]
+        data = {
+            "data": [
+                {"dateTime": time_val.isoformat(), "layerNameHD": url}
+                for time_val, url in zip(times, tiles, strict=True)
+            ]
+        }
+        validators = {}
+        if etag is not None:
+            validators[hdrs.ETAG] = etag
+        if last_modified is not None:
+            validators[hdrs.LAST_MODIFIED] = format_datetime(last_modified, True)
+        url = self.splash_url(image_type)
+        self._splash[url] = (data, validators, last_modified)
+        self.delays[url] = delay
+        self._tiles.update(tiles)
+        return tiles
+
+    @asynccontextmanager
+    async def serve(self) -> AsyncIterator[None]:
+        """Run the server, with a client session for the API."""
+        app = web.Application(middlewares=[self.__record])
+        app.router.add_get("/splash/{name}", self.__splash_data)
+        app.router.add_get("/tiles/{layer}/{name}", self.__tile)
+        server = TestServer(app, host=HOST, port=self._port)
+        await server.start_server()
+        try:
+            async with ClientSession() as self.session:
+                yield
+        finally:
+            self.session = None
+            await server.close()
+
+    @web.middleware
+    async def __record(
+        self,
+        request: web.Request,
+        handler: Callable[[web.Request], Awaitable[web.StreamResponse]],
+    ) -> web.StreamResponse:
+        url = str(request.url)
+        self.requests[url] += 1
+        await asyncio.sleep(self.delays.get(url, 0))
+        response = await handler(request)
+        self.statuses.setdefault(url, []).append(response.status)
+        return response
+
+    async def __splash_data(self, request: web.Request) -> web.Response:
+        if (splash := self._splash.get(str(request.url))) is None:
+            raise web.HTTPNotFound
+        data, validators, last_modified = splash
+        # If-None-Match takes precedence over If-Modified-Since
+        if hdrs.IF_NONE_MATCH in request.headers:
+            etag = validators.get(hdrs.ETAG)
+            not_modified = request.headers[hdrs.IF_NONE_MATCH] == etag
+        else:
+            modified_since = request.if_modified_since
+            not_modified = (
+                modified_since is not None
+                and last_modified is not None
+                and last_modified <= modified_since
+            )
+        if not_modified:
+            return web.Response(status=304, headers=validators)
+        return web.json_response(data, headers=validators)
+
+    async def __tile(self, request: web.Request) -> web.Response:
+        if str(request.url) not in self._tiles:
+            raise web.HTTPNotFound
+        return web.Response(body=tile_png(), content_type="image/png")
+
+
+class FakeConfig:
+    time_zone = "Europe/Amsterdam"
+    latitude = 52.1
+    longitude = 5.18
+
+    def __init__(self, root: str) -> None:
+        self._root = root
+
+    def path(self, *parts: str) -> str:
+        return os.path.join(self._root, *parts)
+
+
+class FakeHass:
+    """The parts of Home Assistant the API uses, on the running event loop."""
+
+    def __init__(self, root: str) -> None:
+        self.config = FakeConfig(root)
+        # Frames stay in memory, nothing is flushed to disk in the background
+        self.data: dict[str, Any] = {DOMAIN: {PERSIST_FRAMES: False}}
+
+    def async_create_task(self, target):
+        return asyncio.get_running_loop().create_task(target)
+
+    def async_create_background_task(self, target, name: str):
+        return asyncio.get_running_loop().create_task(target, name=name)
+
+    def async_add_executor_job(self, target, *args):
+        return asyncio.get_running_loop().run_in_executor(None, target, *args)
+
+
+class FakeStore:
+    def __init__(self, hass: FakeHass, version: int, key: str) -> None:
+        self.data: Any = None
+
+    async def async_load(self) -> Any:
+        return self.data
+
+    async def async_save(self, data: Any) -> None:
+        self.data = data
+
+
+@pytest.fixture
+def server(monkeypatch: pytest.MonkeyPatch) -> WeerplazaServer:
+    server = WeerplazaServer(unused_port())
+    urls = {image_type: server.splash_url(image_type) for image_type in ImageType}
+    for image_type, url in urls.items():
+        monkeypatch.setitem(IMAGE_URLS, image_type, url)
+    monkeypatch.setattr(
+        weerplaza_api, "async_get_clientsession", lambda hass: server.session
+    )
+    monkeypatch.setattr(weerplaza_api, "Store", FakeStore)
+    return server
+
+
+@pytest.fixture
+def hass(tmp_path) -> FakeHass:
+    return FakeHass(str(tmp_path))
+
+
+def test_radar_and_lightning_share_requests(
+    hass: FakeHass, server: WeerplazaServer
+) -> None:
+    """Both layers use the same splash data and tiles, fetched only once."""
+    tiles = server.add_layer(ImageType.RAIN_RADAR, frame_times(3), delay=0.05)
+
+    async def update() -> list[bool]:
+        async with server.serve():
+            api = WeerplazaApi(hass)
+            return await asyncio.gather(
+                api.async_update_layer(ImageType.RAIN_RADAR),
+                api.async_update_layer(ImageType.RAIN_LIGHTNING),
+            )
+
+    assert asyncio.run(update()) == [True, True]
+    assert IMAGE_URLS[ImageType.RAIN_RADAR] == IMAGE_URLS[ImageType.RAIN_LIGHTNING]
+    assert server.requests[IMAGE_URLS[ImageType.RAIN_RADAR]] == 1
+    assert {url: server.requests[url] for url in tiles} == dict.fromkeys(tiles, 1)
+
+
+def test_decoded_tiles_are_reused(hass: FakeHass, server: WeerplazaServer) -> None:
+    """A layer updated after another one reuses its decoded tiles."""
+    tiles = server.add_layer(ImageType.RAIN_RADAR, frame_times(3))
+
+    async def update() -> list[bool]:
+        async with server.serve():
+            api = WeerplazaApi(hass)
+            return [
+                await api.async_update_layer(ImageType.RAIN_RADAR),
+                await api.async_update_layer(ImageType.RAIN_LIGHTNING),
+            ]
+
+    assert asyncio.run(update()) == [True, True]
+    # The splash data is not cached (it has no validators), the tiles are
+    assert server.requests[IMAGE_URLS[ImageType.RAIN_RADAR]] == 2
+    assert {url: server.requests[url] for url in tiles} == dict.fromkeys(tiles, 1)
+
+
+def test_refresh_takes_as_long_as_the_slowest_layer(
+    hass: FakeHass, server: WeerplazaServer
+) -> None:
+    """Layers (and their frames) are fetched concurrently, not one by one."""
+    delays = {
+        ImageType.SATELLITE: 0.5,
+        ImageType.THUNDER: 0.5,
+        ImageType.HAIL: 0.5,
+        ImageType.DRIZZLE_SNOW: 1.0,
+    }
+    tile_delay = 0.25
+    tiles = {
+        image_type: server.add_layer(image_type, frame_times(2))
+        for image_type in delays
+    }
+
+    async def refresh() -> float:
+        async with server.serve():
+            api = WeerplazaApi(hass)
+            await api.async_load_assets()
+            started = time.monotonic()
+            results = await asyncio.gather(
+                *(api.async_update_layer(image_type) for image_type in delays)
+            )
+            assert all(results)
+            return time.monotonic() - started
+
+    # Without delays the refresh only takes the compositing time
+    work = asyncio.run(refresh())
+    for image_type, delay in delays.items():
+        server.delays[IMAGE_URLS[image_type]] = delay
+        for url in tiles[image_type]:
+            server.delays[url] = tile_delay
+    elapsed = asyncio.run(refresh())
+
+    slowest = max(delays.values()) + tile_delay
+    one_by_one = sum(delays.values()) + 2 * len(delays) * tile_delay
+    assert slowest <= elapsed < slowest + work + 0.5 < one_by_one
+
+
+@pytest.mark.parametrize(
+    "validator",
+    ["etag", "last_modified", None],
+    ids=["not modified (ETag)", "not modified (Last-Modified)", "same frames"],
+)
+def test_unchanged_layer_is_skipped(
+    hass: FakeHass, server: WeerplazaServer, validator: str | None
+) -> None:
+    times = frame_times(4)
+    url = IMAGE_URLS[ImageType.SATELLITE]
+    versions = {
+        "etag": ({"etag": '"v1"'}, {"etag": '"v2"'}),
+        "last_modified": ({"last_modified": times[2]}, {"last_modified": times[3]}),
+        None: ({}, {}),
+    }
+    first, second = versions[validator]
+    tiles = server.add_layer(ImageType.SATELLITE, times[:3], **first)
+
+    async def update() -> list[dict[str, int]]:
+        async with server.serve():
+            api = WeerplazaApi(hass)
+            counters = []
+            for _ in range(2):
+                assert await api.async_update_layer(ImageType.SATELLITE)
+                counters.append(api.layer_counters)
+            # A new frame is processed again
+            server.add_layer(ImageType.SATELLITE, times[1:], **second)
+            assert await api.async_update_layer(ImageType.SATELLITE)
+            counters.append(api.layer_counters)
+            return counters
+
+    assert asyncio.run(update()) == [
+        {LAYERS_PROCESSED: 1, LAYERS_SKIPPED: 0},
+        {LAYERS_PROCESSED: 1, LAYERS_SKIPPED: 1},
+        {LAYERS_PROCESSED: 2, LAYERS_SKIPPED: 1},
+    ]
+    assert server.statuses[url] == [200, 304 if validator else 200, 200]
+    # Only the tile of the new frame was downloaded by the last update
+    assert {url: server.requests[url] for url in tiles} == dict.fromkeys(tiles, 1)
+    assert server.requests[server.tile_url(ImageType.SATELLITE, times[3])] == 1
+
+
+def test_warm_start_serves_the_stored_animation(
+    hass: FakeHass, server: WeerplazaServer, report: Callable[[str], None]
+) -> None:
+    """After a restart the stored animation is served before any download."""
+    hass.data[DOMAIN][PERSIST_FRAMES] = True
+    server.add_layer(ImageType.RAIN_RADAR, frame_times(4), delay=0.05)
+
+    async def first_image() -> tuple[float, bytes | None, int]:
+        """Set up like the integration and wait for the first animation."""
+        async with server.serve():
+            started = time.monotonic()
+            api = WeerplazaApi(hass)
+            await api.async_load_assets()
+            await api.async_load_markers()
+            await api.async_register_camera(ImageType.RAIN_RADAR)
+            requests = server.requests.total()
+            data = await api.async_get_animated_image(ImageType.RAIN_RADAR)
+            if data is None:
+                assert await api.async_update_layer(ImageType.RAIN_RADAR)
+                data = await api.async_get_animated_image(ImageType.RAIN_RADAR)
+            elapsed = time.monotonic() - started
+            downloads = server.requests.total() - requests
+            await api.async_unload()
+            await api.async_unregister_camera(ImageType.RAIN_RADAR)
+            return elapsed, data, downloads
+
+    cold, cold_data, cold_downloads = asyncio.run(first_image())
+    warm, warm_data, warm_downloads = asyncio.run(first_image())
+    report(
+        f"first image after setup: cold {cold * 1000:.0f} ms "
+        f"({cold_downloads} requests), warm {warm * 1000:.0f} ms"
+    )
+    assert cold_data is not None and cold_downloads == 5
+    assert warm_data == cold_data
+    assert warm_downloads == 0
+    assert warm < cold
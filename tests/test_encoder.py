@@ -0,0 +1,158 @@
+"""Round trips of the APNG encoder, decoded with Pillow."""
+
+from io import BytesIO
+import struct
+import zlib
+
+import numpy as np
+from PIL import Image, ImageSequence
+import pytest
+
+from custom_components.weerplaza.const import AnimationFormat
+from custom_components.weerplaza.encoder import (
+    APNG_BLEND_OP_OVER,
+    APNG_BLEND_OP_SOURCE,
+    PNG_SIGNATURE,
+    encode,
+    encode_apng,
+)
+from custom_components.weerplaza.animation import durations
+
+SHAPE = (60, 80, 4)
+
+
+def background() -> np.ndarray:
+    frame = np.random.default_rng(7).integers(0, 256, SHAPE, dtype=np.uint8)
+    frame[..., 3] = 255
+    return frame
+
+
+def decoded(data: bytes) -> tuple[list[np.ndarray], list[int]]:
+    """Return the frames of an animation and their durations."""
+    with Image.open(BytesIO(data)) as image:
+        frames, times = [], []
+        for frame in ImageSequence.Iterator(image):
+            frames.append(np.array(frame.convert("RGBA")))
+            times.append(frame.info.get("duration"))
+        return frames, times
+
+
+def chunks(data: bytes) -> list[tuple[bytes, bytes]]:
+    """Split a PNG stream into its chunks, checking their CRCs."""
+    assert data.startswith(PNG_SIGNATURE)
+    result = []
+    offset = len(PNG_SIGNATURE)
+    while offset < len(data):
+        (length,) = struct.unpack(">I", data[offset : offset + 4])
+        chunk_type = data[offset + 4 : offset + 8]
+        payload = data[offset + 8 : offset + 8 + length]
+        (crc,) = struct.unpack(">I", data[offset + 8 + length : offset + 12 + length])
+        assert crc == zlib.crc32(chunk_type + payload), chunk_type
+        result.append((chunk_type, payload))
+        offset += length + 12
+    assert offset == len(data)
+    return result
+
+
+def blend_ops(data: bytes) -> list[int]:
+    return [
+        payload[-1] for chunk_type, payload in chunks(data) if chunk_type == b"fcTL"
+    ]
+
+
+def assert_round_trip(frames: list[np.ndarray]) -> None:
+    result, _ = decoded(encode_apng(frames, durations(len(frames))))
+    assert len(result) == len(frames)
+    for frame, expected in zip(result, frames):
+        np.testing.assert_array_equal(frame, expected)
+
+
+def test_radar_frames(radar_frames: list[np.ndarray]) -> None:
+    frames = radar_frames[:8]
+    data = encode_apng(frames, durations(len(frames)))
+    result, times = decoded(data)
+    assert times == durations(len(frames))
+    for frame, expected in zip(result, frames, strict=True):
+        np.testing.assert_array_equal(frame, expected)
+    # Only the area that changed is stored after the first frame
+    height, width = frames[0].shape[:2]
+    sizes = [
+        struct.unpack(">II", payload[4:12])
+        for chunk_type, payload in chunks(data)
+        if chunk_type == b"fcTL"
+    ]
+    assert sizes[0] == (width, height)
+    assert all(w * h < width * height for w, h in sizes[1:])
+
+
+def test_stream_is_valid() -> None:
+    # Noise does not compress, so frames take several IDAT (fdAT) chunks
+    rng = np.random.default_rng(3)
+    frames = [rng.integers(0, 256, (400, 400, 4), dtype=np.uint8) for _ in range(3)]
+    data = encode_apng(frames, durations(3))
+    types = [chunk_type for chunk_type, _ in chunks(data)]
+    assert types[:2] == [b"IHDR", b"acTL"]
+    assert types[-1] == b"IEND"
+    assert types.count(b"fcTL") == 3
+    assert types.count(b"fdAT") > 2
+    # fcTL and fdAT chunks share one sequence, without gaps
+    sequence = [
+        struct.unpack(">I", payload[:4])[0]
+        for chunk_type, payload in chunks(data)
+        if chunk_type in (b"fcTL", b"fdAT")
+    ]
+    assert sequence == list(range(len(sequence)))
+    assert_round_trip(frames)
+
+
+def test_opaque_changes_are_blended_over() -> None:
+    first = background()
+    second = first.copy()
+    second[5:15, 10:30] = (0, 100, 255, 255)
+    second[40, 70] = (255, 255, 255, 255)
+    data = encode_apng([first, second], durations(2))
+    assert blend_ops(data) == [APNG_BLEND_OP_SOURCE, APNG_BLEND_OP_OVER]
+    assert_round_trip([first, second])
+
+
+@pytest.mark.parametrize("alpha", [0, 128], ids=["transparent", "semi-transparent"])
+def test_translucent_changes_replace_the_area(alpha: int) -> None:
+    first = background()
+    second = first.copy()
+    second[5:15, 10:30] = (0, 100, 255, alpha)
+    # Unchanged pixels in the same area must keep their value
+    second[5, 10] = first[5, 10]
+    third = second.copy()
+    third[50:55, 60:70] = (200, 0, 0, 255)
+    data = encode_apng([first, second, third], durations(3))
+    assert blend_ops(data) == [
+        APNG_BLEND_OP_SOURCE,
+        APNG_BLEND_OP_SOURCE,
+        APNG_BLEND_OP_OVER,
+    ]
+    assert_round_trip([first, second, third])
+
+
+def test_unchanged_frames_extend_the_frame_before() -> None:
+    first = background()
+    second = first.copy()
+    second[20:30, 20:30] = (255, 0, 0, 255)
+    frames = [first, first.copy(), second, second.copy(), second.copy()]
+    result, times = decoded(encode_apng(frames, durations(5)))
+    assert times == [400, 2400]
+    np.testing.assert_array_equal(result[0], first)
+    np.testing.assert_array_equal(result[1], second)
+
+
+def test_single_frame() -> None:
+    frame = background()
+    for data in (
+        encode_apng([frame], durations(1)),
+        encode_apng([frame, frame.copy()], durations(2)),
+        encode([frame], durations(1), AnimationFormat.APNG),
+    ):
+        # A plain PNG, not an animation of one frame
+        assert b"acTL" not in [chunk_type for chunk_type, _ in chunks(data)]
+        with Image.open(BytesIO(data)) as image:
+            assert not getattr(image, "is_animated", False)
+            np.testing.assert_array_equal(np.array(image.convert("RGBA")), frame)
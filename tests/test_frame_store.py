@@ -0,0 +1,82 @@
+"""Tests for the memory budgeted frame store."""
+
+import os
+import threading
+
+import numpy as np
+from PIL import Image
+import pytest
+
+from custom_components.weerplaza.frame_store import FrameStore
+
+SHAPE = (70, 80, 4)
+FRAME_BYTES = int(np.prod(SHAPE))
+
+
+def frame(value: int) -> np.ndarray:
+    return np.full(SHAPE, value, dtype=np.uint8)
+
+
+def filename(tmp_path, minute: int) -> str:
+    return os.path.join(tmp_path, f"20261018-10{minute:02d}.png")
+
+
+def test_frames_beyond_budget_are_read_back(tmp_path) -> None:
+    store = FrameStore(2 * FRAME_BYTES)
+    names = [filename(tmp_path, minute) for minute in range(4)]
+    for value, name in enumerate(names):
+        store.add(name, frame(value), None)
+    # Nothing is dropped before it is written
+    assert store.memory_usage == 4 * FRAME_BYTES
+    store.flush()
+    assert store.memory_usage == 2 * FRAME_BYTES
+    for value, name in enumerate(names):
+        np.testing.assert_array_equal(store.get(name), frame(value))
+    assert not [name for name in os.listdir(tmp_path) if name.endswith(".tmp")]
+
+
+def test_memory_only_drops_the_oldest_frames(tmp_path) -> None:
+    store = FrameStore(2 * FRAME_BYTES, persist=False)
+    names = [filename(tmp_path, minute) for minute in range(3)]
+    for value, name in enumerate(names):
+        store.add(name, frame(value), None)
+    store.flush()
+    assert store.get(names[0]) is None
+    np.testing.assert_array_equal(store.get(names[2]), frame(2))
+    assert not os.listdir(tmp_path)
+
+
+def test_frames_being_written_stay_in_memory(
+    tmp_path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """A frame added during a flush does not push out the frames being written."""
+    store = FrameStore(FRAME_BYTES)
+    first, second = filename(tmp_path, 0), filename(tmp_path, 5)
+    store.add(first, frame(1), None)
+
+    writing = threading.Event()
+    resume = threading.Event()
+    save = Image.Image.save
+
+    def slow_save(image: Image.Image, fp, *args, **kwargs) -> None:
+        writing.set()
+        assert resume.wait(5)
+        save(image, fp, *args, **kwargs)
+
+    monkeypatch.setattr(Image.Image, "save", slow_save)
+    flush = threading.Thread(target=store.flush)
+    flush.start()
+    try:
+        assert writing.wait(5)
+        store.add(second, frame(2), None)
+        # Not on disk yet, not even partly
+        assert not os.path.exists(first)
+        np.testing.assert_array_equal(store.get(first), frame(1))
+    finally:
+        resume.set()
+        flush.join()
+    monkeypatch.setattr(Image.Image, "save", save)
+    store.flush()
+    np.testing.assert_array_equal(store.get(first), frame(1))
+    np.testing.assert_array_equal(store.get(second), frame(2))
+    assert store.memory_usage <= FRAME_BYTES
@@ -0,0 +1,86 @@
+"""Tests for the nowcast: motion estimation and advection of a moving field."""
+
+import numpy as np
+import pytest
+
+from custom_components.weerplaza.nowcast import (
+    BLOCK_SIZE,
+    Nowcaster,
+    advect,
+    estimate_motion,
+    intensity_field,
+)
+
+# Rain pixels moved per five minutes: 4 down, 6 right (about 15 km/h)
+SHIFT = (4, 6)
+MINUTES = 5
+
+
+def shifted(layer: np.ndarray, dy: int, dx: int) -> np.ndarray:
+    """The layer moved by dy, dx pixels, transparent where nothing moved in."""
+    result = np.zeros_like(layer)
+    height, width = layer.shape[:2]
+    result[max(dy, 0) : height + min(dy, 0), max(dx, 0) : width + min(dx, 0)] = layer[
+        max(-dy, 0) : height - max(dy, 0), max(-dx, 0) : width - max(dx, 0)
+    ]
+    return result
+
+
+def rain_blocks(field: np.ndarray) -> np.ndarray:
+    """Mask of the motion blocks with rain."""
+    rows, cols = field.shape[0] // BLOCK_SIZE, field.shape[1] // BLOCK_SIZE
+    blocks = field[: rows * BLOCK_SIZE, : cols * BLOCK_SIZE]
+    return blocks.reshape(rows, BLOCK_SIZE, cols, BLOCK_SIZE).any(axis=(1, 3))
+
+
+@pytest.mark.parametrize("scale", [2, 4])
+def test_motion_of_a_shifted_field(rain_layer: np.ndarray, scale: int) -> None:
+    dy, dx = (shift * scale for shift in SHIFT)
+    previous = intensity_field(rain_layer, scale)
+    current = intensity_field(shifted(rain_layer, dy, dx), scale)
+    flow = estimate_motion(previous, current, search=8)
+    rain = rain_blocks(current)
+    assert rain.any()
+    # The motion of the blocks with rain is found to within a field pixel,
+    # and the median filter takes the others along
+    assert np.abs(flow[rain] - SHIFT).max() <= 1
+    np.testing.assert_allclose(np.median(flow.reshape(-1, 2), axis=0), SHIFT)
+
+
+def test_no_rain_has_no_motion() -> None:
+    field = np.zeros((64, 64), dtype=np.float32)
+    np.testing.assert_array_equal(estimate_motion(field, field, 4), 0)
+
+
+def test_advect_moves_the_layer(rain_layer: np.ndarray) -> None:
+    velocity = np.empty((4, 4, 2), dtype=np.float32)
+    velocity[...] = (SHIFT[0] / MINUTES, SHIFT[1] / MINUTES)
+    frames = advect(rain_layer, velocity, 1000, 2, [MINUTES, 3 * MINUTES])
+    for frame, steps in zip(frames, (1, 3), strict=True):
+        expected = shifted(rain_layer, SHIFT[0] * steps, SHIFT[1] * steps)
+        np.testing.assert_array_equal(frame, expected)
+
+
+def centroid(layer: np.ndarray) -> np.ndarray:
+    ys, xs = np.nonzero(layer[..., 3])
+    return np.array([ys.mean(), xs.mean()])
+
+
+@pytest.mark.parametrize("scale", [2, 3, 4, 6, 8])
+def test_forecast_continues_the_motion(rain_layer: np.ndarray, scale: int) -> None:
+    nowcaster = Nowcaster()
+    previous = shifted(rain_layer, -SHIFT[0], -SHIFT[1])
+    nowcaster.add(0, previous, scale)
+    nowcaster.add(MINUTES * 60, rain_layer, scale)
+    forecast = nowcaster.forecast([MINUTES, 2 * MINUTES])
+    assert forecast is not None
+    timestamp, frames = forecast
+    assert timestamp == MINUTES * 60
+    for frame, steps in zip(frames, (1, 2), strict=True):
+        expected = shifted(rain_layer, SHIFT[0] * steps, SHIFT[1] * steps)
+        # The rain moves on within a field pixel of where it should be
+        moved = centroid(frame) - centroid(rain_layer)
+        assert np.abs(moved - np.multiply(SHIFT, steps)).max() < scale
+        if scale == 2:
+            # A whole number of field pixels per step is tracked exactly
+            np.testing.assert_array_equal(frame, expected)
@@ -0,0 +1,46 @@
+"""Tests for the rain sampled from the radar layer."""
+
+import numpy as np
+import pytest
+
+from custom_components.weerplaza.assets import FRAME_PROJECTION, FRAME_SIZE
+from custom_components.weerplaza.precipitation import RAIN_SCALE, RainSampler
+
+LAT, LON = 52.1, 5.18
+
+
+def layer_with(color: tuple[int, int, int], alpha: int = 255) -> np.ndarray:
+    layer = np.zeros((FRAME_SIZE[1], FRAME_SIZE[0], 4), dtype=np.uint8)
+    layer[...] = (*color, alpha)
+    return layer
+
+
+@pytest.mark.parametrize(("color", "intensity"), RAIN_SCALE)
+def test_legend_colours(color: tuple[int, int, int], intensity: float) -> None:
+    sampler = RainSampler(FRAME_PROJECTION, FRAME_SIZE, LAT, LON, 2)
+    assert sampler.sample(layer_with(color)) == pytest.approx(intensity)
+
+
+def test_no_rain() -> None:
+    sampler = RainSampler(FRAME_PROJECTION, FRAME_SIZE, LAT, LON, 2)
+    # Transparent pixels and colours far from the legend (the map) are dry
+    assert sampler.sample(layer_with((40, 110, 255), alpha=0)) == 0
+    assert sampler.sample(layer_with((90, 140, 40))) == 0
+
+
+def test_mean_within_radius() -> None:
+    sampler = RainSampler(FRAME_PROJECTION, FRAME_SIZE, LAT, LON, 2)
+    x, _ = (int(np.rint(value)) for value in FRAME_PROJECTION.forward(LAT, LON))
+    layer = layer_with((0, 0, 0), alpha=0)
+    # Rain on the left half of the circle only
+    layer[:, : x + 1] = (40, 110, 255, 255)
+    assert 0.4 < sampler.sample(layer) < 0.7
+    # Rain outside the radius does not count
+    layer = layer_with((0, 0, 0), alpha=0)
+    layer[:, : x - 20] = (40, 110, 255, 255)
+    assert sampler.sample(layer) == 0
+
+
+def test_outside_the_frame() -> None:
+    sampler = RainSampler(FRAME_PROJECTION, FRAME_SIZE, 40.0, 5.18, 2)
+    assert sampler.sample(layer_with((40, 110, 255))) is None
@@ -0,0 +1,125 @@
+"""Tests for the adaptive layer schedule, driven by a fake clock."""
+
+from itertools import pairwise
+
+import pytest
+
+from custom_components.weerplaza.const import DEFAULT_SYNC_INTERVAL
+from custom_components.weerplaza.scheduler import (
+    MAX_INTERVAL,
+    MIN_INTERVAL,
+    PUBLISH_MARGIN,
+    LayerSchedule,
+)
+
+CADENCE = 300
+DELAY = 90
+FRAMES = 18
+
+
+class FakeFeed:
+    """A layer publishing a frame every CADENCE seconds, DELAY seconds late."""
+
+    def __init__(self, cadence: float = CADENCE, delay: float = DELAY) -> None:
+        self.cadence = cadence
+        self.delay = delay
+
+    def frame_times(self, now: float) -> list[float]:
+        """The frame times visible to a poll at now."""
+        newest = (now - self.delay) // self.cadence * self.cadence
+        return [newest - i * self.cadence for i in reversed(range(FRAMES))]
+
+    def published(self, frame_time: float) -> float:
+        return frame_time + self.delay
+
+
+def test_default_interval_without_data() -> None:
+    schedule = LayerSchedule()
+    assert schedule.observe([], 1000) == 1000 + DEFAULT_SYNC_INTERVAL
+    # A single frame tells nothing about the cadence
+    assert schedule.observe([900], 1100) == 1100 + DEFAULT_SYNC_INTERVAL
+    assert schedule.cadence is None
+
+
+def test_cadence_is_median_spacing() -> None:
+    schedule = LayerSchedule()
+    # One missing frame does not change the cadence
+    schedule.observe([0, 300, 600, 1200, 1500, 1500], 1600)
+    assert schedule.cadence == 300
+    assert schedule.latest == 1500
+
+
+def test_delay_is_learned_from_new_frames() -> None:
+    schedule = LayerSchedule()
+    # The first poll cannot tell how late the newest frame was
+    assert schedule.observe([0, 300, 600], 700) == 600 + 300 + PUBLISH_MARGIN
+    assert schedule.delay is None
+    schedule.observe([300, 600, 900], 1000)
+    assert schedule.delay == 100
+    # A later poll that found a frame sooner lowers the delay, never raises it
+    next_poll = schedule.observe([600, 900, 1200], 1280)
+    assert schedule.delay == 80
+    assert next_poll == 1200 + 300 + 80 + PUBLISH_MARGIN
+    schedule.observe([900, 1200, 1500], 1700)
+    assert schedule.delay == 80
+
+
+def test_polls_just_after_the_expected_frame() -> None:
+    feed = FakeFeed()
+    schedule = LayerSchedule()
+    now = 10_000.0
+    polls = []
+    for _ in range(100):
+        frame_times = feed.frame_times(now)
+        found = schedule.latest is None or frame_times[-1] > schedule.latest
+        polls.append((now, frame_times[-1], found))
+        now = schedule.observe(frame_times, now)
+    assert schedule.cadence == CADENCE
+    assert schedule.delay is not None and schedule.delay >= DELAY
+    # Once the phase is learned every poll finds exactly one new frame, after
+    # its publication and well before the next one
+    for (_, previous, _), (poll, newest, found) in pairwise(polls[10:]):
+        assert found
+        assert newest == previous + CADENCE
+        assert feed.published(newest) <= poll < feed.published(newest) + CADENCE
+
+
+def test_poll_before_publication_backs_off() -> None:
+    schedule = LayerSchedule()
+    schedule.observe([0, 300, 600], 700)
+    # The frame of 900 is late: retry soon, then less and less often
+    now = 920.0
+    intervals = []
+    for _ in range(8):
+        next_poll = schedule.observe([0, 300, 600], now)
+        intervals.append(next_poll - now)
+        now = next_poll
+    assert intervals == [
+        MIN_INTERVAL,
+        2 * MIN_INTERVAL,
+        4 * MIN_INTERVAL,
+        8 * MIN_INTERVAL,
+        16 * MIN_INTERVAL,
+        MAX_INTERVAL,
+        MAX_INTERVAL,
+        MAX_INTERVAL,
+    ]
+
+
+def test_new_frame_ends_backoff() -> None:
+    schedule = LayerSchedule()
+    schedule.observe([0, 300, 600], 700)
+    for now in (920, 980, 1100, 1340):
+        schedule.observe([0, 300, 600], now)
+    next_poll = schedule.observe([300, 600, 900], 1400)
+    assert schedule.delay == 500
+    assert next_poll == pytest.approx(900 + 300 + 500 + PUBLISH_MARGIN)
+
+
+def test_interval_is_clamped() -> None:
+    schedule = LayerSchedule()
+    # A long cadence still polls at least every MAX_INTERVAL
+    assert schedule.observe([0, 7200], 7300) == 7300 + MAX_INTERVAL
+    # A frame expected any moment is not polled more often than MIN_INTERVAL
+    schedule = LayerSchedule()
+    assert schedule.observe([0, 300, 600], 915) == 915 + MIN_INTERVAL
@@ -0,0 +1,186 @@
+"""Tests for the map projection and the decoding of downloads."""
+
+import asyncio
+from io import BytesIO
+import math
+
+import numpy as np
+from PIL import Image, UnidentifiedImageError
+import pytest
+
+from custom_components.weerplaza.tools import (
+    ChunkStream,
+    Projection,
+    calculate_mercator_position,
+    decode_stream,
+)
+
+EXTENT = (1.556, 8.8, 54.239)  # left and right longitude, top latitude
+CANVAS = (1050, 1148)
+ANGLE = -6
+CROP = (157, 264)
+
+
+def old_calculate_mercator_position(
+    lat: float, lon: float, llon: float, rlon: float, tlat: float, width: int = 1050
+) -> tuple[int, int]:
+    """The scalar implementation the projection replaced."""
+    x = round((lon - llon) / (rlon - llon) * width)
+    tlat_rad = tlat / 180 * math.pi
+    ty = 0.5 * math.log((1 + math.sin(tlat_rad)) / (1 - math.sin(tlat_rad)))
+    ty = width * ty / ((rlon - llon) * math.pi / 180)
+    lat = lat / 180 * math.pi
+    y = 0.5 * math.log((1 + math.sin(lat)) / (1 - math.sin(lat)))
+    y = round(ty - width * y / ((rlon - llon) * math.pi / 180))
+    return (x, y)
+
+
+def rotated_projection() -> Projection:
+    return Projection(
+        *EXTENT,
+        width=CANVAS[0],
+        angle=ANGLE,
+        center=(CANVAS[0] / 2, CANVAS[1] / 2),
+        offset=CROP,
+    )
+
+
+def locations() -> tuple[np.ndarray, np.ndarray]:
+    lat, lon = np.meshgrid(np.linspace(49.5, 54.2, 25), np.linspace(1.6, 8.7, 25))
+    return lat.ravel(), lon.ravel()
+
+
+@pytest.mark.parametrize(
+    "projection",
+    [Projection(*EXTENT, width=CANVAS[0]), rotated_projection()],
+    ids=["plain", "rotated and cropped"],
+)
+def test_round_trip_from_locations(projection: Projection) -> None:
+    lat, lon = locations()
+    x, y = projection.forward(lat, lon)
+    lat_back, lon_back = projection.inverse(x, y)
+    np.testing.assert_allclose(lat_back, lat, atol=1e-9)
+    np.testing.assert_allclose(lon_back, lon, atol=1e-9)
+
+
+@pytest.mark.parametrize(
+    "projection",
+    [Projection(*EXTENT, width=CANVAS[0]), rotated_projection()],
+    ids=["plain", "rotated and cropped"],
+)
+def test_round_trip_from_pixels(projection: Projection) -> None:
+    y, x = np.mgrid[0:700:50, 0:776:50].astype(float)
+    x_back, y_back = projection.forward(*projection.inverse(x, y))
+    np.testing.assert_allclose(x_back, x, atol=1e-6)
+    np.testing.assert_allclose(y_back, y, atol=1e-6)
+
+
+def test_scalars_and_arrays_agree() -> None:
+    projection = rotated_projection()
+    lat, lon = locations()
+    xs, ys = projection.forward(lat, lon)
+    for i in range(0, lat.size, 37):
+        x, y = projection.forward(float(lat[i]), float(lon[i]))
+        assert x == pytest.approx(xs[i])
+        assert y == pytest.approx(ys[i])
+
+
+def test_rotation_matches_image_rotate() -> None:
+    """A dot drawn on the map lands where the rotated projection puts it."""
+    plain = Projection(*EXTENT, width=CANVAS[0])
+    rotated = rotated_projection()
+    for frame_x, frame_y in ((200, 200), (600, 150), (400, 500), (100, 600)):
+        lat, lon = rotated.inverse(frame_x, frame_y)
+        x, y = (int(np.rint(value)) for value in plain.forward(lat, lon))
+        canvas = Image.new("L", CANVAS, 0)
+        canvas.putpixel((x, y), 255)
+        frame = canvas.rotate(ANGLE, Image.Resampling.BILINEAR)
+        frame = np.asarray(frame.crop((*CROP, CROP[0] + 776, CROP[1] + 700)))
+        weights = frame.astype(float)
+        ys, xs = np.mgrid[0 : frame.shape[0], 0 : frame.shape[1]]
+        found = (
+            (xs * weights).sum() / weights.sum(),
+            (ys * weights).sum() / weights.sum(),
+        )
+        # The dot was drawn on the rounded position
+        expected = rotated.forward(*plain.inverse(x, y))
+        assert found == pytest.approx(expected, abs=0.1)
+
+
+def test_pixel_size() -> None:
+    projection = Projection(*EXTENT, width=CANVAS[0])
+    # 7.244 degrees of longitude over 1050 pixels, at 52 degrees north
+    assert projection.pixel_size(52.0) == pytest.approx(0.473, abs=0.001)
+
+
+def test_calculate_mercator_position_matches_scalar_version() -> None:
+    lat, lon = locations()
+    for i in range(lat.size):
+        assert calculate_mercator_position(
+            float(lat[i]), float(lon[i]), *EXTENT
+        ) == old_calculate_mercator_position(float(lat[i]), float(lon[i]), *EXTENT)
+
+
+def test_calculate_mercator_position_batched() -> None:
+    lat, lon = locations()
+    xs, ys = calculate_mercator_position(lat, lon, *EXTENT)
+    assert xs.dtype.kind == "i" and ys.dtype.kind == "i"
+    expected = [
+        old_calculate_mercator_position(float(a), float(b), *EXTENT)
+        for a, b in zip(lat, lon)
+    ]
+    assert list(zip(xs.tolist(), ys.tolist())) == expected
+
+
+CHUNK = 16 * 1024
+
+
+async def feed_all(stream: ChunkStream, data: bytes) -> None:
+    for start in range(0, len(data), CHUNK):
+        await stream.feed(data[start : start + CHUNK])
+    stream.end()
+
+
+def noise_png(width: int, height: int) -> bytes:
+    rng = np.random.default_rng(7)
+    pixels = rng.integers(0, 256, (height, width, 4), dtype=np.uint8)
+    buffer = BytesIO()
+    Image.fromarray(pixels).save(buffer, "PNG")
+    return buffer.getvalue()
+
+
+def test_stream_waits_for_the_reader() -> None:
+    data = noise_png(400, 300)
+    assert len(data) > 8 * CHUNK
+
+    async def download() -> Image.Image:
+        stream = ChunkStream(limit=4 * CHUNK)
+        feeding = asyncio.create_task(feed_all(stream, data))
+        await asyncio.sleep(0.1)
+        # Nothing reads yet: the queue is full and the download waits
+        assert not feeding.done()
+        decoding = asyncio.get_running_loop().run_in_executor(
+            None, decode_stream, stream, (400, 300)
+        )
+        await feeding
+        return await decoding
+
+    image = asyncio.run(download())
+    with Image.open(BytesIO(data)) as expected:
+        np.testing.assert_array_equal(np.asarray(image), np.asarray(expected))
+
+
+def test_stream_drops_data_after_a_failed_decode() -> None:
+    data = b"not an image" * (8 * CHUNK)
+
+    async def download() -> None:
+        stream = ChunkStream(limit=CHUNK)
+        decoding = asyncio.get_running_loop().run_in_executor(
+            None, decode_stream, stream, (400, 300)
+        )
+        # The download does not wait for a reader that gave up
+        await asyncio.wait_for(feed_all(stream, data), 5)
+        await decoding
+
+    with pytest.raises(UnidentifiedImageError):
+        asyncio.run(download())